@@ -0,0 +1,164 @@
+"""
+Pyrex extension to speed up reading MAF files in `maf.py`.
+"""
+
+import weakref
+
+from bx.align.core import Alignment, Component
+from bx.align.maf import parse_attributes
+
+from libc.stdlib cimport strtol
+from libc.string cimport memcmp
+
+cdef inline bint is_space( char c ):
+    return c == 32 or c == 9 or c == 10 or c == 13 or c == 11 or c == 12
+
+cdef int split_fields( char * line, int length, int * starts, int * ends, int max_fields ):
+    """
+    Find the bounds of up to `max_fields` whitespace separated fields of
+    `line`, returning the number found.
+    """
+    cdef int i = 0, n = 0
+    while n < max_fields:
+        while i < length and is_space( line[i] ):
+            i += 1
+        if i == length:
+            break
+        starts[n] = i
+        while i < length and not is_space( line[i] ):
+            i += 1
+        ends[n] = i
+        n += 1
+    return n
+
+cdef bint is_selected( char * line, int start, int end, tuple species ):
+    """
+    Whether the species of the src field `line[start:end]` (the part before
+    the first '.') is one of `species`
+    """
+    cdef bytes name
+    cdef int dot = start
+    while dot < end and line[dot] != 46:
+        dot += 1
+    for name in species:
+        if len( name ) == dot - start and memcmp( <char *> name, line + start, dot - start ) == 0:
+            return True
+    return False
+
+cdef long parse_int( char * line, int start, int end ) except? -1:
+    cdef char * stop
+    cdef long value = strtol( line + start, &stop, 10 )
+    if stop != line + end:
+        raise ValueError( "invalid literal for int(): %r" % line[start:end] )
+    return value
+
+cdef component_from_row( bytes line, int * starts, int * ends, int n, text ):
+    """
+    Create a component from the first six fields of an 's' or 'e' row
+    """
+    cdef char * s = line
+    if n < 6:
+        raise Exception( "Too few fields in row: %r" % line )
+    return Component( line[starts[1]:ends[1]], parse_int( s, starts[2], ends[2] ),
+                      parse_int( s, starts[3], ends[3] ), line[starts[4]:ends[4]],
+                      parse_int( s, starts[5], ends[5] ), text )
+
+def read_next_maf( file, species_to_lengths=None, parse_e_rows=False, species=None ):
+    """
+    Read the next MAF block from `file` and return as an `Alignment`
+    instance, like `bx.align.maf.read_next_maf` but splitting rows and
+    converting numbers in C. The text of each component is only copied out
+    of the line it was read from when first used. Rows for species not in
+    `species` are skipped after looking only at their src field.
+    """
+    cdef bytes line
+    cdef char * s
+    cdef int length, n, text_size = 0
+    cdef int starts[7]
+    cdef int ends[7]
+    cdef tuple selected = None
+    if species is not None:
+        selected = tuple( species )
+    readline = file.readline
+    # Attributes line, skipping blank and comment lines
+    while 1:
+        line = readline()
+        if not line:
+            return None
+        if line[0] != '#' and not line.isspace():
+            break
+    fields = line.split()
+    if fields[0] != 'a': raise Exception("Expected 'a ...' line")
+    alignment = Alignment( species_to_lengths=species_to_lengths )
+    alignment.attributes = parse_attributes( fields[1:] )
+    if 'score' in alignment.attributes:
+        alignment.score = alignment.attributes['score']
+        del alignment.attributes['score']
+    else:
+        alignment.score = 0
+    components = alignment.components
+    alignment_ref = weakref.ref( alignment )
+    last_component = None
+    while 1:
+        line = readline()
+        # EOF or Blank line terminates alignment components
+        if not line:
+            break
+        s = line
+        length = len( line )
+        if s[0] == 35:
+            # '#', a comment
+            continue
+        n = split_fields( s, length, starts, ends, 2 )
+        if n == 0:
+            break
+        if ends[0] - starts[0] != 1:
+            continue
+        if selected is not None and n == 2 and not is_selected( s, starts[1], ends[1], selected ):
+            # The alignment still has the width of the rows skipped
+            if text_size == 0 and s[starts[0]] == 115:
+                if split_fields( s, length, starts, ends, 7 ) == 7:
+                    text_size = ends[6] - starts[6]
+            continue
+        n = split_fields( s, length, starts, ends, 7 )
+        if s[starts[0]] == 115:
+            # 's', a row with sequence for a component
+            component = component_from_row( line, starts, ends, n, '' )
+            if n == 7:
+                component.set_text_from_line( line, starts[6], ends[6] )
+                if text_size == 0:
+                    text_size = ends[6] - starts[6]
+                elif text_size != ends[6] - starts[6]:
+                    raise Exception( "Components must have same text length" )
+            component._alignment = alignment_ref
+            components.append( component )
+            last_component = component
+        elif s[starts[0]] == 101:
+            # An 'e' row, when no bases align for a given species this tells
+            # us something about the synteny
+            if parse_e_rows:
+                component = component_from_row( line, starts, ends, n, None )
+                if n < 7:
+                    raise Exception( "No synteny status in 'e' row: %r" % line )
+                component.empty = True
+                synteny = line[starts[6]:ends[6]]
+                assert len( synteny ) == 1, \
+                    "Synteny status in 'e' rows should be denoted with a single character code"
+                component.synteny_empty = synteny
+                component._alignment = alignment_ref
+                components.append( component )
+                last_component = component
+        elif s[starts[0]] == 105:
+            # An 'i' row, indicates left and right synteny status for the
+            # previous component
+            fields = line.split()
+            assert fields[1] == last_component.src, "'i' row does not follow matching 's' row"
+            last_component.synteny_left = ( fields[2], int( fields[3] ) )
+            last_component.synteny_right = ( fields[4], int( fields[5] ) )
+        elif s[starts[0]] == 113:
+            # A 'q' row
+            fields = line.split()
+            assert fields[1] == last_component.src, "'q' row does not follow matching 's' row"
+            last_component.quality = fields[2]
+    alignment.text_size = text_size
+    return alignment
@@ -35,10 +35,10 @@ class Alignment( object ):
     def add_component( self, component ):
         component._alignment = weakref.ref( self )
         self.components.append( component )
-        if component.text is not None:
+        if component.text_size is not None:
             if self.text_size == 0:
-                self.text_size = len( component.text )
-            elif self.text_size != len( component.text ):
+                self.text_size = component.text_size
+            elif self.text_size != component.text_size:
                 raise Exception( "Components must have same text length" )
 
     def get_score( self ):
@@ -207,8 +207,14 @@ class Alignment( object ):
 
 class Component( object ):
 
+    # Fixed attributes keep the many components of large alignments small
+    __slots__ = ( '_alignment', 'src', 'start', 'size', 'strand', '_src_size', '_text', '_line',
+                  '_text_start', '_text_end', 'quality', 'synteny_left', 'synteny_right',
+                  'synteny_empty', 'empty', 'index' )
+
     def __init__( self, src='', start=0, size=0, strand=None, src_size=None, text='' ):
         self._alignment = None
+        self._line = None
         self.src = src
         self.start = start          # Nota Bene:  start,size,strand are as they
         self.size = size            # .. appear in a MAF file-- origin-zero, end
@@ -242,6 +248,34 @@ class Component( object ):
                                                  self.synteny_right[0], self.synteny_right[1] )
         return rval
 
+    def get_text( self ):
+        # Parsers may leave the text as a range of the line it was read
+        # from until it is needed
+        if self._line is not None:
+            self._text = self._line[self._text_start:self._text_end]
+            self._line = None
+        return self._text
+    def set_text( self, text ):
+        self._text = text
+        self._line = None
+    text = property( fget=get_text, fset=set_text )
+
+    def set_text_from_line( self, line, start, end ):
+        """
+        Set the text to `line[start:end]`, without copying it until used
+        """
+        self._line = line
+        self._text_start = start
+        self._text_end = end
+
+    def get_text_size( self ):
+        if self._line is not None:
+            return self._text_end - self._text_start
+        if self._text is None:
+            return None
+        return len( self._text )
+    text_size = property( fget=get_text_size )
+
     def get_end( self ):
         return self.start + self.size
     end = property( fget=get_end )
@@ -362,6 +396,17 @@ class Component( object ):
     def __ne__( self, other ):
         return not( self.__eq__( other ) )
 
+    def __getstate__( self ):
+        state = dict( ( name, getattr( self, name ) ) for name in self.__slots__
+                      if name not in ( '_line', '_text_start', '_text_end' ) )
+        state['_text'] = self.text
+        return state
+
+    def __setstate__( self, state ):
+        self._line = None
+        for name, value in state.iteritems():
+            setattr( self, name, value )
+
     def __deepcopy__( self, memo ):
         new = Component( src=self.src, start=self.start, size=self.size, strand=self.strand, src_size=self._src_size, text=self.text )
         new._alignment = self._alignment
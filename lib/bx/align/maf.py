@@ -14,6 +14,7 @@ import itertools
 from bx import interval_index_file
 
 from bx.misc.seekbzip2 import SeekableBzip2File
+from bx.misc.sizedcache import SizedLRUCache
 
 MAF_INVERSE_STATUS = 'V'
 MAF_INSERT_STATUS = 'I'
@@ -27,7 +28,10 @@ MAF_MISSING_STATUS = 'M'
 
 class MAFIndexedAccess( interval_index_file.AbstractIndexedAccess ):
     """
-    Indexed access to a MAF file.
+    Indexed access to a MAF file. Parsed blocks can be kept in a
+    `block_cache` (see `new_block_cache`), which may be shared by several
+    files. Cached blocks are returned to every caller so must not be
+    modified.
     """
     def read_at_current_offset( self, file, **kwargs ):
         """
@@ -48,9 +52,28 @@ Indexed = MAFIndexedAccess
 MultiIndexed = MAFMultiIndexedAccess
 """Deprecated: `MAFMultiIndexedAccess` is also available under the name `MultiIndexed`."""
 
+def new_block_cache( max_blocks=None, max_bytes=None ):
+    """
+    Create a cache of parsed blocks for `MAFIndexedAccess` (the
+    `block_cache` argument) holding up to `max_blocks` blocks or about
+    `max_bytes` bytes of alignment text. Hit counts are available from
+    the cache, e.g. `hit_rate()`.
+    """
+    if ( max_blocks is None ) == ( max_bytes is None ):
+        raise ValueError( "Exactly one of max_blocks and max_bytes is required" )
+    if max_blocks is not None:
+        return SizedLRUCache( max_blocks, sizeof=lambda block: 1 )
+    return SizedLRUCache( max_bytes, sizeof=estimated_size )
+
+def estimated_size( alignment ):
+    """Rough number of bytes used by `alignment`"""
+    return 200 + sum( 100 + ( c.text_size or 0 ) for c in alignment.components )
+
 class Reader( object ):
     """
-    Iterate over all maf blocks in a file in order
+    Iterate over all maf blocks in a file in order. Keyword arguments are
+    passed to `read_next_maf`, for example `species` to read only the rows
+    of some species.
     """
     def __init__( self, file, **kwargs ):
         self.file = file
@@ -125,11 +148,12 @@ class Writer( object ):
 def from_string( string, **kwargs ):
     return read_next_maf( StringIO( string ), **kwargs )
 
-def read_next_maf( file, species_to_lengths=None, parse_e_rows=False ):
+def read_next_maf( file, species_to_lengths=None, parse_e_rows=False, species=None ):
     """
     Read the next MAF block from `file` and return as an `Alignment` 
     instance. If `parse_i_rows` is true, empty components will be created 
-    when e rows are encountered.
+    when e rows are encountered. If `species` is given only rows for those
+    species (the part of the src before the first '.') are read.
     """
     alignment = Alignment(species_to_lengths=species_to_lengths)
     # Attributes line
@@ -150,6 +174,14 @@ def read_next_maf( file, species_to_lengths=None, parse_e_rows=False ):
         # EOF or Blank line terminates alignment components
         if not line or line.isspace(): break
         if line.isspace(): break 
+        # Skip rows for other species before parsing them
+        if species is not None:
+            fields = line.split( None, 2 )
+            if len( fields ) > 1 and fields[1].split( '.' )[0] not in species:
+                if fields[0] == 's' and alignment.text_size == 0:
+                    fields = line.split()
+                    if len( fields ) > 6: alignment.text_size = len( fields[6] )
+                continue
         # Parse row
         fields = line.split()
         if fields[0] == 's':
@@ -229,3 +261,13 @@ def format_tabular( rows, align=None ):
         rval += "\n"
     return rval
         
+
+# ---- Read C extension if available ---------------------------------------
+
+# The pure Python parser remains available as `read_next_maf_py`
+read_next_maf_py = read_next_maf
+
+try:
+    from _maf import read_next_maf
+except:
+    pass
@@ -0,0 +1,290 @@
+"""
+Run a function over all blocks of a MAF file using several processes.
+
+The file is split into byte ranges that begin at alignment blocks, each
+range is read by a separate worker, and the results are returned in file
+order. Plain files, and .bz2 / .lzo files with a seek table (as used by
+`MAFIndexedAccess`) are supported.
+
+Functions passed to `map_blocks` are sent to the worker processes so they
+must be picklable (defined at the top level of a module).
+"""
+
+import os.path
+import time
+from array import array
+from itertools import izip
+from multiprocessing import Pool, cpu_count
+
+import numpy
+
+from bx import interval_index_file
+
+from bx.align.maf import read_next_maf
+try:
+    from bx.misc import seekbzip2
+except:
+    seekbzip2 = None
+try:
+    from bx.misc import seeklzop
+except:
+    seeklzop = None
+
+__all__ = [ 'open_data', 'block_ranges', 'map_blocks', 'read_range', 'read_range_with_offsets', 'build_index' ]
+
+def open_data( filename ):
+    """
+    Open a MAF file for seeking, using the seek table (`filename` + "t")
+    for .bz2 and .lzo files.
+    """
+    if filename.endswith( ".bz2" ) or filename.endswith( ".lzo" ):
+        table_filename = filename + "t"
+        if not os.path.exists( table_filename ):
+            raise Exception( "Cannot find seek table for: " + filename )
+        if filename.endswith( ".bz2" ):
+            if seekbzip2 is None:
+                raise Exception( "Trying to open .bz2 file but no seekbzip2 module found" )
+            return seekbzip2.SeekableBzip2File( filename, table_filename )
+        else:
+            if seeklzop is None:
+                raise Exception( "Trying to open .lzo file but no seeklzop module found" )
+            return seeklzop.SeekableLzopFile( filename, table_filename )
+    return open( filename )
+
+def data_size( f ):
+    """Uncompressed size of a file returned by `open_data`"""
+    if hasattr( f, "size" ):
+        return f.size
+    f.seek( 0, 2 )
+    return f.tell()
+
+def next_block_start( f, pos, size ):
+    """
+    Return the offset of the first block starting at or after `pos`, or
+    `size` if there is none.
+    """
+    if pos >= size:
+        return size
+    if pos == 0:
+        f.seek( 0 )
+    else:
+        # Skip the (probably partial) line `pos` falls in
+        f.seek( pos - 1 )
+        pos += len( f.readline() ) - 1
+    while True:
+        line = f.readline()
+        if not line:
+            return size
+        if line.startswith( "a" ) and line[1:2] in ( " ", "\t", "\n", "\r" ):
+            return pos
+        pos += len( line )
+
+def index_offsets( index_filename ):
+    """Sorted offsets of all blocks recorded in a MAF index"""
+    indexes = interval_index_file.Indexes( filename=index_filename )
+    offsets = set()
+    for name in indexes.indexes:
+        for start, end, offset in indexes.get( name ).iterate():
+            offsets.add( offset )
+    return sorted( offsets )
+
+def block_ranges( filename, count, index_filename=None ):
+    """
+    Split the blocks of `filename` into at most `count` byte ranges of
+    about equal size, returned as a list of (start, end) pairs each
+    covering whole blocks. Block offsets are taken from the interval index
+    `index_filename` if given, otherwise block boundaries are found by
+    scanning forward from evenly spaced positions. The first range always
+    starts at the first block, even if the index does not cover it (e.g.
+    an index of only some species).
+    """
+    f = open_data( filename )
+    try:
+        size = data_size( f )
+        if index_filename is not None:
+            offsets = index_offsets( index_filename )
+            starts = []
+            if offsets:
+                starts = [ offsets[ i * len( offsets ) // count ] for i in range( count ) ]
+        else:
+            starts = [ next_block_start( f, i * size // count, size ) for i in range( count ) ]
+        starts[:1] = [ next_block_start( f, 0, size ) ]
+    finally:
+        f.close()
+    starts = sorted( set( starts ) )
+    ends = starts[1:] + [ size ]
+    return [ ( s, e ) for s, e in zip( starts, ends ) if s < e ]
+
+class PushbackFile( object ):
+    """Returns `line` before the remaining lines of `file`"""
+    def __init__( self, line, file ):
+        self.line = line
+        self.file = file
+    def readline( self ):
+        line = self.line
+        if line is None:
+            return self.file.readline()
+        self.line = None
+        return line
+
+def read_range( f, start, end, **kwargs ):
+    """
+    Iterate over the blocks of `f` that start in the byte range
+    [`start`, `end`). Keyword arguments are passed to `read_next_maf`.
+    """
+    for offset, block in read_range_with_offsets( f, start, end, **kwargs ):
+        yield block
+
+def read_range_with_offsets( f, start, end, **kwargs ):
+    """
+    Like `read_range` but yield ( offset, block ) pairs, where offset is
+    the position of the block's 'a' line.
+    """
+    if start >= end:
+        return
+    f.seek( start )
+    pos = start
+    while True:
+        line = f.readline()
+        if not line:
+            break
+        if line.startswith( "a" ):
+            if pos >= end:
+                break
+            block = read_next_maf( PushbackFile( line, f ), **kwargs )
+            if block is None:
+                break
+            yield pos, block
+            pos = f.tell()
+        else:
+            pos += len( line )
+
+def run_range( task ):
+    filename, start, end, func, maf_kwargs = task
+    f = open_data( filename )
+    try:
+        return func( read_range( f, start, end, **maf_kwargs ) )
+    finally:
+        f.close()
+
+def map_blocks( filename, func, processes=None, ranges_per_process=4, index_filename=None, **kwargs ):
+    """
+    Call `func` with an iterator over the blocks of each byte range of
+    `filename` and return the results as a list in file order. The ranges
+    are processed by a pool of `processes` worker processes (one per CPU
+    by default); with `processes=1` everything runs in this process.
+    Keyword arguments are passed to `read_next_maf`.
+
+    Results can then be combined, for example to count alignment columns:
+
+    >>> def count_cols( blocks ):
+    ...     return sum( block.text_size for block in blocks )
+    >>> sum( map_blocks( "test_data/maf_tests/mm8_chr7_tiny.maf", count_cols, processes=1 ) )
+    1064
+    """
+    if processes is None:
+        processes = cpu_count()
+    ranges = block_ranges( filename, max( 1, processes * ranges_per_process ), index_filename )
+    tasks = [ ( filename, start, end, func, kwargs ) for start, end in ranges ]
+    if processes == 1:
+        return map( run_range, tasks )
+    pool = Pool( processes )
+    try:
+        return pool.map( run_range, tasks, chunksize=1 )
+    finally:
+        pool.close()
+        pool.join()
+
+def index_range( task ):
+    """
+    Collect the intervals to index for the blocks in one range, as a list
+    of source names and arrays of name number, start, end and offset.
+    """
+    filename, start, end, species = task
+    names = {}
+    sizes = []
+    ids, starts, ends, offsets = array( "l" ), array( "l" ), array( "l" ), array( "l" )
+    f = open_data( filename )
+    try:
+        for offset, block in read_range_with_offsets( f, start, end, species=species ):
+            for c in block.components:
+                id = names.get( c.src )
+                if id is None:
+                    id = names[c.src] = len( sizes )
+                    sizes.append( c.src_size )
+                ids.append( id )
+                starts.append( c.forward_strand_start )
+                ends.append( c.forward_strand_end )
+                offsets.append( offset )
+    finally:
+        f.close()
+    names = sorted( names, key=names.get )
+    return names, sizes, [ numpy.frombuffer( a, dtype=numpy.int_ ).copy() for a in ( ids, starts, ends, offsets ) ]
+
+def build_index( filename, index_filename=None, processes=None, species=None, chunk_size=64*1024*1024, progress=None ):
+    """
+    Build an interval index of the blocks in `filename` (by default written
+    to the file name without any .bz2 / .lzo extension plus ".index"),
+    scanning ranges of about `chunk_size` bytes in `processes` worker
+    processes. Only components of the listed `species` are indexed if
+    given. `progress`, if given, is called after each range as
+    progress( bytes_done, total_bytes, seconds ). Returns the `Indexes`
+    written.
+    """
+    if index_filename is None:
+        root = filename
+        if root.endswith( ".bz2" ) or root.endswith( ".lzo" ):
+            root = root[:-4]
+        index_filename = root + ".index"
+    if processes is None:
+        processes = cpu_count()
+    if species is not None:
+        species = list( species )
+    f = open_data( filename )
+    try:
+        size = data_size( f )
+    finally:
+        f.close()
+    count = max( processes * 4, size // chunk_size + 1 )
+    ranges = block_ranges( filename, count )
+    tasks = [ ( filename, start, end, species ) for start, end in ranges ]
+    if processes == 1:
+        results = ( index_range( task ) for task in tasks )
+        pool = None
+    else:
+        pool = Pool( processes )
+        results = pool.imap( index_range, tasks )
+    # Merge the results of each range, numbering names across all of them
+    all_names, all_sizes = {}, {}
+    parts = []
+    start_time = time.time()
+    try:
+        for ( start, end ), ( names, sizes, columns ) in izip( ranges, results ):
+            ids = numpy.empty( len( names ), dtype=numpy.int_ )
+            for i, ( name, src_size ) in enumerate( zip( names, sizes ) ):
+                ids[i] = all_names.setdefault( name, len( all_names ) )
+                all_sizes[name] = max( all_sizes.get( name, 0 ), src_size )
+            if len( columns[0] ):
+                columns[0] = ids[ columns[0] ]
+                parts.append( columns )
+            if progress is not None:
+                progress( end - ranges[0][0], size - ranges[0][0], time.time() - start_time )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    indexes = interval_index_file.Indexes()
+    if parts:
+        ids, starts, ends, offsets = [ numpy.concatenate( c ) for c in zip( *parts ) ]
+        order = numpy.argsort( ids, kind="mergesort" )
+        ids, starts, ends, offsets = ids[order], starts[order], ends[order], offsets[order]
+        bounds = numpy.searchsorted( ids, numpy.arange( len( all_names ) + 1 ) )
+        for name, id in all_names.iteritems():
+            lo, hi = bounds[id], bounds[id+1]
+            indexes.add_arrays( name, starts[lo:hi], ends[lo:hi], offsets[lo:hi], max=all_sizes[name] )
+    out = open( index_filename, "w" )
+    try:
+        indexes.write( out )
+    finally:
+        out.close()
+    return indexes
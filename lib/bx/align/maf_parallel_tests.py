@@ -0,0 +1,123 @@
+"""
+Tests for `bx.align.maf_parallel`.
+"""
+
+import bx.align.maf as maf
+from bx.align.maf_parallel import *
+from bx.align.maf_parallel import data_size, next_block_start, index_offsets
+from bx import interval_index_file
+from bx.misc import seeklzop
+from tempfile import mktemp
+
+test_file = "test_data/maf_tests/mm8_chr7_tiny.maf"
+
+# The same file compressed, with seek tables (.bz2t / .lzot), the .lzo file
+# needs the python-lzo module
+compressed_files = [ test_file + ".bz2" ]
+if hasattr( seeklzop, "lzo" ):
+    compressed_files.append( test_file + ".lzo" )
+
+def block_keys( blocks ):
+    return [ ( b.components[0].src, b.components[0].start, b.text_size ) for b in blocks ]
+
+def all_keys():
+    return block_keys( maf.Reader( open( test_file ) ) )
+
+def test_ranges_cover_all_blocks():
+    expected = all_keys()
+    for count in ( 1, 2, 3, 7, 50 ):
+        for index_filename in ( None, test_file + ".index" ):
+            ranges = block_ranges( test_file, count, index_filename )
+            assert len( ranges ) <= count
+            for ( s1, e1 ), ( s2, e2 ) in zip( ranges, ranges[1:] ):
+                assert e1 == s2
+            keys = []
+            for start, end in ranges:
+                keys += block_keys( read_range( open( test_file ), start, end ) )
+            assert keys == expected
+
+def test_ranges_index_missing_first_blocks():
+    # An index of a species not in the first blocks
+    index_filename = mktemp()
+    build_index( test_file, index_filename, processes=1, species=[ "bosTau2" ] )
+    f = open( test_file )
+    assert index_offsets( index_filename )[0] > next_block_start( f, 0, data_size( f ) )
+    for count in ( 1, 3 ):
+        ranges = block_ranges( test_file, count, index_filename )
+        keys = []
+        for start, end in ranges:
+            keys += block_keys( read_range( open( test_file ), start, end ) )
+        assert keys == all_keys()
+        assert sum( map_blocks( test_file, block_keys, processes=1, index_filename=index_filename ), [] ) == all_keys()
+
+def test_compressed():
+    expected = all_keys()
+    for filename in compressed_files:
+        f = open_data( filename )
+        assert data_size( f ) == len( open( test_file ).read() )
+        for count in ( 1, 3, 7 ):
+            ranges = block_ranges( filename, count )
+            assert ranges == block_ranges( test_file, count )
+            keys = []
+            for start, end in ranges:
+                keys += block_keys( read_range( f, start, end ) )
+            assert keys == expected
+        for processes in ( 1, 2 ):
+            assert sum( map_blocks( filename, block_keys, processes=processes, ranges_per_process=3 ), [] ) == expected
+
+def test_map_blocks():
+    expected = all_keys()
+    for processes in ( 1, 2 ):
+        results = map_blocks( test_file, block_keys, processes=processes, ranges_per_process=3 )
+        assert sum( results, [] ) == expected
+
+def test_map_blocks_species():
+    results = map_blocks( test_file, block_keys, processes=2, species=[ "rn4" ] )
+    assert set( k[0].split( "." )[0] for k in sum( results, [] ) ) == set( [ "rn4" ] )
+
+def test_build_index():
+    index_filename = mktemp()
+    for processes in ( 1, 2 ):
+        build_index( test_file, index_filename, processes=processes, chunk_size=1000 )
+        built = maf.MAFIndexedAccess( test_file, index_filename )
+        reference = maf.MAFIndexedAccess( test_file )
+        assert sorted( built.indexes.indexes ) == sorted( reference.indexes.indexes )
+        for src in reference.indexes.indexes:
+            for start, end in ( ( 0, 10**9 ), ( 80082400, 80082500 ) ):
+                assert [ str( b ) for b in built.get( src, start, end ) ] == \
+                       [ str( b ) for b in reference.get( src, start, end ) ]
+    indexes = build_index( test_file, index_filename, processes=1, species=[ "rn4" ] )
+    assert indexes.indexes.keys() == [ "rn4.chr1" ]
+
+def serial_index( filename ):
+    """Index the blocks of `filename` one by one, as maf_build_index did"""
+    reader = maf.Reader( open( filename ) )
+    indexes = interval_index_file.Indexes()
+    while 1:
+        pos = reader.file.tell()
+        block = reader.next()
+        if block is None: break
+        for c in block.components:
+            indexes.add( c.src, c.forward_strand_start, c.forward_strand_end, pos, max=c.src_size )
+    return indexes
+
+def index_contents( index_filename ):
+    indexes = interval_index_file.Indexes( index_filename )
+    return dict( ( name, sorted( indexes.get( name ).iterate() ) ) for name in indexes.indexes )
+
+def test_build_index_compressed():
+    expected_filename = mktemp()
+    out = open( expected_filename, "w" )
+    serial_index( test_file ).write( out )
+    out.close()
+    expected = index_contents( expected_filename )
+    index_filename = mktemp()
+    for filename in compressed_files:
+        for processes in ( 1, 2 ):
+            build_index( filename, index_filename, processes=processes, chunk_size=1000 )
+            assert index_contents( index_filename ) == expected
+        built = maf.MAFIndexedAccess( filename, index_filename )
+        reference = maf.MAFIndexedAccess( test_file )
+        for src in reference.indexes.indexes:
+            assert [ str( b ) for b in built.get( src, 0, 10**9 ) ] == \
+                   [ str( b ) for b in reference.get( src, 0, 10**9 ) ]
@@ -181,6 +181,66 @@ e mm7.chr6                28091695 3290 - 149646834 I
     print expected
     assert actual == expected
 
+def test_parsers_agree():
+    for text in ( test_maf, test_maf_2, test_maf_3, open( "test_data/maf_tests/mm8_chr7_tiny.maf" ).read() ):
+        for parse_e_rows in ( False, True ):
+            fast = StringIO( text )
+            fast.readline()
+            slow = StringIO( text )
+            slow.readline()
+            while True:
+                a = maf.read_next_maf( fast, parse_e_rows=parse_e_rows )
+                b = maf.read_next_maf_py( slow, parse_e_rows=parse_e_rows )
+                assert a == b
+                if a is None:
+                    break
+                assert a.text_size == b.text_size
+                assert [ c.quality for c in a.components ] == [ c.quality for c in b.components ]
+
+def test_species():
+    for read in ( maf.read_next_maf, maf.read_next_maf_py ):
+        f = StringIO( test_maf_2 )
+        f.readline()
+        a = read( f, parse_e_rows=True, species=[ "panTro1", "mm7", "xenTro1" ] )
+        assert [ c.src for c in a.components ] == [ "panTro1.chr1", "mm7.chr6" ]
+        assert a.components[0].synteny_right == ( "C", 0 )
+        assert a.text_size == 49
+    reader = maf.Reader( StringIO( test_maf ), species=[ "fugu_unc" ] )
+    assert [ len( a.components ) for a in reader ] == [ 0, 1 ]
+
+def test_get_many():
+    fname = "test_data/maf_tests/mm8_chr7_tiny.maf"
+    intervals = [ ( s, s + 50 ) for s in range( 80082300, 80086000, 40 ) ] + [ ( 0, 10 ), ( 0, 10**9 ) ]
+    for index in ( maf.MAFIndexedAccess( fname ), maf.MAFIndexedAccess( fname, keep_open=True, use_mmap=True ),
+                   maf.MAFMultiIndexedAccess( [ fname, fname ] ) ):
+        results = list( index.get_many( "mm8.chr7", intervals, batch_size=7 ) )
+        assert [ i for i, blocks in results ] == intervals
+        for interval, blocks in results:
+            assert blocks == index.get( "mm8.chr7", *interval )
+        assert list( index.get_many( "hg18.chr1", intervals[:3] ) ) == [ ( i, [] ) for i in intervals[:3] ]
+    # Blocks overlapping several intervals are read once
+    index = maf.MAFIndexedAccess( fname )
+    results = list( index.get_many( "mm8.chr7", intervals[:20] ) )
+    assert results[0][1][0] is results[1][1][0]
+
+def test_block_cache():
+    fname = "test_data/maf_tests/mm8_chr7_tiny.maf"
+    cache = maf.new_block_cache( max_blocks=100 )
+    index = maf.MAFMultiIndexedAccess( [ fname ], block_cache=cache )
+    reference = maf.MAFIndexedAccess( fname )
+    windows = [ ( s, s + 200 ) for s in range( 80082300, 80086000, 100 ) ]
+    for start, end in windows:
+        assert index.get( "mm8.chr7", start, end ) == reference.get( "mm8.chr7", start, end )
+    # Each block is parsed once, neighboring windows hit the cache
+    assert cache.misses == len( cache ) == len( reference.get( "mm8.chr7", 0, 10**9 ) )
+    assert cache.hit_rate() > 0.5
+    assert index.get( "mm8.chr7", 80082400, 80082500 )[0] is index.get( "mm8.chr7", 80082400, 80082500 )[0]
+    # A size bound keeps only some of the blocks
+    cache = maf.new_block_cache( max_bytes=5000 )
+    index = maf.MAFIndexedAccess( fname, block_cache=cache )
+    assert len( index.get( "mm8.chr7", 0, 10**9 ) ) == 8
+    assert 0 < len( cache ) < 8 and cache.size <= 5000
+
 def check_component( c, src, start, size, strand, src_size, text ):
     assert c.src == src
     assert c.start == start 
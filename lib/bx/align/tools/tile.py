@@ -9,8 +9,9 @@ import os
 import string
 import sys
 
+import numpy
 
-def tile_interval( sources, index, ref_src, start, end, seq_db=None ):
+def tile_interval( sources, index, ref_src, start, end, seq_db=None, ref_2bit=None ):
     """
     Tile maf blocks onto an interval. The resulting block will span the interval
     exactly and contain the column from the highest scoring alignment at each
@@ -22,60 +23,125 @@ def tile_interval( sources, index, ref_src, start, end, seq_db=None ):
     `start`: start of interval
     `end`: end of interval
     `seq_db`: a mapping for source names in the reference species to nib files
+    `ref_2bit`: a `TwoBitFile` for the reference species, used instead of `seq_db`
     """
     # First entry in sources should also be on the reference species
     assert sources[0].split('.')[0] == ref_src.split('.')[0], \
         "%s != %s" % ( sources[0].split('.')[0], ref_src.split('.')[0] )
-    base_len = end - start
     blocks = index.get( ref_src, start, end )
     # From low to high score
     blocks.sort(key=lambda t: t.score)
-    mask = [ -1 ] * base_len
-    ref_src_size = None
+    return tile_blocks( blocks, sources, ref_src, start, end, reference_filler( ref_src, seq_db, ref_2bit ) )
+
+def reference_filler( ref_src, seq_db=None, ref_2bit=None ):
+    """
+    Return a function giving the reference sequence for ( start, end ), read
+    from the nib file for `ref_src` in `seq_db` or from `ref_2bit` (opened
+    once rather than for each piece), or None if neither is given.
+    """
+    if ref_2bit is not None:
+        ref_chr = ref_src
+        if "." in ref_src:
+            ref_chr = ref_src[ref_src.index(".")+1:]
+        seq = ref_2bit[ ref_chr ]
+        return lambda start, end: seq.get( start, end )
+    if seq_db:
+        nib = bx.seq.nib.NibFile( open( seq_db[ ref_src ] ) )
+        return lambda start, end: nib.get( start, end - start )
+    return None
+
+def score_mask( blocks, ref_src, start, end ):
+    """
+    Return an array with, for each position of the interval, the index in
+    `blocks` of the last block covering it in `ref_src` (-1 if none). With
+    blocks sorted from low to high score this is the highest scoring one.
+    """
+    mask = numpy.empty( end - start, dtype=numpy.int32 )
+    mask.fill( -1 )
     for i, block in enumerate( blocks ):
         ref = block.get_component_by_src_start( ref_src )
-        ref_src_size = ref.src_size
         assert ref.strand == "+"
         slice_start = max( start, ref.start )
         slice_end = min( end, ref.end )
-        for j in range( slice_start, slice_end ):
-            mask[j-start] = i
-    tiled = []
-    for i in range( len( sources ) ):
-        tiled.append( [] )
-    for ss, ee, index in intervals_from_mask( mask ):
+        if slice_end > slice_start:
+            mask[ slice_start - start : slice_end - start ] = i
+    return mask
+
+def mask_runs( mask ):
+    """
+    Return arrays ( starts, ends, values ) of the runs of equal values in
+    `mask`.
+    """
+    mask = numpy.asarray( mask )
+    if len( mask ) == 0:
+        return numpy.zeros( 0, numpy.int64 ), numpy.zeros( 0, numpy.int64 ), mask[:0]
+    starts = numpy.concatenate( ( [ 0 ], numpy.flatnonzero( mask[1:] != mask[:-1] ) + 1 ) )
+    ends = numpy.concatenate( ( starts[1:], [ len( mask ) ] ) )
+    return starts, ends, mask[starts]
+
+def gap_columns( texts, gap_chars="-" ):
+    """
+    Return a boolean array marking the columns of the (equal length)
+    `texts` that contain only characters in `gap_chars`.
+    """
+    if not texts:
+        return numpy.zeros( 0, dtype=bool )
+    is_gap = numpy.zeros( 256, dtype=bool )
+    is_gap[ numpy.frombuffer( gap_chars, dtype=numpy.uint8 ) ] = True
+    all_gap = numpy.ones( len( texts[0] ), dtype=bool )
+    for text in texts:
+        all_gap &= is_gap[ numpy.frombuffer( text, dtype=numpy.uint8 ) ]
+    return all_gap
+
+def remove_gap_columns( texts, gap_chars="-" ):
+    """
+    Remove any columns containing only characters in `gap_chars` from
+    alignment texts, returning new texts.
+    """
+    keep = ~gap_columns( texts, gap_chars )
+    if keep.all():
+        return list( texts )
+    return [ numpy.frombuffer( text, dtype=numpy.uint8 )[keep].tostring() for text in texts ]
+
+def tile_blocks( blocks, sources, ref_src, start, end, fill_ref=None, missing="-" ):
+    """
+    Tile `blocks` (sorted from low to high score) onto the interval, using
+    the highest scoring block at each position. Returns a text for each of
+    `sources`. Positions not covered by any block take the reference
+    sequence from `fill_ref( start, end )` (or 'N' if not given) and
+    `missing` in the other rows, as do rows without a component in a block.
+    """
+    tiled = [ [] for source in sources ]
+    if end <= start:
+        return [ "" for source in sources ]
+    for ss, ee, index in zip( *mask_runs( score_mask( blocks, ref_src, start, end ) ) ):
+        ss, ee = int( ss ), int( ee )
         # Interval with no covering alignments
         if index < 0:
             # Get sequence if available, otherwise just use 'N'
-            if seq_db:
-                tiled[0].append( bx.seq.nib.NibFile( open( seq_db[ ref_src ] ) ).get( start+ss, ee-ss ) )
+            if fill_ref is not None:
+                tiled[0].append( fill_ref( start + ss, start + ee ) )
             else:
-                tiled[0].append( "N" * (ee-ss) )
+                tiled[0].append( "N" * ( ee - ss ) )
             # Gaps in all other species
             for row in tiled[1:]:
-                row.append( "-" * ( ee - ss ) )
+                row.append( missing * ( ee - ss ) )
         else:
-            slice_start = start + ss
-            slice_end = start + ee
             block = blocks[index]
             ref = block.get_component_by_src_start( ref_src )
-            sliced = block.slice_by_component( ref, slice_start, slice_end )
+            sliced = block.slice_by_component( ref, start + ss, start + ee )
             sliced = sliced.limit_to_species( sources )
-            sliced.remove_all_gap_columns()
+            texts = [ c.text for c in sliced.components if c.text is not None ]
+            keep = ~gap_columns( texts )
+            size = int( keep.sum() )
             for i, src in enumerate( sources ):
                 comp = sliced.get_component_by_src_start( src )
-                if comp:
-                    tiled[i].append( comp.text )
+                if comp and comp.text is not None:
+                    tiled[i].append( numpy.frombuffer( comp.text, dtype=numpy.uint8 )[keep].tostring() )
                 else:
-                    tiled[i].append( "-" * sliced.text_size )
+                    tiled[i].append( missing * size )
     return [ "".join( t ) for t in tiled ]
 
 def intervals_from_mask( mask ):
-    start = 0
-    last = mask[0]
-    for i in range( 1, len( mask ) ):
-        if mask[i] != last:
-            yield start, i, last
-            start = i
-            last = mask[i]
-    yield start, len(mask), last
+    for start, end, value in zip( *mask_runs( mask ) ):
+        yield int( start ), int( end ), value
@@ -0,0 +1,50 @@
+"""
+Tests for `bx.align.tools.tile`.
+"""
+
+import random
+import numpy
+
+import bx.align.maf as maf
+from bx.align.tools.tile import *
+
+test_file = "test_data/maf_tests/mm8_chr7_tiny.maf"
+sources = [ "mm8", "rn4", "hg18", "panTro2", "canFam2" ]
+
+def naive_remove_gap_columns( texts, gap_chars ):
+    columns = [ col for col in zip( *texts ) if not all( c in gap_chars for c in col ) ]
+    return [ "".join( row ) for row in zip( *columns ) ] or [ "" for t in texts ]
+
+def test_remove_gap_columns():
+    for i in range( 50 ):
+        texts = [ "".join( random.choice( "AC-*" ) for j in range( 30 ) ) for k in range( 4 ) ]
+        for gap_chars in ( "-", "-*" ):
+            assert remove_gap_columns( texts, gap_chars ) == naive_remove_gap_columns( texts, gap_chars )
+    assert remove_gap_columns( [ "--", "--" ] ) == [ "", "" ]
+
+def test_mask_runs():
+    starts, ends, values = mask_runs( numpy.array( [ -1, -1, 0, 0, 0, 2, -1 ] ) )
+    assert starts.tolist() == [ 0, 2, 5, 6 ]
+    assert ends.tolist() == [ 2, 5, 6, 7 ]
+    assert values.tolist() == [ -1, 0, 2, -1 ]
+    assert list( intervals_from_mask( [ 3 ] ) ) == [ ( 0, 1, 3 ) ]
+
+def test_tile_interval():
+    index = maf.MAFIndexedAccess( test_file )
+    for start, end in ( ( 80082000, 80087000 ), ( 80082380, 80082460 ), ( 0, 10 ) ):
+        rows = tile_interval( sources, index, "mm8.chr7", start, end )
+        assert len( set( len( row ) for row in rows ) ) == 1
+        assert len( rows[0] ) - rows[0].count( "-" ) == end - start
+    # Inside a single block the tiling is just the block sliced to the
+    # interval without the all gap columns
+    block = index.get( "mm8.chr7", 80082380, 80082460 )[0]
+    sliced = block.slice_by_component( block.get_component_by_src_start( "mm8.chr7" ), 80082380, 80082460 )
+    sliced = sliced.limit_to_species( sources )
+    sliced.remove_all_gap_columns()
+    rows = tile_interval( sources, index, "mm8.chr7", 80082380, 80082460 )
+    for src, row in zip( sources, rows ):
+        comp = sliced.get_component_by_src_start( src )
+        if comp:
+            assert row == comp.text
+        else:
+            assert row == "-" * sliced.text_size
@@ -68,7 +68,8 @@ cdef class WiggleReader:
                         self.current_span = 1
                     self.mode = MODE_FIXED
                     continue
-            elif self.mode == MODE_BED:
+            # Data lines (bedGraph lines usually start with the chromosome name)
+            if self.mode == MODE_BED:
                 fields = line.split()
                 if len( fields ) > 3:
                     if len( fields ) > 5:
@@ -89,9 +90,9 @@ cdef class WiggleReader:
                     val = float( fields[0] )
                 except ValueError:
                     continue
-                return self.current_chrom, self.current_pos, self.current_pos + self.current_span, "+", val
-                # FIXME: unreachable! need to test this and fix!
+                pos = self.current_pos
                 self.current_pos += self.current_step
+                return self.current_chrom, pos, pos + self.current_span, "+", val
             else:
                 raise "Unexpected input line: %s" % line.strip()
 
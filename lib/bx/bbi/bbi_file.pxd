@@ -79,6 +79,16 @@ cdef class BBIFile:
     cdef bits32 uncompress_buf_size
     # Zoom levels list
     cdef public object level_list
+    # Index to the unzoomed data, kept in memory once loaded
+    cdef CIRTreeFile unzoomed_cir_tree
+    # Cache of decompressed blocks by file offset (a SizedLRUCache) or None
+    cdef public object block_cache
+    # Number of threads decompressing blocks of large reads
+    cdef public int decompress_workers
+
+    cdef CIRTreeFile _unzoomed_index( self )
+    cdef _read_block( self, bits64 offset, bits64 size )
+    cdef _block_arrays( self, block_data, bits32 chrom_id )
 
     cdef visit_blocks_in_region( self, bits32 chrom_id, bits32 start, bits32 end, BlockHandler handler )
     cdef _get_chrom_id_and_size( self, char * chrom )
@@ -21,9 +21,12 @@ cimport numpy
 cimport numpy as np
 import numpy as np
 
+from bx.intervals.genome_index import group_by_chrom
 from bx.misc.binary_file import BinaryFileReader
+from bx.misc.sizedcache import SizedLRUCache
 from cStringIO import StringIO
-import zlib, math
+from multiprocessing.pool import ThreadPool
+import atexit, zlib, math
 
 # Signatures for bbi related file types
 
@@ -33,6 +36,45 @@ cdef public int big_bed_sig = 0x8789F2EB
 # Some record sizes for parsing
 DEF summary_on_disk_size = 32
 
+# Layout of a zoom level summary record
+sum_dtype = np.dtype([('chrom_id', np.uint32),
+                      ('start', np.uint32),
+                      ('end', np.uint32),
+                      ('valid_count', np.uint32),
+                      ('min_val', np.float32),
+                      ('max_val', np.float32),
+                      ('sum_data', np.float32),
+                      ('sum_squares', np.float32)])
+
+# Default number of records in each chunk yielded by `iter_arrays`
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Default bound, in bytes, on the decompressed blocks kept in memory
+DEFAULT_BLOCK_CACHE_SIZE = 16 * 1024 * 1024
+
+# Number of blocks per decompress worker read in each batch by `_iter_blocks`
+DECOMPRESS_BATCH_BLOCKS = 16
+
+# Thread pools for decompressing blocks, by number of threads. They are
+# shared by all files so files do not hold on to threads of their own.
+decompress_pools = {}
+
+def get_decompress_pool( workers ):
+    """Return the shared pool of `workers` threads, starting it if needed"""
+    pool = decompress_pools.get( workers )
+    if pool is None:
+        pool = decompress_pools[workers] = ThreadPool( workers )
+    return pool
+
+def close_decompress_pools():
+    """Stop the threads of all shared decompress pools"""
+    while decompress_pools:
+        workers, pool = decompress_pools.popitem()
+        pool.terminate()
+        pool.join()
+
+atexit.register( close_decompress_pools )
+
 @cython.profile(False)
 cdef inline int range_intersection( int start1, int end1, int start2, int end2 ):
     return min( end1, end2 ) - max( start1, start2 )
@@ -102,6 +144,150 @@ cdef class SummarizedData:
                 if min_val[j] > val:
                     min_val[j] = val 
 
+class SummarizedDataBatch( object ):
+    """
+    Summaries over many regions, as returned by `BBIFile.summarize_many`.
+    `valid_count`, `min_val`, `max_val`, `sum_data` and `sum_squares` are
+    flat arrays in which the `sizes[i]` elements for region i start at
+    `offsets[i]`. `found[i]` is False if region i is empty or its chromosome
+    is not in the file.
+    """
+    def __init__( self, starts, ends, sizes ):
+        self.starts = starts
+        self.ends = ends
+        self.sizes = sizes
+        self.offsets = numpy.cumsum( sizes ) - sizes
+        total = int( sizes.sum() )
+        self.found = numpy.zeros( len( starts ), dtype=numpy.bool_ )
+        self.valid_count = numpy.zeros( total, dtype=numpy.float64 )
+        self.min_val = numpy.empty( total, dtype=numpy.float64 )
+        self.min_val[:] = numpy.inf
+        self.max_val = numpy.empty( total, dtype=numpy.float64 )
+        self.max_val[:] = -numpy.inf
+        self.sum_data = numpy.zeros( total, dtype=numpy.float64 )
+        self.sum_squares = numpy.zeros( total, dtype=numpy.float64 )
+
+    def __len__( self ):
+        return len( self.starts )
+
+    def __getitem__( self, i ):
+        """
+        The summary of region `i` as a `SummarizedData`, or None
+        """
+        if not self.found[i]:
+            return None
+        a, size = self.offsets[i], self.sizes[i]
+        rval = SummarizedData( self.starts[i], self.ends[i], size )
+        rval.valid_count[:] = self.valid_count[a:a+size]
+        rval.min_val[:] = self.min_val[a:a+size]
+        rval.max_val[:] = self.max_val[a:a+size]
+        rval.sum_data[:] = self.sum_data[a:a+size]
+        rval.sum_squares[:] = self.sum_squares[a:a+size]
+        return rval
+
+    def matrix( self, name ):
+        """
+        The values of field `name` (e.g. 'sum_data') as a 2D array with one
+        row per region. All regions must have the same number of elements.
+        """
+        if len( self.sizes ) and numpy.any( self.sizes != self.sizes[0] ):
+            raise ValueError( "Regions have different numbers of summary elements" )
+        return getattr( self, name ).reshape( len( self.sizes ), -1 )
+
+def expand_ranges( firsts, counts ):
+    """
+    For ranges `firsts[i]` to `firsts[i] + counts[i]` return the index of
+    the range and the value for every element of every range.
+    """
+    owner = numpy.repeat( numpy.arange( len( counts ) ), counts )
+    within = numpy.arange( len( owner ) ) - numpy.repeat( numpy.cumsum( counts ) - counts, counts )
+    return owner, numpy.asarray( firsts )[owner] + within
+
+def overlapping_pairs( rec_starts, rec_ends, starts, ends ):
+    """
+    Return ( region index, record index ) arrays for each record (sorted by
+    start, possibly overlapping each other) that overlaps each of the regions
+    `starts`-`ends`.
+    """
+    if len( rec_starts ) == 0:
+        empty = numpy.zeros( 0, dtype=numpy.intp )
+        return empty, empty
+    # Records before lo all end at or before the region start
+    max_ends = numpy.maximum.accumulate( rec_ends )
+    lo = numpy.searchsorted( max_ends, starts, 'right' )
+    hi = numpy.searchsorted( rec_starts, ends, 'left' )
+    pair_region, pair_rec = expand_ranges( lo, numpy.maximum( hi - lo, 0 ) )
+    keep = rec_ends[pair_rec] > starts[pair_region]
+    return pair_region[keep], pair_rec[keep]
+
+def chunk_columns( parts, chunk_size, concatenate=None ):
+    """
+    Combine tuples of column arrays from `parts` into tuples of at least
+    `chunk_size` rows (except the last), or into a single tuple if
+    `chunk_size` is None. `concatenate` combines a list of tuples, by
+    default each column is concatenated.
+    """
+    if concatenate is None:
+        concatenate = concatenate_columns
+    pending = []
+    count = 0
+    for part in parts:
+        if len( part[0] ) == 0:
+            continue
+        pending.append( part )
+        count += len( part[0] )
+        if chunk_size is not None and count >= chunk_size:
+            yield concatenate( pending )
+            pending = []
+            count = 0
+    if pending:
+        yield concatenate( pending )
+
+def concatenate_columns( parts ):
+    """
+    Concatenate a list of tuples of column arrays column by column
+    """
+    return tuple( numpy.concatenate( column ) for column in zip( *parts ) )
+
+def accumulate_summaries( batch, index, rec_starts, rec_ends, rec_valid, rec_sum, rec_sum_squares, rec_min, rec_max ):
+    """
+    Add summary records (sorted by start) into the elements of the regions
+    `index` of `batch`. As in `ZoomLevel._get_summary_slice` records only
+    partially overlapping a summary element contribute in proportion to
+    the overlap.
+    """
+    starts = batch.starts[index]
+    sizes = batch.sizes[index]
+    steps = ( batch.ends[index] - starts ) // sizes
+    # The last element does not include the remainder of the division
+    pair_region, pair_rec = overlapping_pairs( rec_starts, rec_ends, starts, starts + steps * sizes )
+    s = rec_starts[pair_rec]
+    e = rec_ends[pair_rec]
+    region_start = starts[pair_region]
+    step = steps[pair_region]
+    first_bin = numpy.maximum( s - region_start, 0 ) // step
+    last_bin = numpy.minimum( ( e - 1 - region_start ) // step, sizes[pair_region] - 1 )
+    piece_pair, bins = expand_ranges( first_bin, last_bin - first_bin + 1 )
+    bin_starts = region_start[piece_pair] + bins * step[piece_pair]
+    s = s[piece_pair]
+    e = e[piece_pair]
+    overlap = numpy.minimum( e, bin_starts + step[piece_pair] ) - numpy.maximum( s, bin_starts )
+    factor = overlap / ( e - s ).astype( numpy.float64 )
+    rec = pair_rec[piece_pair]
+    flat = batch.offsets[index][pair_region[piece_pair]] + bins
+    total = len( batch.valid_count )
+    batch.valid_count += numpy.bincount( flat, weights=rec_valid[rec] * factor, minlength=total )
+    batch.sum_data += numpy.bincount( flat, weights=rec_sum[rec] * factor, minlength=total )
+    batch.sum_squares += numpy.bincount( flat, weights=rec_sum_squares[rec] * factor, minlength=total )
+    numpy.minimum.at( batch.min_val, flat, rec_min[rec] )
+    numpy.maximum.at( batch.max_val, flat, rec_max[rec] )
+
+def element_index( batch, index ):
+    """
+    Indexes into the flat arrays of `batch` of all elements of regions `index`
+    """
+    return expand_ranges( batch.offsets[index], batch.sizes[index] )[1]
+
 cdef class BlockHandler:
     """
     Callback for `BBIFile.visit_blocks_in_region`
@@ -116,19 +302,42 @@ cdef class BBIFile:
     Generic enough to accommodate both wiggle and bed data. 
     """
 
-    def __init__( self, file=None, expected_sig=None, type_name=None ):
+    def __init__( self, file=None, expected_sig=None, type_name=None, block_cache_size=DEFAULT_BLOCK_CACHE_SIZE, use_mmap=False,
+                  decompress_workers=1 ):
+        """
+        Up to `block_cache_size` bytes of decompressed data blocks are kept
+        in memory for reuse by later queries, 0 disables caching. If
+        `use_mmap` is True the file is memory mapped (see `open`). With
+        `decompress_workers` above 1 reads covering many blocks decompress
+        them on that many threads.
+        """
+        self.decompress_workers = decompress_workers
+        if block_cache_size > 0:
+            self.block_cache = SizedLRUCache( block_cache_size )
+        else:
+            self.block_cache = None
         if file is not None:
-            self.open( file, expected_sig, type_name )
+            self.open( file, expected_sig, type_name, use_mmap=use_mmap )
+
+    property block_cache_hits:
+        def __get__( self ):
+            return self.block_cache.hits if self.block_cache is not None else 0
 
-    def open( self, file, expected_sig, type_name ):
+    property block_cache_misses:
+        def __get__( self ):
+            return self.block_cache.misses if self.block_cache is not None else 0
+
+    def open( self, file, expected_sig, type_name, use_mmap=False ):
         """
         Initialize from an existing bbi file, signature (magic) must be passed
-        in since this is generic. 
+        in since this is generic. If `use_mmap` is True `file` (which must be
+        a real file) is memory mapped, index nodes are then parsed directly
+        from the mapping and compressed blocks are never copied.
         """
         assert expected_sig is not None
-        self.file = file
         # Open the file in a BinaryFileReader, handles magic and byteswapping
-        self.reader = reader = BinaryFileReader( file, expected_sig )
+        self.reader = reader = BinaryFileReader( file, expected_sig, use_mmap=use_mmap )
+        self.file = reader.file
         self.magic = expected_sig
         self.is_byteswapped = self.reader.byteswap_needed
         # Read header stuff
@@ -153,28 +362,212 @@ cdef class BBIFile:
             level.reserved = reader.read_uint32()
             level.data_offset = reader.read_uint64()
             level.index_offset = reader.read_uint64()
+            level.cir_tree = None
             self.level_list.append( level )
         # Initialize and attach embedded BPTFile containing chromosome names and ids
         reader.seek( self.chrom_tree_offset )
-        self.chrom_bpt = BPTFile( file=self.file )
+        self.chrom_bpt = BPTFile( file=self.file, cache_nodes=True )
+        self.unzoomed_cir_tree = None
+        if self.block_cache is not None:
+            self.block_cache.clear()
+
+    cdef CIRTreeFile _unzoomed_index( self ):
+        """
+        The index to the unzoomed data, nodes are read from disk only once
+        """
+        if self.unzoomed_cir_tree is None:
+            self.reader.seek( self.unzoomed_index_offset )
+            self.unzoomed_cir_tree = CIRTreeFile( self.reader.file, cache_nodes=True )
+        return self.unzoomed_cir_tree
+
+    cdef _read_block( self, bits64 offset, bits64 size ):
+        """
+        Read and (if needed) uncompress the block at `offset`, using the
+        block cache if enabled
+        """
+        if self.block_cache is not None:
+            block_data = self.block_cache.get( offset )
+            if block_data is not None:
+                return block_data
+        # Seek to and read all data for the block
+        self.reader.seek( offset )
+        # Might need to uncompress
+        if self.uncompress_buf_size > 0:
+            block_data = zlib.decompress( self.reader.read_buffer( size ) )
+        else:
+            block_data = self.reader.read( size )
+        if self.block_cache is not None:
+            self.block_cache[offset] = block_data
+        return block_data
 
     cdef visit_blocks_in_region( self, bits32 chrom_id, bits32 start, bits32 end, BlockHandler handler ):
         """
         Visit each block from the full data that overlaps a specific region
         """
-        cdef CIRTreeFile ctf
-        reader = self.reader
-        reader.seek( self.unzoomed_index_offset )
-        ctf = CIRTreeFile( reader.file )
-        block_list = ctf.find_overlapping_blocks( chrom_id, start, end )
-        for offset, size in block_list:
-            # Seek to and read all data for the block
-            reader.seek( offset )
-            block_data = reader.read( size )
-            # Might need to uncompress
-            if self.uncompress_buf_size > 0:
-                block_data = zlib.decompress( block_data )
+        block_list = self._unzoomed_index().find_overlapping_blocks( chrom_id, start, end )
+        for block_data in self._iter_blocks( block_list ):
             handler.handle_block( block_data, self )
+
+    def _iter_blocks( self, block_list ):
+        """
+        Yield the data of each ( offset, size ) block in `block_list`, in
+        order. If there are several decompress workers blocks that are not
+        in the cache are decompressed concurrently on a shared pool of
+        threads (zlib releases the GIL while inflating). Blocks are read in
+        batches, the next batch while the previous one is decompressed, so
+        only two batches of compressed data are held at a time.
+        """
+        if self.decompress_workers <= 1 or self.uncompress_buf_size == 0 or len( block_list ) < 2:
+            for offset, size in block_list:
+                yield self._read_block( offset, size )
+            return
+        pool = get_decompress_pool( self.decompress_workers )
+        batch_size = DECOMPRESS_BATCH_BLOCKS * self.decompress_workers
+        pending = None
+        for i in range( 0, len( block_list ), batch_size ):
+            batch = self._start_batch( pool, block_list[i:i+batch_size] )
+            if pending is not None:
+                for block_data in self._finish_batch( *pending ):
+                    yield block_data
+            pending = batch
+        for block_data in self._finish_batch( *pending ):
+            yield block_data
+
+    def _start_batch( self, pool, batch ):
+        """
+        Read the blocks of `batch` that are not in the cache and start
+        decompressing them on `pool`
+        """
+        cached = {}
+        compressed = []
+        for offset, size in batch:
+            block_data = None
+            if self.block_cache is not None:
+                block_data = self.block_cache.get( offset )
+            if block_data is None:
+                self.reader.seek( offset )
+                compressed.append( self.reader.read_buffer( size ) )
+            else:
+                cached[offset] = block_data
+        chunk_size = max( 1, len( compressed ) // ( 4 * self.decompress_workers ) )
+        return batch, cached, pool.imap( zlib.decompress, compressed, chunk_size )
+
+    def _finish_batch( self, batch, cached, decompressed ):
+        """Yield the data of the blocks of a batch started by `_start_batch`"""
+        for offset, size in batch:
+            if offset in cached:
+                yield cached[offset]
+            else:
+                block_data = decompressed.next()
+                if self.block_cache is not None:
+                    self.block_cache[offset] = block_data
+                yield block_data
+
+    def _blocks_in_regions( self, CIRTreeFile tree, bits32 chrom_id, starts, ends ):
+        """
+        Return the ( offset, size ) of every block in `tree` overlapping any
+        of the regions, each block once and in file order
+        """
+        blocks = {}
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        if len( starts ) == 0:
+            return []
+        # Merge overlapping regions so the tree is walked once per run
+        order = numpy.argsort( starts, kind='mergesort' )
+        starts = starts[order]
+        ends = numpy.maximum.accumulate( ends[order] )
+        run_starts = numpy.concatenate( ( [ 0 ], numpy.flatnonzero( starts[1:] >= ends[:-1] ) + 1 ) )
+        run_ends = numpy.concatenate( ( run_starts[1:], [ len( starts ) ] ) ) - 1
+        for start, end in zip( starts[run_starts], ends[run_ends] ):
+            for offset, size in tree.find_overlapping_blocks( chrom_id, start, end ):
+                blocks[offset] = size
+        return sorted( blocks.items() )
+
+    def _full_records( self, bits32 chrom_id, starts, ends ):
+        """
+        All data records on `chrom_id` from blocks overlapping the regions,
+        as ( starts, ends, values ) arrays sorted by start. Each block is read
+        once. Values are None if the data has none (bigBed).
+        """
+        parts = []
+        for block_data in self._iter_blocks( self._blocks_in_regions( self._unzoomed_index(), chrom_id, starts, ends ) ):
+            parts.append( self._block_arrays( block_data, chrom_id ) )
+        if not parts:
+            return numpy.zeros( 0, numpy.int64 ), numpy.zeros( 0, numpy.int64 ), numpy.zeros( 0, numpy.float32 )
+        rec_starts = numpy.concatenate( [ p[0] for p in parts ] ).astype( numpy.int64 )
+        rec_ends = numpy.concatenate( [ p[1] for p in parts ] ).astype( numpy.int64 )
+        if parts[0][2] is None:
+            rec_values = None
+        else:
+            rec_values = numpy.concatenate( [ p[2] for p in parts ] )
+        order = numpy.argsort( rec_starts, kind='mergesort' )
+        if rec_values is not None:
+            rec_values = rec_values[order]
+        return rec_starts[order], rec_ends[order], rec_values
+
+    cdef _block_arrays( self, block_data, bits32 chrom_id ):
+        """
+        Parse a data block into ( starts, ends, values ) arrays for the
+        records on `chrom_id`. This is data specific so must be overridden.
+        """
+        pass
+
+    def summarize_many( self, chroms, starts, ends, summary_size ):
+        """
+        Like `summarize` for many regions `chroms[i]`:`starts[i]`-`ends[i]`
+        at once. `summary_size` is the number of summary elements, either
+        one number for all regions or one per region. Each block of the file
+        is read and decompressed at most once per call. Returns a
+        `SummarizedDataBatch`.
+        """
+        cdef ZoomLevel level
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        sizes = numpy.empty( len( starts ), dtype=numpy.int64 )
+        sizes[:] = summary_size
+        batch = SummarizedDataBatch( starts, ends, sizes )
+        levels = sorted( self.level_list, key=lambda l: l.reduction_level )
+        reductions = numpy.array( [ l.reduction_level for l in levels ], dtype=numpy.int64 )
+        for chrom, index in group_by_chrom( chroms ):
+            chrom_id, chrom_size = self._get_chrom_id_and_size( chrom )
+            if chrom_id is None:
+                continue
+            index = index[ ( starts[index] < ends[index] ) & ( sizes[index] > 0 ) ]
+            batch.found[index] = True
+            # Same choice of zoom level as `summarize`, the level with the
+            # largest reduction not exceeding half the element size
+            desired = ( ends[index] - starts[index] ) // sizes[index] // 2
+            level_index = numpy.searchsorted( reductions, desired, 'right' ) - 1
+            level_index[ desired <= 1 ] = -1
+            for i in numpy.unique( level_index ):
+                group = index[ level_index == i ]
+                if i < 0:
+                    rec_starts, rec_ends, rec_values = self._full_records( chrom_id, starts[group], ends[group] )
+                    widths = ( rec_ends - rec_starts ).astype( numpy.float64 )
+                    if rec_values is None:
+                        rec_values = numpy.ones( len( widths ), dtype=numpy.float64 )
+                    else:
+                        rec_values = rec_values.astype( numpy.float64 )
+                    accumulate_summaries( batch, group, rec_starts, rec_ends, widths, widths * rec_values,
+                                          widths * rec_values * rec_values, rec_values, rec_values )
+                    elements = element_index( batch, group )
+                    batch.valid_count[elements] = numpy.round( batch.valid_count[elements] )
+                else:
+                    level = levels[i]
+                    summaries = level._summary_records( chrom_id, starts[group], ends[group] )
+                    accumulate_summaries( batch, group, summaries['start'].astype( numpy.int64 ),
+                                          summaries['end'].astype( numpy.int64 ),
+                                          summaries['valid_count'].astype( numpy.float64 ),
+                                          summaries['sum_data'].astype( numpy.float64 ),
+                                          summaries['sum_squares'].astype( numpy.float64 ),
+                                          summaries['min_val'], summaries['max_val'] )
+                    # Elements without summaries are undefined
+                    elements = element_index( batch, group )
+                    empty = elements[ batch.valid_count[elements] == 0 ]
+                    batch.min_val[empty] = numpy.nan
+                    batch.max_val[empty] = numpy.nan
+        return batch
         
     cpdef summarize( self, char * chrom, bits32 start, bits32 end, int summary_size ):
         """
@@ -285,43 +678,32 @@ cdef class ZoomLevel:
     cdef public bits64 data_offset
     cdef public bits64 index_offset
     cdef int item_count
+    # Index to the summaries, kept in memory once loaded
+    cdef CIRTreeFile cir_tree
 
     def _summary_blocks_in_region( self, bits32 chrom_id, bits32 start, bits32 end ):
         """
         Return a list of all SummaryBlocks that overlap the region 
         `chrom_id`:`start`-`end`
         """
-        cdef CIRTreeFile ctf
         cdef SummaryBlock summary
         rval = deque()
-        reader = self.bbi_file.reader
-        reader.seek( self.index_offset )
-        ctf = CIRTreeFile( reader.file )
-        block_list = ctf.find_overlapping_blocks( chrom_id, start, end )
-
-        sum_dtype = np.dtype([('chrom_id', np.uint32),
-                              ('start', np.uint32),
-                              ('end', np.uint32),
-                              ('valid_count', np.uint32),
-                              ('min_val', np.float32),
-                              ('max_val', np.float32),
-                              ('sum_data', np.float32),
-                              ('sum_squares', np.float32)])
+        if self.cir_tree is None:
+            reader = self.bbi_file.reader
+            reader.seek( self.index_offset )
+            self.cir_tree = CIRTreeFile( reader.file, cache_nodes=True )
+        block_list = self.cir_tree.find_overlapping_blocks( chrom_id, start, end )
 
         for offset, size in block_list:
-            # Seek to and read all data for the block
-            reader.seek( offset )
-            block_data = reader.read( size )
-            # Might need to uncompress
-            if self.bbi_file.uncompress_buf_size > 0:
-                ## block_data = zlib.decompress( block_data, buf_size = self.bbi_file.uncompress_buf_size )
-                block_data = zlib.decompress( block_data )
+            block_data = self.bbi_file._read_block( offset, size )
             block_size = len( block_data )
             # The block should be a bunch of summaries. 
             assert block_size % summary_on_disk_size == 0
             item_count = block_size / summary_on_disk_size
 
             arr = np.fromstring(block_data, sum_dtype, item_count)
+            # A block can contain summaries from more that one chrom_id
+            arr = arr[arr['chrom_id'] == chrom_id]
             # covert to dict to match old implementation:
             d = [dict(zip(arr.dtype.names, x)) for x in arr]
             rval.extend(d)
@@ -354,6 +736,23 @@ cdef class ZoomLevel:
             """
         return rval
     
+    def _summary_records( self, bits32 chrom_id, starts, ends ):
+        """
+        All summaries on `chrom_id` from blocks overlapping the regions
+        `starts`-`ends` as a structured array sorted by start, reading each
+        block once
+        """
+        if self.cir_tree is None:
+            reader = self.bbi_file.reader
+            reader.seek( self.index_offset )
+            self.cir_tree = CIRTreeFile( reader.file, cache_nodes=True )
+        parts = [ np.zeros( 0, sum_dtype ) ]
+        for block_data in self.bbi_file._iter_blocks( self.bbi_file._blocks_in_regions( self.cir_tree, chrom_id, starts, ends ) ):
+            arr = np.fromstring( block_data, sum_dtype )
+            parts.append( arr[arr['chrom_id'] == chrom_id] )
+        summaries = np.concatenate( parts )
+        return summaries[ np.argsort( summaries['start'], kind='mergesort' ) ]
+
     cdef _get_summary_slice( self, bits32 base_start, bits32 base_end, summaries ):
         cdef float valid_count = 0.0
         cdef float sum_data = 0.0
@@ -390,4 +789,30 @@ cdef class ZoomLevel:
         return valid_count, sum_data, sum_squares, min_val, max_val
         
     cdef _summarize( self, bits32 chrom_id, bits32 start, bits32 end, int summary_size ):
-        return SummarizedData( start, end, summary_size )
+        """
+        Summarize directly from file. 
+
+        Looking at Jim's code, it appears that 
+          - bbiSummariesInRegion returns all summaries that span start-end in 
+            sorted order
+          - bbiSummarySlice is then used to aggregate over the subset of those 
+            summaries that overlap a single summary element
+        """
+        cdef bits32 base_start, base_end, base_step
+        # What we will load into
+        rval = SummarizedData( start, end, summary_size )
+        # First, get all summary blocks that overlap the region
+        summaries = self._summary_blocks_in_region( chrom_id, start, end )
+        # Now we need to iterate and fill in the slices
+        base_start = start
+        base_step = ( end - start ) / summary_size
+        for i from 0 <= i < summary_size:
+            base_end = start + ( base_step * (i+1) )
+            # Trim summaries that end before the start of the slice
+            while summaries and summaries[0]['end'] <= base_start:
+                summaries.popleft()
+            # Get the slice
+            rval.valid_count[i], rval.sum_data[i], rval.sum_squares[i], rval.min_val[i], rval.max_val[i] = \
+                self._get_summary_slice( base_start, base_end, summaries )
+            base_start = base_end
+        return rval
@@ -0,0 +1,697 @@
+"""
+Writers for the UCSC "big binary indexed" formats (bigWig and bigBed).
+
+The layout mirrors what Jim Kent's 'bbiWrite.c' produces so that files can be
+read by `BigWigFile` / `BigBedFile` as well as the UCSC tools. Input must be
+sorted by start within each chromosome and all records for a chromosome must
+be contiguous, but chromosomes may appear in any order. Data blocks, zoom
+summaries and the index entries describing them are produced in a single pass;
+only the current block, one open summary record per zoom level and a fixed
+size entry per written block are held in memory. Zoom level data is spooled to
+temporary files and copied into place by `finish`.
+"""
+
+from __future__ import division
+
+import struct
+import tempfile
+import zlib
+from cStringIO import StringIO
+
+import numpy
+
+BIG_WIG_SIG = 0x888FFC26
+BIG_BED_SIG = 0x8789F2EB
+BPT_SIG = 0x78CA8C91
+CIR_TREE_SIG = 0x2468ACE0
+
+BBI_VERSION = 4
+BBI_HEADER_SIZE = 64
+MAX_ZOOM_LEVELS = 10
+ZOOM_INCREMENT = 4
+TOTAL_SUMMARY_SIZE = 40
+
+DEFAULT_BLOCK_SIZE = 256
+DEFAULT_ITEMS_PER_SLOT = 1024
+
+BWG_BED_GRAPH = 1
+
+# On disk records, all little endian
+
+bed_graph_item_dtype = numpy.dtype( [ ( 'start', '<u4' ), ( 'end', '<u4' ), ( 'val', '<f4' ) ] )
+
+summary_dtype = numpy.dtype( [ ( 'chrom_id', '<u4' ), ( 'start', '<u4' ), ( 'end', '<u4' ),
+                               ( 'valid_count', '<u4' ), ( 'min_val', '<f4' ), ( 'max_val', '<f4' ),
+                               ( 'sum_data', '<f4' ), ( 'sum_squares', '<f4' ) ] )
+
+cir_leaf_dtype = numpy.dtype( [ ( 'start_chrom_ix', '<u4' ), ( 'start_base', '<u4' ),
+                                ( 'end_chrom_ix', '<u4' ), ( 'end_base', '<u4' ),
+                                ( 'offset', '<u8' ), ( 'size', '<u8' ) ] )
+
+cir_node_dtype = numpy.dtype( [ ( 'start_chrom_ix', '<u4' ), ( 'start_base', '<u4' ),
+                                ( 'end_chrom_ix', '<u4' ), ( 'end_base', '<u4' ),
+                                ( 'offset', '<u8' ) ] )
+
+def write_bpt( f, items, block_size=DEFAULT_BLOCK_SIZE ):
+    """
+    Write a B+ tree compatible with `BPTFile` (and Jim Kent's bPlusTree.c)
+    at the current position of `f`. `items` is a list of ( key, value )
+    bytestrings; all values must have the same length.
+    """
+    items = sorted( items )
+    key_size = max( [ len( key ) for key, value in items ] or [ 1 ] )
+    value_size = len( items[0][1] ) if items else 8
+    block_size = max( 1, min( block_size, len( items ) ) )
+    # Entries for each level from the leaves up, the entries of a parent
+    # level are the first keys of the nodes in the level below
+    levels = [ [ ( key.ljust( key_size, '\0' ), value ) for key, value in items ] ]
+    while len( levels[-1] ) > block_size:
+        below = levels[-1]
+        levels.append( [ ( below[i][0], i // block_size ) for i in range( 0, len( below ), block_size ) ] )
+    level_count = len( levels )
+    # Node sizes, and the file offset of the first node of each level (root first)
+    leaf_node_size = 4 + block_size * ( key_size + value_size )
+    node_size = 4 + block_size * ( key_size + 8 )
+    header_pos = f.tell()
+    level_offsets = [ 0 ] * level_count
+    pos = header_pos + 32
+    for level in range( level_count - 1, -1, -1 ):
+        level_offsets[level] = pos
+        node_count = max( 1, -( -len( levels[level] ) // block_size ) )
+        pos += node_count * ( leaf_node_size if level == 0 else node_size )
+    # Header
+    f.write( struct.pack( "<IIIIQQ", BPT_SIG, block_size, key_size, value_size, len( items ), 0 ) )
+    # Nodes, root first
+    for level in range( level_count - 1, -1, -1 ):
+        entries = levels[level]
+        is_leaf = ( level == 0 )
+        for i in range( 0, max( 1, len( entries ) ), block_size ):
+            node_entries = entries[i:i+block_size]
+            f.write( struct.pack( "<BBH", is_leaf, 0, len( node_entries ) ) )
+            for key, value in node_entries:
+                f.write( key )
+                if is_leaf:
+                    f.write( value )
+                else:
+                    child_size = leaf_node_size if level == 1 else node_size
+                    f.write( struct.pack( "<Q", level_offsets[level-1] + value * child_size ) )
+            entry_size = key_size + ( value_size if is_leaf else 8 )
+            f.write( '\0' * ( ( block_size - len( node_entries ) ) * entry_size ) )
+
+def write_cir_tree( f, leaves, end_file_offset, block_size=DEFAULT_BLOCK_SIZE,
+                    items_per_slot=DEFAULT_ITEMS_PER_SLOT ):
+    """
+    Write a chromosome id R tree compatible with `CIRTreeFile` at the current
+    position of `f`. `leaves` is an array of `cir_leaf_dtype`, one per data
+    block, sorted by ( chrom_ix, start ).
+    """
+    item_count = len( leaves )
+    # Sort keys packing chrom and base into a single 64 bit value
+    starts = ( leaves['start_chrom_ix'].astype( numpy.uint64 ) << 32 ) | leaves['start_base']
+    ends = ( leaves['end_chrom_ix'].astype( numpy.uint64 ) << 32 ) | leaves['end_base']
+    if item_count:
+        header_start, header_end = int( starts[0] ), int( ends.max() )
+    else:
+        header_start, header_end = 0, 0
+    # Bounds of the nodes of each level from the leaves up
+    levels = [ ( starts, ends ) ]
+    while len( levels[-1][0] ) > block_size:
+        level_starts, level_ends = levels[-1]
+        first = numpy.arange( 0, len( level_starts ), block_size )
+        levels.append( ( level_starts[first], numpy.maximum.reduceat( level_ends, first ) ) )
+    level_count = len( levels )
+    leaf_node_size = 4 + block_size * cir_leaf_dtype.itemsize
+    node_size = 4 + block_size * cir_node_dtype.itemsize
+    level_offsets = [ 0 ] * level_count
+    pos = f.tell() + 48
+    for level in range( level_count - 1, -1, -1 ):
+        level_offsets[level] = pos
+        node_count = max( 1, -( -len( levels[level][0] ) // block_size ) )
+        pos += node_count * ( leaf_node_size if level == 0 else node_size )
+    f.write( struct.pack( "<IIQIIIIQII", CIR_TREE_SIG, block_size, item_count,
+                          header_start >> 32, header_start & 0xFFFFFFFF,
+                          header_end >> 32, header_end & 0xFFFFFFFF,
+                          end_file_offset, items_per_slot, 0 ) )
+    for level in range( level_count - 1, -1, -1 ):
+        is_leaf = ( level == 0 )
+        level_starts, level_ends = levels[level]
+        if is_leaf:
+            entries = leaves
+        else:
+            entries = numpy.zeros( len( level_starts ), dtype=cir_node_dtype )
+            entries['start_chrom_ix'] = level_starts >> 32
+            entries['start_base'] = level_starts & 0xFFFFFFFF
+            entries['end_chrom_ix'] = level_ends >> 32
+            entries['end_base'] = level_ends & 0xFFFFFFFF
+            child_size = leaf_node_size if level == 1 else node_size
+            entries['offset'] = level_offsets[level-1] + numpy.arange( len( entries ), dtype=numpy.uint64 ) * child_size
+        for i in range( 0, max( 1, len( entries ) ), block_size ):
+            node_entries = entries[i:i+block_size]
+            f.write( struct.pack( "<BBH", is_leaf, 0, len( node_entries ) ) )
+            f.write( node_entries.tostring() )
+            f.write( '\0' * ( ( block_size - len( node_entries ) ) * entries.dtype.itemsize ) )
+
+class BlockIndex( object ):
+    """
+    Accumulates one `cir_leaf_dtype` entry per written block. Entries are
+    kept packed so memory use is a fixed 32 bytes per block.
+    """
+    def __init__( self ):
+        self.buffer = StringIO()
+        self.count = 0
+    def add( self, chrom_id, start, end, offset, size ):
+        self.buffer.write( struct.pack( "<IIIIQQ", chrom_id, start, chrom_id, end, offset, size ) )
+        self.count += 1
+    def to_array( self, offset_delta=0 ):
+        leaves = numpy.fromstring( self.buffer.getvalue(), dtype=cir_leaf_dtype )
+        if offset_delta:
+            leaves['offset'] += offset_delta
+        return leaves
+
+def reduce_by_bin( bins, records ):
+    """
+    Combine the summary `records` falling in the same bin, returning the
+    distinct bins and their summaries in order.
+    """
+    order = numpy.argsort( bins, kind='mergesort' )
+    bins = bins[order]
+    records = records[order]
+    first = numpy.concatenate( ( [ 0 ], numpy.flatnonzero( numpy.diff( bins ) ) + 1 ) )
+    summaries = numpy.zeros( len( first ), dtype=summary_dtype )
+    summaries['chrom_id'] = records['chrom_id'][first]
+    summaries['start'] = numpy.minimum.reduceat( records['start'], first )
+    summaries['end'] = numpy.maximum.reduceat( records['end'], first )
+    summaries['min_val'] = numpy.minimum.reduceat( records['min_val'], first )
+    summaries['max_val'] = numpy.maximum.reduceat( records['max_val'], first )
+    for name in ( 'valid_count', 'sum_data', 'sum_squares' ):
+        summaries[name] = numpy.add.reduceat( records[name].astype( numpy.float64 ), first )
+    return bins[first], summaries
+
+class ZoomLevelWriter( object ):
+    """
+    Accumulates summaries of the data at one reduction level. Summary bins
+    are aligned to multiples of `reduction`, completed records are written
+    in compressed blocks of `items_per_slot` to a temporary file.
+    """
+    def __init__( self, reduction, items_per_slot, compress ):
+        self.reduction = reduction
+        self.items_per_slot = items_per_slot
+        self.compress = compress
+        self.file = tempfile.TemporaryFile()
+        self.index = BlockIndex()
+        self.record_count = 0
+        self.max_block_size = 0
+        # Completed records not yet written, and the records for bins that
+        # intervals still to come may add to
+        self.records = []
+        self.record_buffer_count = 0
+        self.pending = numpy.zeros( 0, dtype=summary_dtype )
+        self.pending_bins = numpy.zeros( 0, dtype=numpy.int64 )
+
+    def add( self, chrom_id, starts, ends, values ):
+        """
+        Add the intervals `starts`-`ends` with `values` (arrays sorted by
+        start) on `chrom_id`. Intervals spanning several bins are split.
+        """
+        if len( starts ) == 0:
+            return
+        if len( self.pending ) and self.pending[0]['chrom_id'] != chrom_id:
+            self.flush()
+        r = self.reduction
+        first_bin = starts // r
+        bin_counts = ( ends - 1 ) // r - first_bin + 1
+        # One piece per ( interval, bin ) pair
+        piece_item = numpy.repeat( numpy.arange( len( starts ) ), bin_counts )
+        piece_offset = numpy.arange( len( piece_item ) ) - numpy.repeat( numpy.cumsum( bin_counts ) - bin_counts, bin_counts )
+        bins = first_bin[piece_item] + piece_offset
+        pieces = numpy.zeros( len( bins ), dtype=summary_dtype )
+        pieces['chrom_id'] = chrom_id
+        pieces['start'] = numpy.maximum( starts[piece_item], bins * r )
+        pieces['end'] = numpy.minimum( ends[piece_item], ( bins + 1 ) * r )
+        piece_values = values[piece_item].astype( numpy.float64 )
+        widths = ( pieces['end'] - pieces['start'] ).astype( numpy.float64 )
+        pieces['valid_count'] = widths
+        pieces['min_val'] = piece_values
+        pieces['max_val'] = piece_values
+        pieces['sum_data'] = widths * piece_values
+        pieces['sum_squares'] = widths * piece_values * piece_values
+        bins, summaries = reduce_by_bin( numpy.concatenate( ( self.pending_bins, bins ) ),
+                                         numpy.concatenate( ( self.pending, pieces ) ) )
+        # Later intervals start at or after the last start so can only add
+        # to its bin or later ones
+        done = bins < first_bin[-1]
+        self.add_records( summaries[done] )
+        self.pending = summaries[~done]
+        self.pending_bins = bins[~done]
+
+    def add_records( self, records ):
+        if len( records ) == 0:
+            return
+        self.records.append( records )
+        self.record_buffer_count += len( records )
+        if self.record_buffer_count >= self.items_per_slot:
+            records = numpy.concatenate( self.records )
+            n = len( records ) - ( len( records ) % self.items_per_slot )
+            for i in range( 0, n, self.items_per_slot ):
+                self.write_block( records[i:i+self.items_per_slot] )
+            self.records = [ records[n:] ]
+            self.record_buffer_count = len( records ) - n
+
+    def flush( self ):
+        """
+        Write out all buffered records, called at the end of a chromosome so
+        that blocks never span chromosomes.
+        """
+        self.add_records( self.pending )
+        self.pending = self.pending[:0]
+        self.pending_bins = self.pending_bins[:0]
+        if self.record_buffer_count:
+            self.write_block( numpy.concatenate( self.records ) )
+        self.records = []
+        self.record_buffer_count = 0
+
+    def write_block( self, records ):
+        data = records.tostring()
+        self.max_block_size = max( self.max_block_size, len( data ) )
+        if self.compress:
+            data = zlib.compress( data )
+        self.index.add( records[0]['chrom_id'], records[0]['start'], records['end'].max(), self.file.tell(), len( data ) )
+        self.file.write( data )
+        self.record_count += len( records )
+
+class BBIWriter( object ):
+    """
+    Base class for writing a "big binary indexed" file. Subclasses provide
+    the encoding of data blocks (`encode_block`) and the values that feed
+    the zoom level summaries.
+
+    `chrom_sizes` maps chromosome names to sizes; if not provided the size of
+    each chromosome is taken to be the largest end seen. `zoom_levels`
+    optionally gives the reduction levels to build, otherwise they are
+    chosen from the average item size in the first block of data.
+    """
+
+    def __init__( self, f, magic, chrom_sizes=None, block_size=DEFAULT_BLOCK_SIZE,
+                  items_per_slot=DEFAULT_ITEMS_PER_SLOT, compress=True, zoom_levels=None,
+                  auto_sql=None ):
+        self.f = f
+        self.magic = magic
+        self.chrom_sizes = chrom_sizes
+        self.block_size = block_size
+        self.items_per_slot = items_per_slot
+        self.compress = compress
+        self.requested_zoom_levels = zoom_levels
+        self.auto_sql = auto_sql
+        self.field_count = 0
+        self.defined_field_count = 0
+        # Chromosomes are numbered in the order they are first seen
+        self.chrom_ids = {}
+        self.chrom_max_end = {}
+        self.chrom = None
+        self.chrom_id = -1
+        self.last_start = 0
+        self.last_end = 0
+        # Buffered data for the current chromosome
+        self.chunks = []
+        self.chunk_count = 0
+        # Written blocks
+        self.index = BlockIndex()
+        self.item_count = 0
+        self.max_block_size = 0
+        self.zooms = None
+        # Overall summary
+        self.total_bases = 0
+        self.total_min = numpy.inf
+        self.total_max = -numpy.inf
+        self.total_sum = 0.0
+        self.total_sum_squares = 0.0
+        # Reserve space for header, zoom headers, autoSql and total summary
+        self.header_pos = f.tell()
+        f.write( '\0' * ( BBI_HEADER_SIZE + MAX_ZOOM_LEVELS * 24 ) )
+        self.as_offset = 0
+        if auto_sql is not None:
+            self.as_offset = f.tell()
+            f.write( auto_sql + '\0' )
+        self.total_summary_offset = f.tell()
+        f.write( '\0' * TOTAL_SUMMARY_SIZE )
+        self.data_offset = f.tell()
+        # Count of blocks or items, filled in by `finish`
+        f.write( '\0' * 8 )
+
+    def set_chrom( self, chrom ):
+        """
+        Start (or continue) the chromosome `chrom`.
+        """
+        if chrom == self.chrom:
+            return
+        self.flush()
+        if chrom in self.chrom_ids:
+            raise ValueError( "Input is not sorted, chromosome %s seen again" % chrom )
+        if self.chrom_sizes is not None and chrom not in self.chrom_sizes:
+            raise ValueError( "No size for chromosome %s" % chrom )
+        self.chrom = chrom
+        self.chrom_id = self.chrom_ids[chrom] = len( self.chrom_ids )
+        self.chrom_max_end[chrom] = 0
+        self.last_start = self.last_end = 0
+
+    def add_arrays( self, starts, ends, values ):
+        """
+        Add sorted items on the current chromosome.
+        """
+        if len( starts ) == 0:
+            return
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        self.check_sorted( starts, ends )
+        if numpy.any( ends <= starts ):
+            raise ValueError( "Empty or negative length interval on %s" % self.chrom )
+        if self.chrom_sizes is not None and ends.max() > self.chrom_sizes[self.chrom]:
+            raise ValueError( "Interval extends past end of %s" % self.chrom )
+        self.last_start = starts[-1]
+        self.last_end = max( self.last_end, ends.max() )
+        self.chrom_max_end[self.chrom] = self.last_end
+        # Summaries
+        summary_values = self.summary_values( values, len( starts ) )
+        widths = ( ends - starts ).astype( numpy.float64 )
+        self.total_bases += int( widths.sum() )
+        self.total_min = min( self.total_min, summary_values.min() )
+        self.total_max = max( self.total_max, summary_values.max() )
+        self.total_sum += float( ( widths * summary_values ).sum() )
+        self.total_sum_squares += float( ( widths * summary_values * summary_values ).sum() )
+        if self.zooms is None:
+            self.init_zooms( widths.mean() )
+        for zoom in self.zooms:
+            zoom.add( self.chrom_id, starts, ends, summary_values )
+        # Buffer and write out complete blocks
+        self.chunks.append( ( starts, ends, values ) )
+        self.chunk_count += len( starts )
+        if self.chunk_count >= self.items_per_slot:
+            starts, ends, values = self.concatenate_chunks()
+            n = len( starts ) - ( len( starts ) % self.items_per_slot )
+            for i in range( 0, n, self.items_per_slot ):
+                j = i + self.items_per_slot
+                self.write_block( starts[i:j], ends[i:j], values[i:j] )
+            self.chunks = [ ( starts[n:], ends[n:], values[n:] ) ]
+            self.chunk_count = len( starts ) - n
+
+    def check_sorted( self, starts, ends ):
+        if starts[0] < self.last_start or numpy.any( starts[1:] < starts[:-1] ):
+            raise ValueError( "Input is not sorted by start on %s" % self.chrom )
+
+    def concatenate_chunks( self ):
+        starts = numpy.concatenate( [ c[0] for c in self.chunks ] )
+        ends = numpy.concatenate( [ c[1] for c in self.chunks ] )
+        values = numpy.concatenate( [ c[2] for c in self.chunks ] )
+        return starts, ends, values
+
+    def init_zooms( self, mean_width ):
+        if self.requested_zoom_levels is not None:
+            reductions = list( self.requested_zoom_levels )[:MAX_ZOOM_LEVELS]
+        else:
+            reduction = max( int( mean_width * 10 ), 10 )
+            reductions = []
+            while len( reductions ) < MAX_ZOOM_LEVELS and reduction < 2**31:
+                reductions.append( reduction )
+                reduction *= ZOOM_INCREMENT
+        self.zooms = [ ZoomLevelWriter( r, self.items_per_slot, self.compress ) for r in reductions ]
+
+    def flush( self ):
+        """
+        Write out everything buffered for the current chromosome.
+        """
+        if self.chunk_count:
+            self.write_block( *self.concatenate_chunks() )
+        self.chunks = []
+        self.chunk_count = 0
+        for zoom in self.zooms or []:
+            zoom.flush()
+
+    def write_block( self, starts, ends, values ):
+        data = self.encode_block( starts, ends, values )
+        self.max_block_size = max( self.max_block_size, len( data ) )
+        if self.compress:
+            data = zlib.compress( data )
+        self.index.add( self.chrom_id, starts[0], ends.max(), self.f.tell(), len( data ) )
+        self.f.write( data )
+        self.item_count += len( starts )
+
+    def summary_values( self, values, count ):
+        raise NotImplementedError()
+
+    def encode_block( self, starts, ends, values ):
+        raise NotImplementedError()
+
+    def data_count( self ):
+        return self.index.count
+
+    def finish( self ):
+        """
+        Write indexes, zoom levels and the chromosome tree and fill in the
+        header. The underlying file is not closed.
+        """
+        self.flush()
+        f = self.f
+        # Full data index
+        data_end = f.tell()
+        index_offset = data_end
+        write_cir_tree( f, self.index.to_array(), data_end, self.block_size, self.items_per_slot )
+        # Zoom levels, dropping those that do not reduce the size enough
+        # to be worth having
+        zoom_headers = []
+        previous_count = self.item_count
+        for zoom in self.zooms or []:
+            if zoom.record_count == 0 or zoom.record_count * 2 > previous_count:
+                break
+            previous_count = zoom.record_count
+            zoom_data_offset = f.tell()
+            f.write( struct.pack( "<I", zoom.record_count ) )
+            zoom.file.seek( 0 )
+            while True:
+                data = zoom.file.read( 1024 * 1024 )
+                if not data:
+                    break
+                f.write( data )
+            zoom_index_offset = f.tell()
+            write_cir_tree( f, zoom.index.to_array( zoom_data_offset + 4 ), zoom_index_offset,
+                            self.block_size, self.items_per_slot )
+            zoom_headers.append( ( zoom.reduction, zoom_data_offset, zoom_index_offset ) )
+            self.max_block_size = max( self.max_block_size, zoom.max_block_size )
+        for zoom in self.zooms or []:
+            zoom.file.close()
+        # Chromosome tree
+        chrom_tree_offset = f.tell()
+        items = []
+        for chrom, chrom_id in self.chrom_ids.iteritems():
+            if self.chrom_sizes is not None:
+                size = self.chrom_sizes[chrom]
+            else:
+                size = self.chrom_max_end[chrom]
+            items.append( ( chrom, struct.pack( "<II", chrom_id, size ) ) )
+        write_bpt( f, items, self.block_size )
+        end_pos = f.tell()
+        # Header
+        f.seek( self.header_pos )
+        f.write( struct.pack( "<IHHQQQHHQQIQ", self.magic, BBI_VERSION, len( zoom_headers ),
+                              chrom_tree_offset, self.data_offset, index_offset,
+                              self.field_count, self.defined_field_count, self.as_offset,
+                              self.total_summary_offset,
+                              self.max_block_size if self.compress else 0, 0 ) )
+        for reduction, data_offset, zoom_index_offset in zoom_headers:
+            f.write( struct.pack( "<IIQQ", reduction, 0, data_offset, zoom_index_offset ) )
+        f.seek( self.total_summary_offset )
+        if self.total_bases:
+            f.write( struct.pack( "<Qdddd", self.total_bases, self.total_min, self.total_max,
+                                  self.total_sum, self.total_sum_squares ) )
+        f.seek( self.data_offset )
+        f.write( struct.pack( "<Q", self.data_count() ) )
+        f.seek( end_pos )
+
+class BigWigWriter( BBIWriter ):
+    """
+    Writes a bigWig file from sorted, non-overlapping intervals with values.
+    Data is stored as bedGraph sections.
+
+    >>> from StringIO import StringIO
+    >>> out = StringIO()
+    >>> w = BigWigWriter( out, chrom_sizes={ 'chr1': 1000 } )
+    >>> w.add_interval( 'chr1', 10, 20, 1.0 )
+    >>> w.add_array( 'chr1', 20, [ 1.0, 1.0, 2.0, numpy.nan, 3.0 ] )
+    >>> w.finish()
+    >>> from bx.bbi.bigwig_file import BigWigFile
+    >>> out.seek( 0 )
+    >>> BigWigFile( out ).get( 'chr1', 0, 1000 )
+    [(10, 20, 1.0), (20, 22, 1.0), (22, 23, 2.0), (24, 25, 3.0)]
+    """
+    def __init__( self, f, chrom_sizes=None, **kwargs ):
+        BBIWriter.__init__( self, f, BIG_WIG_SIG, chrom_sizes, **kwargs )
+        self.last_value = None
+        self.item_starts = []
+        self.item_ends = []
+        self.item_values = []
+
+    def add_interval( self, chrom, start, end, value ):
+        """
+        Add a single interval, adjacent intervals with the same value are
+        merged.
+        """
+        if chrom != self.chrom:
+            self.set_chrom( chrom )
+        if self.item_ends and start == self.item_ends[-1] and value == self.item_values[-1]:
+            self.item_ends[-1] = end
+            return
+        if len( self.item_starts ) >= self.items_per_slot:
+            self.flush_items()
+        self.item_starts.append( start )
+        self.item_ends.append( end )
+        self.item_values.append( value )
+
+    def add_intervals( self, chrom, starts, ends, values ):
+        """
+        Add sorted, non-overlapping intervals from arrays.
+        """
+        if chrom != self.chrom:
+            self.set_chrom( chrom )
+        self.flush_items()
+        self.add_arrays( starts, ends, numpy.asarray( values, dtype=numpy.float32 ) )
+
+    def add_array( self, chrom, start, values ):
+        """
+        Add per base values starting at `start`, runs of equal values are
+        stored as a single interval and NaN values are skipped.
+        """
+        values = numpy.asarray( values, dtype=numpy.float32 )
+        if len( values ) == 0:
+            return
+        # Boundaries of runs of equal (or NaN) values
+        nan = numpy.isnan( values )
+        changed = ( values[1:] != values[:-1] ) & ~( nan[1:] & nan[:-1] )
+        run_starts = numpy.concatenate( ( [ 0 ], numpy.flatnonzero( changed ) + 1 ) )
+        run_ends = numpy.concatenate( ( run_starts[1:], [ len( values ) ] ) )
+        keep = ~nan[run_starts]
+        self.add_intervals( chrom, start + run_starts[keep], start + run_ends[keep], values[run_starts[keep]] )
+
+    def add_wiggle( self, reader ):
+        """
+        Add all intervals from `reader`, which can yield ( chrom, start, end,
+        strand, value ) like `bx.wiggle.IntervalReader` and
+        `bx.arrays.wiggle.WiggleReader`, or ( chrom, position, value ) like
+        `bx.wiggle.Reader`.
+        """
+        for fields in reader:
+            if len( fields ) == 3:
+                chrom, pos, value = fields
+                self.add_interval( chrom, pos, pos + 1, value )
+            else:
+                chrom, start, end, strand, value = fields
+                self.add_interval( chrom, start, end, value )
+
+    def flush_items( self ):
+        if self.item_starts:
+            starts, ends, values = self.item_starts, self.item_ends, self.item_values
+            self.item_starts, self.item_ends, self.item_values = [], [], []
+            self.add_arrays( starts, ends, numpy.array( values, dtype=numpy.float32 ) )
+
+    def set_chrom( self, chrom ):
+        self.flush_items()
+        BBIWriter.set_chrom( self, chrom )
+
+    def flush( self ):
+        self.flush_items()
+        BBIWriter.flush( self )
+
+    def check_sorted( self, starts, ends ):
+        if starts[0] < self.last_end or numpy.any( starts[1:] < ends[:-1] ):
+            raise ValueError( "Input is not sorted or has overlapping intervals on %s" % self.chrom )
+
+    def summary_values( self, values, count ):
+        return values
+
+    def encode_block( self, starts, ends, values ):
+        items = numpy.empty( len( starts ), dtype=bed_graph_item_dtype )
+        items['start'] = starts
+        items['end'] = ends
+        items['val'] = values
+        header = struct.pack( "<IIIIIBBH", self.chrom_id, starts[0], ends.max(), 0, 0, BWG_BED_GRAPH, 0, len( items ) )
+        return header + items.tostring()
+
+class BigBedWriter( BBIWriter ):
+    """
+    Writes a bigBed file from sorted BED records. The fields after the end
+    column are stored as a tab separated string, as in the BED input.
+
+    >>> from StringIO import StringIO
+    >>> out = StringIO()
+    >>> w = BigBedWriter( out, chrom_sizes={ 'chr1': 1000 } )
+    >>> w.add_bed( [ "chr1\\t10\\t20\\tfoo\\t0\\t+", "chr1\\t15\\t30\\tbar\\t0\\t-" ] )
+    >>> w.finish()
+    >>> from bx.bbi.bigbed_file import BigBedFile
+    >>> out.seek( 0 )
+    >>> [ str( x ) for x in BigBedFile( out ).get( 'chr1', 0, 1000 ) ]
+    ['chr1\\t10\\t20\\tfoo\\t0\\t+', 'chr1\\t15\\t30\\tbar\\t0\\t-']
+    """
+    def __init__( self, f, chrom_sizes=None, field_count=None, **kwargs ):
+        BBIWriter.__init__( self, f, BIG_BED_SIG, chrom_sizes, **kwargs )
+        self.requested_field_count = field_count
+        self.item_starts = []
+        self.item_ends = []
+        self.item_rests = []
+
+    def add_interval( self, chrom, start, end, rest="" ):
+        """
+        Add a single record, `rest` holds the tab separated fields after end.
+        """
+        if chrom != self.chrom:
+            self.set_chrom( chrom )
+        if not self.field_count:
+            self.field_count = self.requested_field_count or ( 3 + ( len( rest.split( "\t" ) ) if rest else 0 ) )
+            self.defined_field_count = self.field_count
+        if len( self.item_starts ) >= self.items_per_slot:
+            self.flush_items()
+        self.item_starts.append( start )
+        self.item_ends.append( end )
+        self.item_rests.append( rest )
+
+    def add_bed( self, reader ):
+        """
+        Add all records from `reader`, which can yield BED lines or
+        `GenomicInterval` objects (e.g. from `bx.intervals.io.GenomicIntervalReader`).
+        Other objects, such as header or comment rows, are skipped.
+        """
+        for row in reader:
+            if isinstance( row, basestring ):
+                if row.isspace() or row.startswith( "#" ) or row.startswith( "track" ) or row.startswith( "browser" ):
+                    continue
+                fields = row.rstrip( "\r\n" ).split( "\t" )
+                self.add_interval( fields[0], int( fields[1] ), int( fields[2] ), "\t".join( fields[3:] ) )
+            elif hasattr( row, 'fields' ) and hasattr( row, 'chrom' ):
+                # The remaining fields in order, wherever the reader found
+                # the chrom, start and end columns
+                skip = ( row.chrom_col, row.start_col, row.end_col )
+                rest = [ f for i, f in enumerate( row.fields ) if i not in skip ]
+                self.add_interval( row.chrom, row.start, row.end, "\t".join( rest ) )
+
+    def flush_items( self ):
+        if self.item_starts:
+            starts, ends, rests = self.item_starts, self.item_ends, self.item_rests
+            self.item_starts, self.item_ends, self.item_rests = [], [], []
+            self.add_arrays( starts, ends, numpy.array( rests, dtype=object ) )
+
+    def set_chrom( self, chrom ):
+        self.flush_items()
+        BBIWriter.set_chrom( self, chrom )
+
+    def flush( self ):
+        self.flush_items()
+        BBIWriter.flush( self )
+
+    def summary_values( self, values, count ):
+        # Zoom levels for bed record coverage
+        return numpy.ones( count, dtype=numpy.float32 )
+
+    def encode_block( self, starts, ends, rests ):
+        pack = struct.pack
+        chrom_id = self.chrom_id
+        return "".join( [ pack( "<III", chrom_id, s, e ) + rest + '\0' for s, e, rest in zip( starts, ends, rests ) ] )
+
+    def data_count( self ):
+        return self.item_count
@@ -0,0 +1,131 @@
+import sys, os
+import unittest
+import numpy
+from StringIO import StringIO
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+except:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(".")))
+
+from bx.bbi.bbi_writer import BigWigWriter, BigBedWriter
+from bx.bbi.bigwig_file import BigWigFile
+from bx.bbi.bigbed_file import BigBedFile
+from bx import wiggle
+from bx.intervals.io import GenomicIntervalReader
+
+class TestBigWigWriter(unittest.TestCase):
+    def setUp(self):
+        out = StringIO()
+        writer = BigWigWriter( out )
+        writer.add_wiggle( wiggle.IntervalReader( open( "test_data/bbi_tests/test.wig" ) ) )
+        writer.finish()
+        out.seek( 0 )
+        self.bw = BigWigFile( file=out )
+        self.ref = BigWigFile( file=open( "test_data/bbi_tests/test.bw" ) )
+
+    def test_get_matches_reference(self):
+        for start, end in [ ( 10000, 20000 ), ( 11000, 11005 ), ( 0, 5000000 ) ]:
+            a = self.bw.get_as_array( "chr1", start, end )
+            b = self.ref.get_as_array( "chr1", start, end )
+            assert numpy.array_equal( numpy.isnan( a ), numpy.isnan( b ) )
+            assert numpy.allclose( a[~numpy.isnan( a )], b[~numpy.isnan( b )] )
+
+    def test_summarize_from_full(self):
+        a = self.bw.summarize_from_full( "chr1", 10000, 20000, 10 )
+        b = self.ref.summarize_from_full( "chr1", 10000, 20000, 10 )
+        assert numpy.allclose( a.sum_data / a.valid_count, b.sum_data / b.valid_count )
+        assert numpy.allclose( a.min_val, b.min_val )
+        assert numpy.allclose( a.max_val, b.max_val )
+
+    def test_zoom_levels(self):
+        assert self.bw.zoom_levels > 0
+        full = self.bw.get( "chr1", 0, 5000000 )
+        bases = sum( e - s for s, e, v in full )
+        for level in self.bw.level_list:
+            summaries = level._summary_blocks_in_region( 0, 0, 5000000 )
+            self.assertEqual( sum( s['valid_count'] for s in summaries ), bases )
+            assert numpy.allclose( min( s['min_val'] for s in summaries ), min( v for s, e, v in full ) )
+
+    def test_wrong_nochrom(self):
+        self.assertEqual( self.bw.get( "chr2", 0, 10000 ), None )
+
+def test_many_chroms():
+    # Small block size so both trees have several levels
+    out = StringIO()
+    sizes = dict( ( "chr%d" % i, 1000 + i ) for i in range( 50 ) )
+    writer = BigWigWriter( out, chrom_sizes=sizes, block_size=4, items_per_slot=8 )
+    for i in range( 50 ):
+        writer.add_array( "chr%d" % i, 100, numpy.arange( 100 ) + i )
+    writer.finish()
+    out.seek( 0 )
+    bw = BigWigFile( file=out )
+    for i in range( 50 ):
+        a = bw.get_as_array( "chr%d" % i, 0, 300 )
+        assert numpy.all( numpy.isnan( a[:100] ) )
+        assert numpy.all( a[100:200] == numpy.arange( 100 ) + i )
+        assert numpy.all( numpy.isnan( a[200:] ) )
+    # Names missing from the chromosome tree, including before the first
+    # and after the last key
+    for name in ( "chr", "chr0a", "chr5x", "chr99", "z" * 100 ):
+        assert bw.get( name, 0, 300 ) is None
+
+def test_unsorted_input():
+    writer = BigWigWriter( StringIO() )
+    writer.add_interval( "chr1", 10, 20, 1.0 )
+    writer.add_interval( "chr1", 15, 30, 2.0 )
+    try:
+        writer.finish()
+    except ValueError:
+        pass
+    else:
+        assert False, "Overlapping intervals not detected"
+    writer = BigWigWriter( StringIO() )
+    writer.add_interval( "chr1", 10, 20, 1.0 )
+    writer.add_interval( "chr2", 10, 20, 1.0 )
+    try:
+        writer.add_interval( "chr1", 30, 40, 1.0 )
+    except ValueError:
+        pass
+    else:
+        assert False, "Repeated chromosome not detected"
+
+def test_bigbed_writer():
+    lines = [ "chr2\t%d\t%d\tname%d\t0\t+" % ( i * 10, i * 10 + 25, i ) for i in range( 3000 ) ]
+    lines += [ "chr1\t%d\t%d\tname%d\t0\t-" % ( i * 100, i * 100 + 5, i ) for i in range( 10 ) ]
+    out = StringIO()
+    writer = BigBedWriter( out )
+    writer.add_bed( lines )
+    writer.finish()
+    out.seek( 0 )
+    bb = BigBedFile( file=out )
+    assert [ str( x ) for x in bb.get( "chr2", 0, 100000 ) ] == lines[:3000]
+    assert [ str( x ) for x in bb.get( "chr1", 150, 405 ) ] == lines[3002:3005]
+    starts, ends, rest_offsets, rest_data = bb.get_arrays( "chr2", 95, 1000 )
+    rest = rest_data.tostring()
+    assert [ "chr2\t%d\t%d\t%s" % ( s, e, rest[rest_offsets[i]:rest_offsets[i+1]] )
+             for i, ( s, e ) in enumerate( zip( starts, ends ) ) ] == lines[8:100]
+    chunks = list( bb.iter_arrays( "chr2", 0, 100000, chunk_size=1000 ) )
+    assert [ len( c[0] ) for c in chunks ] == [ 1024, 1024, 952 ]
+    assert chunks[-1][3][chunks[-1][2][-2]:].tostring() == "name2999\t0\t+"
+    sd = bb.summarize_from_full( "chr2", 0, 30000, 3 )
+    assert sd.valid_count[1] == 25000
+    batch = bb.summarize_many( [ "chr2", "chr1" ], [ 0, 0 ], [ 30000, 1000 ], 3 )
+    assert numpy.allclose( batch[0].valid_count, bb.summarize( "chr2", 0, 30000, 3 ).valid_count )
+    assert numpy.all( batch[1].valid_count == bb.summarize( "chr1", 0, 1000, 3 ).valid_count )
+
+def test_bigbed_writer_reader_columns():
+    # Intervals from a reader are written using its chrom, start and end
+    # columns, wherever they are
+    lines = [ "name%d\tchr1\t%d\t%d\t+" % ( i, i * 10, i * 10 + 5 ) for i in range( 100 ) ]
+    out = StringIO()
+    writer = BigBedWriter( out )
+    writer.add_bed( GenomicIntervalReader( [ "#header" ] + lines, chrom_col=1, start_col=2, end_col=3, strand_col=4 ) )
+    writer.finish()
+    out.seek( 0 )
+    bb = BigBedFile( file=out )
+    assert [ str( x ) for x in bb.get( "chr1", 0, 1000 ) ] == \
+        [ "chr1\t%d\t%d\tname%d\t+" % ( i * 10, i * 10 + 5, i ) for i in range( 100 ) ]
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,10 +4,12 @@ BigBed file.
 """
 
 from bbi_file cimport *
+from bbi_file import DEFAULT_BLOCK_CACHE_SIZE, DEFAULT_CHUNK_SIZE, chunk_columns, expand_ranges
 from cirtree_file cimport CIRTreeFile
 import numpy as np
 cimport numpy as np
 from types cimport *
+from libc.string cimport memchr, memcpy
 from bx.intervals.io import GenomicInterval
 from bx.misc.binary_file import BinaryFileReader
 from cStringIO import StringIO
@@ -36,11 +38,60 @@ cdef str read_c_string(fh):
     l = len(read[-1])
     if l == chunksize:
         fh.seek(-(chunksize - pos) + 1, 1)
-    if l != chunksize:
-        read[-1] = read[-1][:pos]
+    read[-1] = read[-1][:pos]
 
     return "".join(read) if len(read) > 1 else read[0]
 
+cdef inline bits32 swap32( bits32 v ):
+    return ( v >> 24 ) | ( ( v >> 8 ) & 0xff00 ) | ( ( v << 8 ) & 0xff0000 ) | ( v << 24 )
+
+def block_records( bytes block_data, bits32 chrom_id, bint byteswap ):
+    """
+    Parse the records on `chrom_id` in a block into starts and ends arrays
+    and the rest of each record packed into one uint8 array, record i's
+    being from `rest_offsets[i]` to `rest_offsets[i+1]`.
+    """
+    cdef char * data = block_data
+    cdef char * nul
+    cdef Py_ssize_t length = len( block_data ), pos = 0, rest_length
+    cdef Py_ssize_t count = 0, rest_size = 0
+    cdef bits32 fields[3]
+    # Each record has at least 12 bytes of coordinates and a terminating NUL
+    cdef np.ndarray[ np.uint32_t ] starts = np.empty( length // 13, np.uint32 )
+    cdef np.ndarray[ np.uint32_t ] ends = np.empty( length // 13, np.uint32 )
+    cdef np.ndarray[ np.int64_t ] rest_offsets = np.empty( length // 13 + 1, np.int64 )
+    cdef np.ndarray[ np.uint8_t ] rest_data = np.empty( length, np.uint8 )
+    rest_offsets[0] = 0
+    while pos + 12 < length:
+        memcpy( fields, data + pos, 12 )
+        if byteswap:
+            fields[0] = swap32( fields[0] )
+            fields[1] = swap32( fields[1] )
+            fields[2] = swap32( fields[2] )
+        nul = <char *> memchr( data + pos + 12, 0, length - pos - 12 )
+        if nul == NULL:
+            raise ValueError( "Unterminated bigBed record" )
+        rest_length = nul - ( data + pos + 12 )
+        if fields[0] == chrom_id:
+            starts[count] = fields[1]
+            ends[count] = fields[2]
+            memcpy( <char *> rest_data.data + rest_size, data + pos + 12, rest_length )
+            rest_size += rest_length
+            count += 1
+            rest_offsets[count] = rest_size
+        pos += 12 + rest_length + 1
+    return starts[:count], ends[:count], rest_offsets[:count+1], rest_data[:rest_size]
+
+def concatenate_records( parts ):
+    """
+    Concatenate a list of ( starts, ends, rest_offsets, rest_data ) tuples
+    """
+    shifts = np.cumsum( [ 0 ] + [ len( p[3] ) for p in parts[:-1] ] )
+    return ( np.concatenate( [ p[0] for p in parts ] ),
+             np.concatenate( [ p[1] for p in parts ] ),
+             np.concatenate( [ [ 0 ] ] + [ p[2][1:] + shift for p, shift in zip( parts, shifts ) ] ).astype( np.int64 ),
+             np.concatenate( [ p[3] for p in parts ] ) )
+
 cdef class BigBedBlockHandler( BlockHandler ):
     """
     BlockHandler that parses the block into a series of BED records
@@ -108,8 +159,9 @@ cdef class BigBedFile( BBIFile ):
     """
     A "big binary indexed" file whose raw data is in BED format.
     """
-    def __init__( self, file=None ):
-        BBIFile.__init__( self, file, big_bed_sig, "bigbed" )
+    def __init__( self, file=None, block_cache_size=DEFAULT_BLOCK_CACHE_SIZE, use_mmap=False, decompress_workers=1 ):
+        BBIFile.__init__( self, file, big_bed_sig, "bigbed", block_cache_size=block_cache_size,
+                          use_mmap=use_mmap, decompress_workers=decompress_workers )
 
     cdef _summarize_from_full( self, bits32 chrom_id, bits32 start, bits32 end, int summary_size ):
         """
@@ -119,6 +171,58 @@ cdef class BigBedFile( BBIFile ):
         self.visit_blocks_in_region( chrom_id, start, end, v )
         np.round(v.sd.valid_count, out=v.sd.valid_count)
         return v.sd
+
+    cdef _block_arrays( self, block_data, bits32 chrom_id ):
+        """
+        Starts and ends of the records in a block, values are None.
+        """
+        starts, ends, rest_offsets, rest_data = block_records( block_data, chrom_id, self.is_byteswapped )
+        return starts, ends, None
+
+    def get_arrays( self, chrom, bits32 start, bits32 end ):
+        """
+        Gets all records overlapping the region `chrom`:`start`-`end` as
+        ( starts, ends, rest_offsets, rest_data ) arrays. The fields after
+        the end of record i are the tab separated string
+        `rest_data[rest_offsets[i]:rest_offsets[i+1]]`, `rest_data` being a
+        uint8 array.
+        """
+        if start >= end:
+            return None
+        chrom_id, chrom_size = self._get_chrom_id_and_size( chrom )
+        if chrom_id is None:
+            return None
+        for chunk in self.iter_arrays( chrom, start, end, chunk_size=None ):
+            return chunk
+        return np.zeros( 0, np.uint32 ), np.zeros( 0, np.uint32 ), np.zeros( 1, np.int64 ), np.zeros( 0, np.uint8 )
+
+    def iter_arrays( self, chrom, bits32 start, bits32 end, chunk_size=DEFAULT_CHUNK_SIZE ):
+        """
+        Like `get_arrays` but yields the records in chunks of about
+        `chunk_size` records, so a large region is never in memory at once.
+        """
+        if start >= end:
+            return iter( [] )
+        chrom_id, chrom_size = self._get_chrom_id_and_size( chrom )
+        if chrom_id is None:
+            return iter( [] )
+        return chunk_columns( self._region_records( chrom_id, start, end ), chunk_size, concatenate_records )
+
+    def _region_records( self, bits32 chrom_id, bits32 start, bits32 end ):
+        """
+        Yield the records of each block overlapping the region
+        """
+        block_list = self._unzoomed_index().find_overlapping_blocks( chrom_id, start, end )
+        for block_data in self._iter_blocks( block_list ):
+            starts, ends, rest_offsets, rest_data = block_records( block_data, chrom_id, self.is_byteswapped )
+            keep = ( starts < end ) & ( ends > start )
+            if not keep.all():
+                lengths = np.diff( rest_offsets )[keep]
+                rest_data = rest_data[ expand_ranges( rest_offsets[:-1][keep], lengths )[1] ]
+                rest_offsets = np.concatenate( ( [ 0 ], np.cumsum( lengths ) ) )
+                starts = starts[keep]
+                ends = ends[keep]
+            yield starts, ends, rest_offsets, rest_data
         
     cpdef get( self, char * chrom, bits32 start, bits32 end ):
         """
@@ -5,6 +5,7 @@ BigWig file.
 
 from collections import deque
 from bbi_file cimport *
+from bbi_file import DEFAULT_BLOCK_CACHE_SIZE, DEFAULT_CHUNK_SIZE, chunk_columns, expand_ranges, group_by_chrom, overlapping_pairs
 from cirtree_file cimport CIRTreeFile
 import numpy
 cimport numpy
@@ -55,7 +56,7 @@ cdef class BigWigBlockHandler( BlockHandler ):
             sevs = [(s, s + b_item_span, v) for s, v in svs]
         elif b_type == bwg_fixed_step:
             vs = block_reader.read_and_unpack("f" * b_item_count, 4 * b_item_count)
-            sevs = [(b_start + (i * b_item_span), b_start + (i * b_item_span) + b_item_span, v) for i, v in enumerate(vs)]
+            sevs = [(b_start + (i * b_item_step), b_start + (i * b_item_step) + b_item_span, v) for i, v in enumerate(vs)]
 
         # TODO: change handle_interval to take a numpy array and this will be
         # much faster.
@@ -113,12 +114,35 @@ cdef class ArrayAccumulatingBlockHandler( BigWigBlockHandler ):
         # Slicing is optimized by Cython
         self.array[s - self.start:e - self.start] = val
 
+cdef block_arrays( block_data, bits32 chrom_id, is_little_endian ):
+    """
+    Parse a block into ( starts, ends, values ) arrays without a Python
+    object per record.
+    """
+    order = "<" if is_little_endian else ">"
+    header = numpy.frombuffer( block_data, numpy.dtype( order + "u4,u4,u4,u4,u4,u1,u1,u2" ), 1 )[0]
+    b_chrom_id, b_start, b_end, b_item_step, b_item_span, b_type, _, b_item_count = header
+    if b_chrom_id != chrom_id:
+        return numpy.zeros( 0, numpy.uint32 ), numpy.zeros( 0, numpy.uint32 ), numpy.zeros( 0, numpy.float32 )
+    if b_type == bwg_bed_graph:
+        items = numpy.frombuffer( block_data, numpy.dtype( [ ( 'start', order + 'u4' ), ( 'end', order + 'u4' ), ( 'val', order + 'f4' ) ] ), b_item_count, 24 )
+        return items['start'], items['end'], items['val']
+    elif b_type == bwg_variable_step:
+        items = numpy.frombuffer( block_data, numpy.dtype( [ ( 'start', order + 'u4' ), ( 'val', order + 'f4' ) ] ), b_item_count, 24 )
+        return items['start'], items['start'] + b_item_span, items['val']
+    elif b_type == bwg_fixed_step:
+        vals = numpy.frombuffer( block_data, numpy.dtype( order + 'f4' ), b_item_count, 24 )
+        starts = b_start + b_item_step * numpy.arange( b_item_count, dtype=numpy.uint32 )
+        return starts, starts + b_item_span, vals
+    raise ValueError( "Unknown bigWig section type %d" % b_type )
+
 cdef class BigWigFile( BBIFile ): 
     """
     A "big binary indexed" file whose raw data is in wiggle format.
     """
-    def __init__( self, file=None ):
-        BBIFile.__init__( self, file, big_wig_sig, "bigwig" )
+    def __init__( self, file=None, block_cache_size=DEFAULT_BLOCK_CACHE_SIZE, use_mmap=False, decompress_workers=1 ):
+        BBIFile.__init__( self, file, big_wig_sig, "bigwig", block_cache_size=block_cache_size,
+                          use_mmap=use_mmap, decompress_workers=decompress_workers )
 
     cdef _summarize_from_full( self, bits32 chrom_id, bits32 start, bits32 end, int summary_size ):
         """
@@ -157,6 +181,81 @@ cdef class BigWigFile( BBIFile ):
         self.visit_blocks_in_region( chrom_id, start, end, v )
         return v.array
 
+    cdef _block_arrays( self, block_data, bits32 chrom_id ):
+        return block_arrays( block_data, chrom_id, self.reader.is_little_endian )
+
+    def get_arrays( self, chrom, bits32 start, bits32 end ):
+        """
+        Gets all data points over the region `chrom`:`start`-`end`, trimmed
+        to the region like `get`, as ( starts, ends, values ) arrays of
+        uint32, uint32 and float32.
+        """
+        if start >= end:
+            return None
+        chrom_id, chrom_size = self._get_chrom_id_and_size( chrom )
+        if chrom_id is None:
+            return None
+        for chunk in self.iter_arrays( chrom, start, end, chunk_size=None ):
+            return chunk
+        return numpy.zeros( 0, numpy.uint32 ), numpy.zeros( 0, numpy.uint32 ), numpy.zeros( 0, numpy.float32 )
+
+    def iter_arrays( self, chrom, bits32 start, bits32 end, chunk_size=DEFAULT_CHUNK_SIZE ):
+        """
+        Like `get_arrays` but yields the data points in chunks of about
+        `chunk_size` records, so a large region is never in memory at once.
+        """
+        if start >= end:
+            return iter( [] )
+        chrom_id, chrom_size = self._get_chrom_id_and_size( chrom )
+        if chrom_id is None:
+            return iter( [] )
+        return chunk_columns( self._region_arrays( chrom_id, start, end ), chunk_size )
+
+    def _region_arrays( self, bits32 chrom_id, bits32 start, bits32 end ):
+        """
+        Yield the trimmed data points of each block overlapping the region
+        """
+        block_list = self._unzoomed_index().find_overlapping_blocks( chrom_id, start, end )
+        for block_data in self._iter_blocks( block_list ):
+            starts, ends, values = block_arrays( block_data, chrom_id, self.reader.is_little_endian )
+            starts = numpy.maximum( starts, start )
+            ends = numpy.minimum( ends, end )
+            keep = starts < ends
+            yield starts[keep], ends[keep], values[keep].astype( numpy.float32 )
+
+    def get_as_array_many( self, chroms, starts, ends ):
+        """
+        Like `get_as_array` for many regions `chroms[i]`:`starts[i]`-`ends[i]`
+        at once, reading each block of the file at most once. Returns a 2D
+        array with one row per region if all regions have the same length
+        (an empty 0 x 0 array for no regions), otherwise a list of arrays.
+        Regions on chromosomes not in the file are all NaN.
+        """
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        lengths = numpy.maximum( ends - starts, 0 )
+        if len( lengths ) == 0:
+            return numpy.zeros( ( 0, 0 ), dtype=numpy.float32 )
+        offsets = numpy.cumsum( lengths ) - lengths
+        values = numpy.empty( lengths.sum(), dtype=numpy.float32 )
+        values[...] = numpy.nan
+        for chrom, index in group_by_chrom( chroms ):
+            chrom_id, chrom_size = self._get_chrom_id_and_size( chrom )
+            if chrom_id is None:
+                continue
+            index = index[ lengths[index] > 0 ]
+            qs = starts[index]
+            qe = ends[index]
+            rec_starts, rec_ends, rec_values = self._full_records( chrom_id, qs, qe )
+            pair_region, pair_rec = overlapping_pairs( rec_starts, rec_ends, qs, qe )
+            s = numpy.maximum( rec_starts[pair_rec], qs[pair_region] )
+            e = numpy.minimum( rec_ends[pair_rec], qe[pair_region] )
+            owner, positions = expand_ranges( offsets[index][pair_region] + s - qs[pair_region], e - s )
+            values[positions] = rec_values[pair_rec][owner]
+        if numpy.all( lengths == lengths[0] ):
+            return values.reshape( len( lengths ), lengths[0] )
+        return numpy.split( values, numpy.cumsum( lengths )[:-1] )
+
 
 
 
@@ -1,4 +1,4 @@
-import sys, os
+import sys, os, threading
 import unittest
 import numpy
 
@@ -53,6 +53,89 @@ class TestBigWig(unittest.TestCase):
         data = self.bw.query("chr2", 0, 10000, 10)
         self.assertEqual( data, None )
 
+    def test_block_cache(self):
+        a = self.bw.get_as_array( "chr1", 10000, 20000 )
+        misses = self.bw.block_cache_misses
+        assert misses > 0
+        self.assertEqual( self.bw.block_cache_hits, 0 )
+        b = self.bw.get_as_array( "chr1", 10000, 20000 )
+        self.assertEqual( self.bw.block_cache_misses, misses )
+        self.assertEqual( self.bw.block_cache_hits, misses )
+        assert allclose( a, b )
+        # Caching can be disabled
+        bw = BigWigFile( file=open( "test_data/bbi_tests/test.bw" ), block_cache_size=0 )
+        assert allclose( bw.get_as_array( "chr1", 10000, 20000 ), a )
+        self.assertEqual( bw.block_cache_hits, 0 )
+
+    def test_mmap(self):
+        bw = BigWigFile( file=open( "test_data/bbi_tests/test.bw" ), use_mmap=True )
+        for start, end in [ ( 10000, 20000 ), ( 11000, 11005 ), ( 0, 5000000 ) ]:
+            assert allclose( bw.get_as_array( "chr1", start, end ), self.bw.get_as_array( "chr1", start, end ) )
+            a = bw.summarize( "chr1", start, end, 10 )
+            b = self.bw.summarize( "chr1", start, end, 10 )
+            assert allclose( a.sum_data, b.sum_data )
+        self.assertEqual( bw.query( "chr2", 0, 10000, 10 ), None )
+
+    def test_decompress_workers(self):
+        bw = BigWigFile( file=open( "test_data/bbi_tests/test.bw" ), decompress_workers=4 )
+        assert allclose( bw.get_as_array( "chr1", 0, 5000000 ), self.bw.get_as_array( "chr1", 0, 5000000 ) )
+        a = bw.summarize_from_full( "chr1", 0, 5000000, 100 )
+        b = self.bw.summarize_from_full( "chr1", 0, 5000000, 100 )
+        assert allclose( a.sum_data, b.sum_data )
+        # Second read comes from the cache
+        misses = bw.block_cache_misses
+        assert allclose( bw.get_as_array( "chr1", 0, 5000000 ), self.bw.get_as_array( "chr1", 0, 5000000 ) )
+        self.assertEqual( bw.block_cache_misses, misses )
+        # Files share the decompress threads
+        threads = threading.active_count()
+        for i in range( 5 ):
+            other = BigWigFile( file=open( "test_data/bbi_tests/test.bw" ), decompress_workers=4, block_cache_size=0 )
+            assert allclose( other.get_as_array( "chr1", 0, 5000000 ), self.bw.get_as_array( "chr1", 0, 5000000 ) )
+        self.assertEqual( threading.active_count(), threads )
+
+    def test_get_arrays(self):
+        for start, end in [ ( 10000, 20000 ), ( 11000, 11005 ), ( 0, 5000000 ) ]:
+            starts, ends, values = self.bw.get_arrays( "chr1", start, end )
+            self.assertEqual( zip( starts, ends, values ), self.bw.get( "chr1", start, end ) )
+            chunks = list( self.bw.iter_arrays( "chr1", start, end, chunk_size=100 ) )
+            assert all( len( c[0] ) >= 100 for c in chunks[:-1] )
+            assert numpy.all( numpy.concatenate( [ c[1] for c in chunks ] ) == ends )
+        self.assertEqual( self.bw.get_arrays( "chr2", 0, 10000 ), None )
+        self.assertEqual( list( self.bw.iter_arrays( "chr2", 0, 10000 ) ), [] )
+
+    def test_summarize_many(self):
+        regions = [ ( "chr1", 10000, 20000, 10 ), ( "chr1", 11000, 11005, 5 ), ( "chr2", 0, 10000, 10 ),
+                    ( "chr1", 0, 5000000, 100 ), ( "chr1", 10500, 10900, 7 ), ( "chr1", 20000, 10000, 3 ) ]
+        chroms, starts, ends, sizes = zip( *regions )
+        batch = self.bw.summarize_many( chroms, starts, ends, sizes )
+        self.assertEqual( len( batch ), len( regions ) )
+        for i, ( chrom, start, end, size ) in enumerate( regions ):
+            a = batch[i]
+            b = self.bw.summarize( chrom, start, end, size )
+            if b is None:
+                assert a is None
+                continue
+            for name in ( "valid_count", "min_val", "max_val", "sum_data", "sum_squares" ):
+                assert allclose( getattr( a, name ), getattr( b, name ), 0.01 ), name
+        batch = self.bw.summarize_many( [ "chr1" ] * 3, [ 10000, 12000, 14000 ], [ 11000, 13000, 15000 ], 4 )
+        self.assertEqual( batch.matrix( "sum_data" ).shape, ( 3, 4 ) )
+
+    def test_get_as_array_many(self):
+        chroms = [ "chr1", "chr2", "chr1", "chr1" ]
+        starts = [ 10000, 0, 11000, 14000 ]
+        ends = [ 10500, 500, 11500, 14500 ]
+        bw = BigWigFile( file=open( "test_data/bbi_tests/test.bw" ) )
+        m = bw.get_as_array_many( chroms, starts, ends )
+        # Every block was read once
+        self.assertEqual( bw.block_cache_hits, 0 )
+        self.assertEqual( m.shape, ( 4, 500 ) )
+        assert numpy.all( numpy.isnan( m[1] ) )
+        for i in ( 0, 2, 3 ):
+            assert allclose( m[i], self.bw.get_as_array( chroms[i], starts[i], ends[i] ) )
+        arrays = self.bw.get_as_array_many( [ "chr1", "chr1" ], [ 10000, 11000 ], [ 10100, 11005 ] )
+        assert allclose( arrays[1], self.bw.get_as_array( "chr1", 11000, 11005 ) )
+        self.assertEqual( self.bw.get_as_array_many( [], [], [] ).shape, ( 0, 0 ) )
+
 # Nose test generator
 def test_summaries_from_file():
     bw = BigWigFile( file=open( "test_data/bbi_tests/test.bw" ) )
@@ -14,3 +14,5 @@ cdef class BPTFile:
     cdef bits32 value_size
     cdef bits64 item_count
     cdef bits64 root_offset
+    # Parsed nodes by file offset, or None if not caching
+    cdef object node_cache
@@ -1,3 +1,4 @@
+import numpy
 from bx.misc.binary_file import BinaryFileReader
 
 DEF bpt_sig = 0x78CA8C91
@@ -10,7 +11,12 @@ cdef class BPTFile:
     On disk B+ tree compatible with Jim Kent's bPlusTree.c
     """
 
-    def __init__( self, file=None ):
+    def __init__( self, file=None, cache_nodes=False ):
+        """
+        If `cache_nodes` is True every node is parsed from disk only once and
+        kept in memory.
+        """
+        self.node_cache = {} if cache_nodes else None
         if file is not None:
             self.attach( file )
 
@@ -29,37 +35,49 @@ cdef class BPTFile:
         reader.skip( 8 )
         self.root_offset = reader.tell()
 
-    def r_find( self, bits64 block_start, key ):
+    def read_node( self, bits64 block_start ):
         """
-        Recursively seek the value matching key under the subtree starting
-        at file offset `block_start`
+        Return ( is_leaf, keys, values ) for the node at `block_start`. Keys
+        are a sorted array of fixed size byte strings, values are strings
+        for leaves and child offsets for internal nodes. The node is read
+        with a single read.
         """
         cdef UBYTE is_leaf
         cdef bits16 child_count
-        cdef bits64 offset
+        if self.node_cache is not None:
+            node = self.node_cache.get( block_start )
+            if node is not None:
+                return node
         self.reader.seek( block_start )
         # Block header
-        is_leaf = self.reader.read_uint8()
-        self.reader.read_uint8()
-        child_count = self.reader.read_uint16()
+        is_leaf, _, child_count = self.reader.read_and_unpack( "BBH", 4 )
+        if is_leaf:
+            value_type = "S%d" % self.value_size
+        else:
+            value_type = "u8"
+        items = self.reader.read_array( [ ( 'key', "S%d" % self.key_size ), ( 'value', value_type ) ], child_count )
+        node = ( is_leaf, items['key'], items['value'] )
+        if self.node_cache is not None:
+            self.node_cache[block_start] = node
+        return node
+
+    def r_find( self, bits64 block_start, key ):
+        """
+        Recursively seek the value matching key under the subtree starting
+        at file offset `block_start`
+        """
+        cdef int i
+        is_leaf, keys, values = self.read_node( block_start )
+        # Keys are sorted, find the last one not greater than key
+        i = numpy.searchsorted( keys, key, 'right' ) - 1
         if is_leaf:
-            for i from 0 <= i < child_count:
-                node_key = self.reader.read( self.key_size )
-                node_value = self.reader.read( self.value_size )
-                if node_key == key:
-                    return node_value
+            if i >= 0 and keys[i] == key.rstrip( '\0' ):
+                # Values are null padded, numpy would strip them
+                return values[i:i+1].tostring()
             return None
         else:
-            # Read and discard first key, store offset
-            self.reader.read( self.key_size )
-            offset = self.reader.read_uint64()
-            # Loop until correct subtree is found
-            for i from 0 <= i < child_count:
-                node_key = self.reader.read( self.key_size )
-                if node_key > key:
-                    break
-                offset = self.reader.read_uint64()
-            return self.r_find( offset, key )
+            # The first child also holds any keys before the first key
+            return self.r_find( values[ max( i, 0 ) ], key )
 
     def find( self, key ):
         """
@@ -13,3 +13,5 @@ cdef class CIRTreeFile:
     cdef bits32 end_base
     cdef bits64 file_size
     cdef bits32 items_per_slot
+    # Parsed nodes by file offset, or None if not caching
+    cdef object node_cache
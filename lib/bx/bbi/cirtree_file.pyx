@@ -1,3 +1,5 @@
+import numpy
+cimport numpy
 from bx.misc.binary_file import BinaryFileReader
 
 DEF cir_tree_sig = 0x2468ACE0
@@ -15,13 +17,42 @@ cdef int ovcmp( bits32 a_hi, bits32 a_lo, bits32 b_hi, bits32 b_lo ):
         else:
             return 0
 
-cdef overlaps( qchrom, qstart, qend, rstartchrom, rstartbase, rendchrom, rendbase ):
+cdef inline bint overlaps( bits32 qchrom, bits32 qstart, bits32 qend, bits32 rstartchrom, bits32 rstartbase, bits32 rendchrom, bits32 rendbase ):
     return ( ovcmp( qchrom, qstart, rendchrom, rendbase ) > 0 ) and \
            ( ovcmp( qchrom, qend, rstartchrom, rstartbase ) < 0 )
 
+# Node entries as laid out on disk, for looping over node arrays in C
+cdef packed struct LeafEntry:
+    bits32 start_chrom_ix
+    bits32 start_base
+    bits32 end_chrom_ix
+    bits32 end_base
+    bits64 offset
+    bits64 size
+
+cdef packed struct ParentEntry:
+    bits32 start_chrom_ix
+    bits32 start_base
+    bits32 end_chrom_ix
+    bits32 end_base
+    bits64 offset
+
+# Entries of leaf and internal nodes
+leaf_dtype = numpy.dtype( [ ( 'start_chrom_ix', 'u4' ), ( 'start_base', 'u4' ),
+                            ( 'end_chrom_ix', 'u4' ), ( 'end_base', 'u4' ),
+                            ( 'offset', 'u8' ), ( 'size', 'u8' ) ] )
+parent_dtype = numpy.dtype( [ ( 'start_chrom_ix', 'u4' ), ( 'start_base', 'u4' ),
+                              ( 'end_chrom_ix', 'u4' ), ( 'end_base', 'u4' ),
+                              ( 'offset', 'u8' ) ] )
+
 cdef class CIRTreeFile:
 
-    def __init__( self, file=None ):
+    def __init__( self, file=None, cache_nodes=False ):
+        """
+        If `cache_nodes` is True every node is parsed from disk only once and
+        kept in memory, so repeated queries walk the tree without any IO.
+        """
+        self.node_cache = {} if cache_nodes else None
         if file is not None:
             self.attach( file )
 
@@ -46,58 +77,52 @@ cdef class CIRTreeFile:
         # Save root
         self.root_offset = reader.tell()
 
-    def r_find_overlapping( self, int level, bits64 index_file_offset, bits32 chrom_ix, bits32 start, bits32 end, object rval, object reader ):
+    def read_node( self, bits64 index_file_offset, object reader ):
+        """
+        Return ( is_leaf, entries ) for the node at `index_file_offset`,
+        where entries is an array of `leaf_dtype` or `parent_dtype`. The
+        whole node is read at once, as a view of the file if it is mapped.
+        """
         cdef UBYTE is_leaf
         cdef bits16 child_count
+        if self.node_cache is not None:
+            node = self.node_cache.get( index_file_offset )
+            if node is not None:
+                return node
         reader.seek( index_file_offset )
         # Block header
-        is_leaf = reader.read_uint8()
+        is_leaf, _, child_count = reader.read_and_unpack( "BBH", 4 )
         assert is_leaf == 0 or is_leaf == 1
-        reader.read_uint8()
-        child_count = reader.read_uint16()
         # Read block
         if is_leaf:
-            self.r_find_overlapping_leaf( level, chrom_ix, start, end, rval, child_count, reader )
+            entries = reader.read_array( leaf_dtype, child_count )
         else:
-            self.r_find_overlapping_parent( level, chrom_ix, start, end, rval, child_count, reader )
-
-    def r_find_overlapping_leaf( self, int level, bits32 chrom_ix, bits32 start, bits32 end, object rval, 
-                                bits16 child_count, object reader ):
-        cdef bits32 start_chrom_ix, start_base, end_chrom_ix, end_base
-        cdef bits64 offset
-        cdef bits64 size
-        for i from 0 <= i < child_count:
-            start_chrom_ix = reader.read_uint32()
-            start_base = reader.read_uint32()
-            end_chrom_ix = reader.read_uint32()
-            end_base = reader.read_uint32()
-            offset = reader.read_uint64()
-            size = reader.read_uint64()
-            if overlaps( chrom_ix, start, end, start_chrom_ix, start_base, end_chrom_ix, end_base ):
-                rval.append( ( offset, size ) )
+            entries = reader.read_array( parent_dtype, child_count )
+        # Searching works on entries in native byte order
+        if not entries.dtype.isnative:
+            entries = entries.astype( entries.dtype.newbyteorder( '=' ) )
+        node = ( is_leaf, entries )
+        if self.node_cache is not None:
+            self.node_cache[index_file_offset] = node
+        return node
 
-    def r_find_overlapping_parent( self, int level, bits32 chrom_ix, bits32 start, bits32 end, object rval, 
-                                  bits16 child_count, object reader ):
-        # Read and cache offsets for all children to avoid excessive seeking
-        ## cdef bits32 start_chrom_ix[child_count], start_base[child_count], end_chrom_ix[child_count], end_base[child_count]
-        ## cdef bits64 offset[child_count]
-        start_chrom_ix = []; start_base = []; end_chrom_ix = []; end_base = []
-        offset = []
-        for i from 0 <= i < child_count:
-            ## start_chrom_ix[i] = reader.read_bits32()
-            ## start_base[i] = reader.read_bits32()
-            ## end_chrom_ix[i] = reader.read_bits32()
-            ## end_base[i] = reader.read_bits32()
-            ## offset[i] = reader.read_bits64()
-            start_chrom_ix.append( reader.read_uint32() )
-            start_base.append( reader.read_uint32() )
-            end_chrom_ix.append( reader.read_uint32() )
-            end_base.append( reader.read_uint32() )
-            offset.append( reader.read_uint64() )
-        # Now recurse
-        for i from 0 <= i < child_count:
-            if overlaps( chrom_ix, start, end, start_chrom_ix[i], start_base[i], end_chrom_ix[i], end_base[i] ):
-                self.r_find_overlapping( level + 1, offset[i], chrom_ix, start, end, rval, reader )
+    def r_find_overlapping( self, int level, bits64 index_file_offset, bits32 chrom_ix, bits32 start, bits32 end, object rval, object reader ):
+        cdef numpy.ndarray entries
+        cdef LeafEntry * leaves
+        cdef ParentEntry * parents
+        cdef int i
+        is_leaf, entries = self.read_node( index_file_offset, reader )
+        if is_leaf:
+            leaves = <LeafEntry *> entries.data
+            for i from 0 <= i < entries.shape[0]:
+                if overlaps( chrom_ix, start, end, leaves[i].start_chrom_ix, leaves[i].start_base, leaves[i].end_chrom_ix, leaves[i].end_base ):
+                    rval.append( ( leaves[i].offset, leaves[i].size ) )
+        else:
+            # Now recurse
+            parents = <ParentEntry *> entries.data
+            for i from 0 <= i < entries.shape[0]:
+                if overlaps( chrom_ix, start, end, parents[i].start_chrom_ix, parents[i].start_base, parents[i].end_chrom_ix, parents[i].end_base ):
+                    self.r_find_overlapping( level + 1, parents[i].offset, chrom_ix, start, end, rval, reader )
 
     def find_overlapping_blocks( self, bits32 chrom_ix, bits32 start, bits32 end ):
         rval = []
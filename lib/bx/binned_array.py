@@ -6,11 +6,17 @@ pseudo-random acccess.
 `BinnedArrayWriter` can instead be used when creating the array sequentially
 (does not require keeping all data in memory). `FileBinnedArray` provides
 read only access to an on disk binned array. 
+
+Files can also be written uncompressed in little endian byte order
+(`mappable=True`, version 3), these are memory mapped by `FileBinnedArray`
+and ranges within a bin are returned without copying.
 """
 
 from __future__ import division
 
 import math
+import mmap
+import numpy
 
 from numpy import *
 from struct import *
@@ -29,30 +35,180 @@ MAGIC=0x4AB04612
 # Version 1 -> 2 by James Taylor, allow specifying different compression 
 # types.
 
-VERSION=2
+# Version 2 -> 3, uncompressed bins in little endian order aligned to 8
+# bytes (and the default value in little endian order) so the file can be
+# memory mapped. Compressed files are still written as version 2.
+
+VERSION=3
+MAPPABLE_VERSION=3
+COMPRESSED_VERSION=2
+ALIGNMENT=8
 
-# Compression types
+# Compression types, the name of the codec used is stored in the (4 byte)
+# compression type field of the header. A codec can be given a compression
+# level when writing as "name:level" (e.g. "zlib:1"), the level does not
+# need to be known to decompress.
 
 comp_types = dict()
 
-comp_types['none'] = ( lambda x: x, lambda x: x )
+def register_codec( name, compress, decompress ):
+    """
+    Make a codec available for binned array files. `compress` is called as
+    compress( data ) or compress( data, level ), `decompress` as
+    decompress( data ).
+    """
+    assert len( name ) <= 4, "Codec names are at most 4 characters"
+    comp_types[name] = ( compress, decompress )
+
+def get_compressor( comp_type ):
+    """
+    Return the codec name and compression function for `comp_type`, a
+    codec name optionally followed by ":level".
+    """
+    name, _, level = comp_type.partition( ":" )
+    if name not in comp_types:
+        raise ValueError( "Unknown compression type: %s" % name )
+    compress = comp_types[name][0]
+    if level:
+        level = int( level )
+        return name, lambda data: compress( data, level )
+    return name, compress
+
+register_codec( 'none', lambda x, level=None: x, lambda x: x )
 
 try:
     import zlib
-    comp_types['zlib'] = ( zlib.compress, zlib.decompress )
+    register_codec( 'zlib', zlib.compress, zlib.decompress )
+    # Raw deflate streams, without the zlib header and checksum
+    def deflate_compress( data, level=6 ):
+        c = zlib.compressobj( level, zlib.DEFLATED, -zlib.MAX_WBITS )
+        return c.compress( data ) + c.flush()
+    register_codec( 'dfl', deflate_compress, lambda data: zlib.decompress( data, -zlib.MAX_WBITS ) )
+except:
+    pass
+
+try:
+    import bz2
+    register_codec( 'bz2', bz2.compress, bz2.decompress )
 except:
     pass
     
 try:
     import lzo
-    comp_types['lzo'] = ( lzo.compress, lzo.decompress )
+    register_codec( 'lzo', lzo.compress, lzo.decompress )
 except:
     pass
 
+try:
+    import lz4.block
+    register_codec( 'lz4', lambda data, level=0: lz4.block.compress( data, compression=level ), lz4.block.decompress )
+except:
+    try:
+        import lz4
+        register_codec( 'lz4', lambda data, level=None: lz4.compress( data ), lz4.decompress )
+    except:
+        # The block codec bundled with bx, writing the same format
+        try:
+            from bx.misc import _lz4
+            register_codec( 'lz4', _lz4.compress, _lz4.decompress )
+        except:
+            pass
+
 
 MAX=512*1024*1024 
 
-class BinnedArray( object ):
+# Reductions supported by `get_ranges`
+REDUCTIONS = ( 'sum', 'mean', 'min', 'max', 'count' )
+
+class RangeQueriesMixin( object ):
+    """
+    Queries over many ranges for binned arrays, which provide `bin_size`,
+    `default`, `typecode` and `bin_array( index )` (None for bins holding
+    only the default value).
+    """
+    def get_ranges( self, starts, ends, reduce=None, ignore_zeros=False ):
+        """
+        Return the values in each range (starts[i],ends[i]), as a list of
+        arrays or, if `reduce` is given, as one value per range computed
+        bin by bin without building the arrays. `reduce` is one of
+        'sum', 'mean', 'min', 'max' or 'count' (or a sequence of them, to
+        return a tuple of arrays); NaN values (and zeros, with
+        `ignore_zeros`) are skipped, ranges with no values give NaN (or a
+        count of 0).
+        """
+        if reduce is None:
+            return [ self.get_range( start, end ) for start, end in zip( starts, ends ) ]
+        if isinstance( reduce, basestring ):
+            return self.get_ranges( starts, ends, ( reduce, ), ignore_zeros )[0]
+        for name in reduce:
+            if name not in REDUCTIONS:
+                raise ValueError( "Unknown reduction: %s" % name )
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        n = len( starts )
+        value_type = numpy.result_type( numpy.dtype( self.typecode ), numpy.float32 )
+        sums = numpy.zeros( n )
+        counts = numpy.zeros( n, dtype=numpy.int64 )
+        mins = numpy.empty( n, dtype=value_type )
+        mins.fill( numpy.nan )
+        maxs = mins.copy()
+        # Split each range into pieces ( range, bin, lo, hi ) within one bin
+        first_bins = starts // self.bin_size
+        last_bins = ( ends - 1 ) // self.bin_size
+        nonempty = ends > starts
+        npieces = numpy.where( nonempty, last_bins - first_bins + 1, 0 )
+        total = npieces.sum()
+        ranges = numpy.repeat( numpy.arange( n ), npieces )
+        bins = numpy.repeat( first_bins - numpy.cumsum( npieces ) + npieces, npieces ) + numpy.arange( total )
+        bin_starts = bins * self.bin_size
+        los = numpy.maximum( starts[ranges], bin_starts ) - bin_starts
+        his = numpy.minimum( ends[ranges], bin_starts + self.bin_size ) - bin_starts
+        order = numpy.argsort( bins, kind="mergesort" )
+        ranges, bins, los, his = ranges[order], bins[order], los[order], his[order]
+        bounds = numpy.concatenate( ( [ 0 ], numpy.flatnonzero( numpy.diff( bins ) ) + 1, [ total ] ) )
+        for a, b in zip( bounds[:-1], bounds[1:] ):
+            r, lo, hi = ranges[a:b], los[a:b], his[a:b]
+            values = self.bin_array( int( bins[a] ) )
+            if values is None:
+                # Whole bin has the default value
+                default = float( self.default )
+                if numpy.isnan( default ) or ( ignore_zeros and default == 0 ):
+                    continue
+                size = hi - lo
+                numpy.add.at( sums, r, default * size )
+                numpy.add.at( counts, r, size )
+                numpy.fmin.at( mins, r, default )
+                numpy.fmax.at( maxs, r, default )
+                continue
+            # One extra element so every piece end is a valid index for reduceat
+            values = numpy.concatenate( ( values.astype( numpy.float64 ), [ numpy.nan ] ) )
+            if ignore_zeros:
+                values[ values == 0 ] = numpy.nan
+            valid = ~numpy.isnan( values )
+            indices = numpy.empty( 2 * len( r ), dtype=numpy.intp )
+            indices[0::2] = lo
+            indices[1::2] = hi
+            numpy.add.at( sums, r, numpy.add.reduceat( numpy.where( valid, values, 0 ), indices )[0::2] )
+            numpy.add.at( counts, r, numpy.add.reduceat( valid.astype( numpy.int64 ), indices )[0::2] )
+            if 'min' in reduce:
+                numpy.fmin.at( mins, r, numpy.fmin.reduceat( values, indices )[0::2] )
+            if 'max' in reduce:
+                numpy.fmax.at( maxs, r, numpy.fmax.reduceat( values, indices )[0::2] )
+        rval = []
+        for name in reduce:
+            if name == 'sum':
+                rval.append( numpy.where( counts > 0, sums, numpy.nan ) )
+            elif name == 'mean':
+                rval.append( sums / numpy.where( counts > 0, counts, numpy.nan ) )
+            elif name == 'min':
+                rval.append( mins )
+            elif name == 'max':
+                rval.append( maxs )
+            else:
+                rval.append( counts )
+        return tuple( rval )
+
+class BinnedArray( RangeQueriesMixin ):
     def __init__( self, bin_size=512*1024, default=NaN, max_size=MAX, typecode="f" ):
         self.max_size = max_size
         self.bin_size = bin_size
@@ -77,6 +233,42 @@ class BinnedArray( object ):
         if self.bins[bin] is None: 
             self.init_bin( bin )
         self.bins[bin][offset] = value
+    def set_range( self, start, end, values ):
+        """
+        Set positions `start` to `end` to `values`, a single value or a
+        sequence of end - start values.
+        """
+        assert end >= start
+        values = asarray( values )
+        done = 0
+        while start < end:
+            bin, offset = self.get_bin_offset( start )
+            size = min( self.bin_size - offset, end - start )
+            if self.bins[bin] is None:
+                self.init_bin( bin )
+            if values.ndim:
+                self.bins[bin][offset:offset+size] = values[done:done+size]
+            else:
+                self.bins[bin][offset:offset+size] = values
+            start += size
+            done += size
+    def set_intervals( self, starts, ends, values ):
+        """
+        Set each interval (starts[i],ends[i]) to values[i], where intervals
+        overlap the later one wins.
+        """
+        positions, values = expand_intervals( starts, ends, values )
+        bins = positions // self.bin_size
+        order = argsort( bins, kind="mergesort" )
+        positions, values, bins = positions[order], values[order], bins[order]
+        bounds = concatenate( ( [ 0 ], flatnonzero( diff( bins ) ) + 1, [ len( bins ) ] ) )
+        for a, b in zip( bounds[:-1], bounds[1:] ):
+            bin = int( bins[a] )
+            if self.bins[bin] is None:
+                self.init_bin( bin )
+            self.bins[bin][ positions[a:b] - bin * self.bin_size ] = values[a:b]
+    def bin_array( self, index ):
+        return self.bins[index]
     def get_range( self, start, end ):
         size = end - start
         assert size >= 0
@@ -100,6 +292,8 @@ class BinnedArray( object ):
                 else:
                     rval.append( self.bins[bin][offset:offset+size] )
                     size = 0
+        if not rval:
+            return zeros( 0, self.typecode )
         return concatenate( rval )
     def __getitem__( self, key ):
         if isinstance( key, slice ):
@@ -110,22 +304,26 @@ class BinnedArray( object ):
             return self.get( key )
     def __setitem__( self, key, value ):
         return self.set( key, value )
-    def to_file( self, f, comp_type='zlib' ):
+    def to_file( self, f, comp_type='zlib', mappable=False ):
+        """
+        Write the array to `f`, compressing each bin with `comp_type` or, if
+        `mappable`, uncompressed in a layout that can be memory mapped.
+        """
+        if mappable:
+            comp_type = 'none'
+            version = MAPPABLE_VERSION
+        else:
+            version = COMPRESSED_VERSION
         # Get compress method
-        compress, _ = comp_types[comp_type]
+        comp_type, compress = get_compressor( comp_type )
         # Write header
-        write_packed( f, ">5I", MAGIC, VERSION, self.max_size, self.bin_size, self.nbins )
+        write_packed( f, ">5I", MAGIC, version, self.max_size, self.bin_size, self.nbins )
         # save type code
         f.write( pack('c',self.typecode ) )
         # save compression type
         f.write( comp_type[0:4].ljust( 4 ) )
         # write default value
-        a = array( self.default, self.typecode ) 
-        # Struct module can't deal with NaN and endian conversion, we'll hack 
-        # around that by byteswapping the array
-        if platform_is_little_endian: 
-            a = a.byteswap()
-        f.write( a.tostring() )
+        f.write( encode_values( array( self.default, self.typecode ), version ) )
         # Save current position (start of bin offsets)
         index_start_pos = f.tell()
         # Skip forward to save space for index
@@ -137,11 +335,9 @@ class BinnedArray( object ):
                 bin_pos_and_size.append( ( 0, 0 ) )
             else:
                 assert bin.dtype.char == self.typecode
-                if platform_is_little_endian:
-                    s = bin.byteswap().tostring()
-                else:
-                    s = bin.tostring()
-                compressed = compress( s )
+                compressed = compress( encode_values( bin, version ) )
+                if version >= MAPPABLE_VERSION:
+                    pad_to_alignment( f )
                 bin_pos_and_size.append( ( f.tell(), len( compressed ) ) )
                 f.write( compressed )
         # Go back and fill in table
@@ -149,8 +345,8 @@ class BinnedArray( object ):
         for pos, size in bin_pos_and_size:
             write_packed( f, ">2I", pos, size )
             
-class FileBinnedArray( object ):
-    def __init__( self, f, cache=32):
+class FileBinnedArray( RangeQueriesMixin ):
+    def __init__( self, f, cache=32, use_mmap=True ):
         # If cache=None, then everything is allowed to stay in memory,
         # this is the default behavior.
         self.f = f
@@ -158,6 +354,7 @@ class FileBinnedArray( object ):
         assert M == MAGIC
         # assert version less than max supported
         assert V <= VERSION, "File is version %d but I don't know about anything beyond %d" % ( V, VERSION )
+        self.version = V
         self.max_size = max_size
         self.bin_size = bin_size
         self.nbins = nbins        
@@ -172,50 +369,65 @@ class FileBinnedArray( object ):
             self.comp_type = f.read( 4 ).strip()
         else:
             self.comp_type = 'zlib'
+        if self.comp_type not in comp_types:
+            raise ValueError( "File uses unavailable compression type: %s" % self.comp_type )
         self.decompress = comp_types[self.comp_type][1]
         # Read default value
         s = f.read( calcsize( self.typecode ) )
-        a = fromstring( s, self.typecode )
-        if platform_is_little_endian: 
-            a = a.byteswap()
-        self.default = a[0]
+        self.default = decode_values( s, self.typecode, V )[0]
         # Read bin sizes and offsets
-        self.bin_pos = []
-        self.bin_sizes = []
-        for i in range( nbins ):
-            pos, size = read_packed( f, ">2I" )
-            self.bin_pos.append( pos )
-            self.bin_sizes.append( size )
+        table = frombuffer( f.read( calcsize( ">2I" ) * nbins ), dtype=">u4" )
+        self.bin_pos = table[0::2].tolist()
+        self.bin_sizes = table[1::2].tolist()
+        # Uncompressed little endian bins can be used directly from a map
+        self.mapped = None
+        if V >= MAPPABLE_VERSION and use_mmap:
+            try:
+                self.mapped = mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_READ )
+            except ( AttributeError, ValueError, EnvironmentError ):
+                pass
     def get_bin_offset( self, index ):
         return int( index // self.bin_size ), int( index % self.bin_size )
     def load_bin( self, index ):
         assert self.bin_pos[index] != 0
-        self.f.seek( self.bin_pos[index] )
-        raw = self.f.read( self.bin_sizes[index] )
-        a = fromstring( self.decompress( raw ), self.typecode )
-        if platform_is_little_endian:
-            a = a.byteswap()
+        if self.mapped is not None:
+            a = frombuffer( self.mapped, decoded_dtype( self.typecode, self.version ), self.bin_size, self.bin_pos[index] )
+        else:
+            self.f.seek( self.bin_pos[index] )
+            raw = self.f.read( self.bin_sizes[index] )
+            a = decode_values( self.decompress( raw ), self.typecode, self.version )
         assert len( a ) == self.bin_size
         self.bins[index] = a
+    def bin_array( self, index ):
+        if index in self.bins:
+            return self.bins[index]
+        elif index < self.nbins and self.bin_pos[index]:
+            self.load_bin( index )
+            return self.bins[index]
+        else:
+            return None
     def get( self, key ):
         bin, offset = self.get_bin_offset( key )
         if bin in self.bins:
             return self.bins[bin][offset]
-        elif self.bin_pos[bin]:
+        elif bin < self.nbins and self.bin_pos[bin]:
             self.load_bin( bin )
             return self.bins[bin][offset]
         else:
             return self.default
     def get_range( self, start, end ):
+        """
+        Return the values from `start` to `end`, for a memory mapped file
+        and a range within a single bin this is a read only view of the map
+        """
         size = end - start
         assert size >= 0
         rval = []
         while size > 0:
             bin, offset = self.get_bin_offset( start )
             delta = self.bin_size - offset
-            if not bin in self.bins and self.bin_pos[bin] != 0:
-                self.load_bin( bin )
-            if self.bins[bin] is None:
+            values = self.bin_array( bin )
+            if values is None:
                 if delta < size:
                     rval.append( resize( array(self.default, self.typecode), (delta,) ) )
                     size -= delta
@@ -225,12 +437,16 @@ class FileBinnedArray( object ):
                     size = 0
             else:
                 if delta < size:
-                    rval.append( self.bins[bin][offset:offset+delta] )
+                    rval.append( values[offset:offset+delta] )
                     size -= delta
                     start += delta
                 else:
-                    rval.append( self.bins[bin][offset:offset+size] )
+                    rval.append( values[offset:offset+size] )
                     size = 0
+        if not rval:
+            return zeros( 0, self.typecode )
+        if len( rval ) == 1 and self.mapped is not None:
+            return rval[0]
         return concatenate( rval )
     def __getitem__( self, key ):
         if isinstance( key, slice ):
@@ -241,9 +457,14 @@ class FileBinnedArray( object ):
             return self.get( key )
         
 class BinnedArrayWriter( object ):
-    def __init__( self, f, bin_size=512*1024, default=NaN, max_size=MAX, typecode="f", comp_type='zlib' ):
+    def __init__( self, f, bin_size=512*1024, default=NaN, max_size=MAX, typecode="f", comp_type='zlib', mappable=False ):
         # All parameters in the constructor are immutable after creation
         self.f = f
+        if mappable:
+            comp_type = 'none'
+            self.version = MAPPABLE_VERSION
+        else:
+            self.version = COMPRESSED_VERSION
         self.max_size = max_size
         self.bin_size = bin_size
         self.nbins = int( math.ceil( ( max_size / self.bin_size ) ) )
@@ -254,8 +475,7 @@ class BinnedArrayWriter( object ):
         self.bin_index = []
         self.buffer = resize( array(self.default, self.typecode), (self.bin_size,) )
         self.buffer_contains_values = False
-        self.comp_type = comp_type
-        self.compress = comp_types[comp_type][0]
+        self.comp_type, self.compress = get_compressor( comp_type )
         self.write_header()
         # Start the first bin
         ## self.bin_index = [ (self.data_offset, 0) ]
@@ -265,19 +485,13 @@ class BinnedArrayWriter( object ):
     def write_header( self ):
         self.f.seek(0)
         # Write header
-        write_packed( self.f, ">5I", MAGIC, VERSION, self.max_size, self.bin_size, self.nbins )
+        write_packed( self.f, ">5I", MAGIC, self.version, self.max_size, self.bin_size, self.nbins )
         # save type code
         self.f.write( pack('c',self.typecode ) )
-        # write default value
-        a = array( self.default, self.typecode ) 
         # write comp type
         self.f.write( self.comp_type[0:4].ljust(4) )
         # write default
-        # Struct module can't deal with NaN and endian conversion, we'll hack 
-        # around that by byteswapping the array
-        if platform_is_little_endian: 
-            a = a.byteswap()
-        self.f.write( a.tostring() )
+        self.f.write( encode_values( array( self.default, self.typecode ), self.version ) )
         # Save current position (start of bin offsets)
         self.index_pos = self.f.tell()
         self.data_offset = self.index_pos + (self.nbins * calcsize( ">2I" ))
@@ -287,41 +501,88 @@ class BinnedArrayWriter( object ):
         for pos, size in self.bin_index:
             write_packed( self.f, ">2I", pos, size )
 
+    def next_bin( self ):
+        self.flush()
+        self.bin_pos = 0
+        self.bin += 1
+        assert self.bin <= self.nbins
+        self.buffer = resize( array(self.default, self.typecode), (self.bin_size,) )
+        self.buffer_contains_values = False
+        ## self.bin_index.append( (self.f.tell(), 0) )
+
     def skip( self ):
         self.bin_pos += 1
         if self.bin_pos == self.bin_size:
-            self.flush()
-            self.bin_pos = 0
-            self.bin += 1
-            assert self.bin <= self.nbins
-            self.buffer = resize( array(self.default, self.typecode), (self.bin_size,) )
-            self.buffer_contains_values = False
-            ## self.bin_index.append( (self.f.tell(), 0) )
+            self.next_bin()
 
     def write( self, data ):
         self.buffer[self.bin_pos] = data
         self.buffer_contains_values = True
         self.bin_pos += 1
         if self.bin_pos == self.bin_size:
-            self.flush()
-            self.bin_pos = 0
-            self.bin += 1
-            assert self.bin <= self.nbins
-            self.buffer = resize( array(self.default, self.typecode), (self.bin_size,) )
-            self.buffer_contains_values = False
-            ## self.bin_index.append( (self.f.tell(), 0) )
+            self.next_bin()
+
+    def tell( self ):
+        """Position the next value will be written at"""
+        return self.bin * self.bin_size + self.bin_pos
+
+    def skip_to( self, pos ):
+        """Leave the values up to `pos` set to the default"""
+        assert pos >= self.tell(), "Can't go back to %d from %d" % ( pos, self.tell() )
+        while ( self.bin + 1 ) * self.bin_size <= pos:
+            self.next_bin()
+        self.bin_pos = pos - self.bin * self.bin_size
+
+    def set_range( self, start, end, values ):
+        """
+        Write `values` (a single value or a sequence of end - start values)
+        to positions `start` to `end`, which must not be before any
+        position already written.
+        """
+        assert end >= start
+        values = asarray( values )
+        self.skip_to( start )
+        done = 0
+        while start < end:
+            size = min( self.bin_size - self.bin_pos, end - start )
+            if values.ndim:
+                self.buffer[self.bin_pos:self.bin_pos+size] = values[done:done+size]
+            else:
+                self.buffer[self.bin_pos:self.bin_pos+size] = values
+            self.buffer_contains_values = True
+            self.bin_pos += size
+            if self.bin_pos == self.bin_size:
+                self.next_bin()
+            start += size
+            done += size
+
+    def set_intervals( self, starts, ends, values ):
+        """
+        Write each interval (starts[i],ends[i]) with values[i], intervals
+        must be sorted, not overlap, and not be before any position already
+        written.
+        """
+        positions, values = expand_intervals( starts, ends, values )
+        if len( positions ) == 0:
+            return
+        assert all( diff( positions ) > 0 ), "Intervals must be sorted and not overlap"
+        bins = positions // self.bin_size
+        bounds = concatenate( ( [ 0 ], flatnonzero( diff( bins ) ) + 1, [ len( bins ) ] ) )
+        for a, b in zip( bounds[:-1], bounds[1:] ):
+            self.skip_to( int( positions[a] ) )
+            self.buffer[ positions[a:b] - self.bin * self.bin_size ] = values[a:b]
+            self.buffer_contains_values = True
+            self.skip_to( int( positions[b-1] ) + 1 )
 
     def flush( self ):
         # Flush buffer to file
         if self.buffer_contains_values:
             ## pos, size = self.bin_index[self.bin]
             ## self.f.seek( pos )
+            if self.version >= MAPPABLE_VERSION:
+                pad_to_alignment( self.f )
             pos = self.f.tell()
-            if platform_is_little_endian:
-                s = self.buffer.byteswap().tostring()
-            else:
-                s = self.buffer.tostring()
-            compressed = self.compress( s )
+            compressed = self.compress( encode_values( self.buffer, self.version ) )
             size = len( compressed )
             assert len( self.bin_index ) == self.bin
             self.bin_index.append( ( pos, size ) )
@@ -336,6 +597,79 @@ class BinnedArrayWriter( object ):
         self.write_header()
         self.write_index()
 
+def expand_intervals( starts, ends, values ):
+    """
+    Return arrays of every position covered by the intervals
+    (starts[i],ends[i]) and the value of the interval it is in.
+    """
+    starts = asarray( starts, dtype=int64 )
+    lengths = asarray( ends, dtype=int64 ) - starts
+    assert all( lengths >= 0 )
+    total = lengths.sum()
+    offsets = cumsum( lengths ) - lengths
+    positions = repeat( starts - offsets, lengths ) + arange( total, dtype=int64 )
+    return positions, repeat( asarray( values ), lengths )
+
+def interval_chunks( intervals, chunk_size=1000000 ):
+    """
+    Group ( chrom, start, end, strand, value ) tuples, as returned by
+    `bx.arrays.wiggle.WiggleReader`, into ( chrom, starts, ends, values )
+    arrays of intervals on the same chromosome covering about `chunk_size`
+    positions.
+    """
+    chrom = None
+    starts, ends, values = [], [], []
+    covered = 0
+    for c, start, end, strand, value in intervals:
+        if ( c != chrom or covered >= chunk_size ) and starts:
+            yield chrom, array( starts, int64 ), array( ends, int64 ), array( values )
+            starts, ends, values = [], [], []
+            covered = 0
+        chrom = c
+        starts.append( start )
+        ends.append( end )
+        values.append( value )
+        covered += end - start
+    if starts:
+        yield chrom, array( starts, int64 ), array( ends, int64 ), array( values )
+
+def binned_arrays_from_wiggle( f, chunk_size=1000000, **kwargs ):
+    """
+    Read wiggle or bedGraph data from `f` and return a dict of
+    `BinnedArray` objects (created with `kwargs`) keyed by chromosome.
+    """
+    from bx.arrays.wiggle import WiggleReader
+    arrays = {}
+    for chrom, starts, ends, values in interval_chunks( WiggleReader( f ), chunk_size ):
+        if chrom not in arrays:
+            arrays[chrom] = BinnedArray( **kwargs )
+        arrays[chrom].set_intervals( starts, ends, values )
+    return arrays
+
+def decoded_dtype( typecode, version ):
+    """Type of values stored in a file of `version`"""
+    if version >= MAPPABLE_VERSION:
+        return dtype( typecode ).newbyteorder( '<' )
+    return dtype( typecode ).newbyteorder( '>' )
+
+def encode_values( a, version ):
+    """
+    Values in `a` as a string in the byte order used by files of `version`
+    (struct can't deal with NaN and endian conversion, so use numpy)
+    """
+    return a.astype( decoded_dtype( a.dtype.char, version ) ).tostring()
+
+def decode_values( s, typecode, version ):
+    """Read values of `typecode` from `s`, in native byte order"""
+    a = fromstring( s, decoded_dtype( typecode, version ) )
+    return a.astype( dtype( typecode ) )
+
+def pad_to_alignment( f ):
+    """Write zeros so bins in mappable files start at aligned offsets"""
+    pos = f.tell()
+    if pos % ALIGNMENT:
+        f.write( "\0" * ( ALIGNMENT - pos % ALIGNMENT ) )
+
 def write_packed( f, pattern, *vals ):
     f.write( pack( pattern, *vals ) )
     
@@ -2,6 +2,7 @@
 Tests for `bx.binned_array`.
 """
 
+import numpy
 from numpy import *
 from binned_array import *
 
@@ -91,3 +92,134 @@ def test_binned_array_writer():
             
             
             
+
+def test_file_mappable():
+    target.to_file( open( "/tmp/foo5", "w" ), mappable=True )
+    o = open( "/tmp/foo6", "w" )
+    w = BinnedArrayWriter( o, 128, mappable=True )
+    for val in source:
+        w.write( val )
+    w.finish()
+    o.close()
+    for fname in "/tmp/foo5", "/tmp/foo6":
+        target5 = FileBinnedArray( open( fname ) )
+        assert target5.version == 3 and target5.mapped is not None
+        assert isnan( target5.default )
+        for i in range( len( source ) ):
+            assert source[i] == target5[i]
+        assert all( target5[0:len( source )] == source )
+        # Within a bin ranges are views of the file
+        a = target5[130:250]
+        assert all( a == source[130:250] ) and not a.flags.writeable
+        # Also readable without a map
+        target6 = FileBinnedArray( open( fname ), use_mmap=False )
+        assert target6.mapped is None
+        assert all( target6[0:len( source )] == source )
+
+def test_get_ranges():
+    values = concatenate( ( source, [ NaN ] * 200 ) ).astype( 'f' )
+    values[ 5:17 ] = NaN
+    ba = BinnedArray( 128, NaN, len( values ) )
+    for i in range( len( source ) ):
+        ba[i] = values[i]
+    f = open( "/tmp/foo7", "w" )
+    ba.to_file( f, mappable=True )
+    f.close()
+    starts = numpy.random.randint( 0, len( source ), 500 )
+    ends = minimum( starts + numpy.random.randint( 0, 700, 500 ), len( values ) )
+    for ba in ba, FileBinnedArray( open( "/tmp/foo7" ) ):
+        arrays = ba.get_ranges( starts, ends )
+        sums, means, mins, maxs, counts = ba.get_ranges( starts, ends, ( 'sum', 'mean', 'min', 'max', 'count' ) )
+        nonzero_means = ba.get_ranges( starts, ends, 'mean', ignore_zeros=True )
+        for i, ( s, e ) in enumerate( zip( starts, ends ) ):
+            expected = values[s:e]
+            assert array_equal( isnan( arrays[i] ), isnan( expected ) )
+            assert all( arrays[i][ ~isnan( expected ) ] == expected[ ~isnan( expected ) ] )
+            expected = expected[ ~isnan( expected ) ].astype( float64 )
+            assert counts[i] == len( expected )
+            if len( expected ):
+                assert allclose( sums[i], expected.sum() )
+                assert allclose( means[i], expected.mean() )
+                assert mins[i] == expected.min() and maxs[i] == expected.max()
+            else:
+                assert isnan( sums[i] ) and isnan( means[i] ) and isnan( mins[i] ) and isnan( maxs[i] )
+            expected = expected[ expected != 0 ]
+            if len( expected ):
+                assert allclose( nonzero_means[i], expected.mean() )
+            else:
+                assert isnan( nonzero_means[i] )
+
+def test_set_range():
+    ba = BinnedArray( 128, NaN, len( source ) )
+    ba.set_range( 0, 300, source[0:300] )
+    ba.set_range( 300, len( source ), source[300:] )
+    ba.set_range( 1000, 1200, 5 )
+    expected = source.copy()
+    expected[1000:1200] = 5
+    assert all( ba[0:len( source )] == expected )
+    o = open( "/tmp/foo8", "w" )
+    w = BinnedArrayWriter( o, 128 )
+    w.set_range( 10, 300, source[10:300] )
+    w.write( source[300] )
+    w.set_range( 700, len( source ), source[700:] )
+    w.finish()
+    o.close()
+    target8 = FileBinnedArray( open( "/tmp/foo8" ) )
+    assert isnan( target8[0:10] ).all() and isnan( target8[301:700] ).all()
+    assert all( target8[10:301] == source[10:301] )
+    assert all( target8[700:len( source )] == source[700:] )
+
+def test_set_intervals():
+    starts = arange( 0, 3000, 7 )
+    ends = starts + numpy.random.randint( 0, 8, len( starts ) )
+    values = numpy.random.random( len( starts ) ).astype( 'f' )
+    expected = zeros( 3100, 'f' )
+    expected[:] = NaN
+    for s, e, v in zip( starts, ends, values ):
+        expected[s:e] = v
+    ba = BinnedArray( 128, NaN, 3100 )
+    ba.set_intervals( starts[::2], ends[::2], values[::2] )
+    ba.set_intervals( starts[1::2], ends[1::2], values[1::2] )
+    o = open( "/tmp/foo9", "w" )
+    w = BinnedArrayWriter( o, 128, max_size=3100 )
+    w.set_intervals( starts[:200], ends[:200], values[:200] )
+    w.set_intervals( starts[200:], ends[200:], values[200:] )
+    w.finish()
+    o.close()
+    for a in ba, FileBinnedArray( open( "/tmp/foo9" ) ):
+        result = a[0:3100]
+        assert array_equal( isnan( result ), isnan( expected ) )
+        assert all( result[ ~isnan( expected ) ] == expected[ ~isnan( expected ) ] )
+
+def test_binned_arrays_from_wiggle():
+    from StringIO import StringIO
+    data = "\n".join( [ "track type=bedGraph", "chr1 10 20 0.5", "chr1 30 35 1.5", "chr2 0 5 2",
+                        "fixedStep chrom=chr1 start=101 step=10 span=2", "1", "2" ] )
+    arrays = binned_arrays_from_wiggle( StringIO( data ), chunk_size=8, bin_size=16 )
+    assert sorted( arrays ) == [ "chr1", "chr2" ]
+    chr1 = arrays["chr1"][0:120]
+    assert all( chr1[10:20] == 0.5 ) and all( chr1[30:35] == 1.5 )
+    assert all( chr1[100:102] == 1 ) and all( chr1[110:112] == 2 )
+    assert isnan( chr1 ).sum() == 120 - 19
+    assert all( arrays["chr2"][0:5] == 2 ) and isnan( arrays["chr2"][5] )
+
+def test_codecs():
+    for comp_type in sorted( comp_types ) + [ "zlib:1", "dfl:9", "bz2:1" ]:
+        if comp_type.split( ":" )[0] not in comp_types:
+            continue
+        target.to_file( open( "/tmp/foo10", "w" ), comp_type=comp_type )
+        o = open( "/tmp/foo11", "w" )
+        w = BinnedArrayWriter( o, 128, comp_type=comp_type )
+        w.set_range( 0, len( source ), source )
+        w.finish()
+        o.close()
+        for fname in "/tmp/foo10", "/tmp/foo11":
+            target10 = FileBinnedArray( open( fname ) )
+            assert target10.comp_type == comp_type.split( ":" )[0]
+            assert all( target10[0:len( source )] == source )
+    try:
+        target.to_file( open( "/tmp/foo10", "w" ), comp_type="nope" )
+    except ValueError:
+        pass
+    else:
+        assert False, "Unknown compression type not detected"
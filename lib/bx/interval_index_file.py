@@ -83,8 +83,14 @@ offset+16+B:  ...          (B bytes) value for interval 2
 
 from bisect import *
 from struct import *
+from collections import OrderedDict
+from itertools import islice, izip, tee
+import threading
+import mmap
+import numpy
 
 from bx.misc import filecache
+from bx.misc.sizedcache import SizedLRUCache
 
 try:
     from bx.misc import seekbzip2
@@ -98,7 +104,7 @@ except:
 
 import os.path
 
-__all__ = [ 'Indexes', 'Index' ]
+__all__ = [ 'Indexes', 'Index', 'FileHandlePool', 'enable_shared_cache', 'disable_shared_cache', 'shared_cache_stats' ]
 
 MAGIC = 0x2cff800a
 VERSION = 2
@@ -150,6 +156,125 @@ def bin_for_range( start, end, offsets=None ):
             end_bin >>= BIN_NEXT_SHIFT
     raise Exceptionn("Interval (%d,%d) out of range")
 
+def bins_for_ranges( starts, ends, offsets=None ):
+    """Vectorized `bin_for_range` for arrays of intervals"""
+    if offsets is None:
+        offsets = BIN_OFFSETS
+    starts = numpy.asarray( starts, dtype=numpy.int64 )
+    ends = numpy.asarray( ends, dtype=numpy.int64 )
+    start_bins = starts >> BIN_FIRST_SHIFT
+    end_bins = numpy.maximum( starts, ends - 1 ) >> BIN_FIRST_SHIFT
+    bins = numpy.empty( len( starts ), dtype=numpy.int64 )
+    todo = numpy.ones( len( starts ), dtype=bool )
+    for offset in offsets:
+        done = todo & ( start_bins == end_bins )
+        bins[done] = offset + start_bins[done]
+        todo &= ~done
+        start_bins >>= BIN_NEXT_SHIFT
+        end_bins >>= BIN_NEXT_SHIFT
+    if todo.any():
+        raise Exception( "Interval (%d,%d) out of range" % ( starts[todo][0], ends[todo][0] ) )
+    return bins
+
+class FileHandlePool( object ):
+    """
+    Keeps files open between uses so they are not reopened for every read.
+    A file is checked out with `acquire` (opening it if no idle handle is
+    available) and handed back with `release`; at most `max_open` idle
+    handles are kept, the least recently used are closed first. Handles are
+    never shared between threads while checked out.
+    """
+    def __init__( self, max_open=32 ):
+        self.max_open = max_open
+        self.idle = OrderedDict()
+        self.idle_count = 0
+        self.opens = 0
+        self.reuses = 0
+        self.lock = threading.Lock()
+    def acquire( self, key, opener ):
+        """
+        Return an open file for `key`, calling `opener()` to open one if no
+        idle handle is available.
+        """
+        with self.lock:
+            handles = self.idle.get( key )
+            if handles:
+                self.idle_count -= 1
+                self.reuses += 1
+                f = handles.pop()
+                if not handles:
+                    del self.idle[key]
+                return f
+            self.opens += 1
+        return opener()
+    def release( self, key, f ):
+        """Hand back a file returned by `acquire`"""
+        with self.lock:
+            self.idle.setdefault( key, [] ).append( f )
+            # Mark key as most recently used
+            self.idle[key] = self.idle.pop( key )
+            self.idle_count += 1
+            while self.idle_count > self.max_open:
+                old_key, handles = self.idle.iteritems().next()
+                handles.pop( 0 ).close()
+                if not handles:
+                    del self.idle[old_key]
+                self.idle_count -= 1
+    def read( self, filename, offset, size ):
+        """Read `size` bytes at `offset` in `filename`"""
+        f = self.acquire( filename, lambda: open( filename, "rb" ) )
+        try:
+            f.seek( offset )
+            return f.read( size )
+        finally:
+            self.release( filename, f )
+    def close( self ):
+        """Close all idle handles"""
+        with self.lock:
+            for handles in self.idle.itervalues():
+                for handle in handles:
+                    handle.close()
+            self.idle.clear()
+            self.idle_count = 0
+
+# Shared by all indexes once `enable_shared_cache` is called
+handle_pool = None
+bin_cache = None
+bin_cache_lock = threading.Lock()
+
+def enable_shared_cache( max_open_files=32, max_cached_intervals=1000000 ):
+    """
+    Keep index and data files open between queries (up to `max_open_files`
+    idle handles) and share the bins loaded by all `Index` instances in a
+    least recently used cache bounded to `max_cached_intervals` intervals.
+    Without this each bin is read by a fresh open() and kept in memory by
+    its `Index` for as long as that exists.
+    """
+    global handle_pool, bin_cache
+    disable_shared_cache()
+    handle_pool = FileHandlePool( max_open_files )
+    bin_cache = SizedLRUCache( max_cached_intervals )
+
+def disable_shared_cache():
+    """Close the shared handles and discard the shared bin cache"""
+    global handle_pool, bin_cache
+    if handle_pool is not None:
+        handle_pool.close()
+    handle_pool = None
+    bin_cache = None
+
+def shared_cache_stats():
+    """
+    Return a dictionary of counters for the shared handle pool and bin
+    cache, or None if they are not enabled.
+    """
+    if handle_pool is None:
+        return None
+    return dict( file_opens=handle_pool.opens, file_reuses=handle_pool.reuses,
+                 open_files=handle_pool.idle_count,
+                 bin_hits=bin_cache.hits, bin_misses=bin_cache.misses,
+                 cached_bins=len( bin_cache ), cached_intervals=bin_cache.size )
+
 class AbstractMultiIndexedAccess( object ):
     """
     Allows accessing multiple indexes / files as if they were one
@@ -170,6 +295,18 @@ class AbstractMultiIndexedAccess( object ):
         for index in self.indexes:
             for block, idx, offset in index.get_as_iterator_with_index_and_offset( src, start, end ):
                 yield block, idx, offset
+    def get_many( self, src, intervals, batch_size=10000 ):
+        """
+        Like `AbstractIndexedAccess.get_many`, the values for each interval
+        are those from each file in turn.
+        """
+        iterators = [ index.get_many( src, copy, batch_size )
+                      for index, copy in zip( self.indexes, tee( intervals, len( self.indexes ) ) ) ]
+        for results in izip( *iterators ):
+            values = []
+            for interval, index_values in results:
+                values.extend( index_values )
+            yield interval, values
     def close( self ):
         for index in self.indexes:
             index.close()
@@ -177,9 +314,13 @@ class AbstractMultiIndexedAccess( object ):
 class AbstractIndexedAccess( object ):
     """Indexed access to a data using overlap queries, requires an index file"""
 
-    def __init__( self, data_filename, index_filename=None, keep_open=False, use_cache=False, **kwargs ):
+    def __init__( self, data_filename, index_filename=None, keep_open=False, use_cache=False, use_mmap=False, block_cache=None, **kwargs ):
         self.data_kwargs = kwargs
         self.data_filename = data_filename
+        # Cache of values already read (e.g. a `SizedLRUCache`), which can
+        # be shared by several files
+        self.block_cache = block_cache
+        self.cache_key = ( data_filename, repr( sorted( kwargs.items() ) ) )
         if data_filename.endswith( ".bz2" ):
             if seekbzip2 is None:
                 raise Exception( "Trying to open .bz2 file but no seekbzip2 module found")
@@ -206,7 +347,7 @@ class AbstractIndexedAccess( object ):
         # Open index
         if index_filename is None: 
             index_filename = data_filename_root + ".index"
-        self.indexes = Indexes( filename=index_filename )
+        self.indexes = Indexes( filename=index_filename, use_mmap=use_mmap )
         # Use a file cache?
         self.use_cache = use_cache
         # Open now?
@@ -248,37 +389,106 @@ class AbstractIndexedAccess( object ):
         for val_start, val_end, val in self.indexes.find( src, start, end ):
             yield self.get_at_offset( val ), self, val
 
+    def get_many( self, src, intervals, batch_size=10000 ):
+        """
+        For each interval in `intervals` (sequences starting with start and
+        end, ideally sorted) yield ( interval, values ) where values are
+        those `get` would return. Intervals are looked up in batches with
+        `Indexes.find_many` and each value is read once per batch in file
+        order, values overlapping several intervals (or carried over from the
+        previous batch) are shared rather than read again.
+        """
+        carried = {}
+        for batch in chunks( intervals, batch_size ):
+            query, starts, ends, offsets = self.indexes.find_many( src, [ i[0] for i in batch ], [ i[1] for i in batch ] )
+            offsets = offsets.tolist()
+            values = {}
+            todo = []
+            for offset in set( offsets ):
+                if offset in carried:
+                    values[offset] = carried[offset]
+                else:
+                    todo.append( offset )
+            todo.sort()
+            values.update( zip( todo, self.get_at_offsets( todo ) ) )
+            bounds = numpy.searchsorted( query, numpy.arange( len( batch ) + 1 ) ).tolist()
+            for i, interval in enumerate( batch ):
+                yield interval, [ values[offset] for offset in offsets[ bounds[i] : bounds[i+1] ] ]
+            carried = values
+
     def get_at_offset( self, offset ):
+        return self.get_at_offsets( [ offset ] )[0]
+
+    def get_at_offsets( self, offsets ):
+        """
+        Return the values at each of `offsets`, from the block cache if
+        there is one or else read using one open file
+        """
+        cache = self.block_cache
+        if cache is None:
+            return self.read_at_offsets( offsets )
+        values = [ cache.get( ( self.cache_key, offset ) ) for offset in offsets ]
+        missing = [ offset for offset, value in zip( offsets, values ) if value is None ]
+        if missing:
+            read = dict( zip( missing, self.read_at_offsets( missing ) ) )
+            for offset, value in read.iteritems():
+                cache[ ( self.cache_key, offset ) ] = value
+            values = [ read[offset] if value is None else value for offset, value in zip( offsets, values ) ]
+        return values
+
+    def read_at_offsets( self, offsets ):
+        """Read the values at each of `offsets`, using one open file"""
+        if not offsets:
+            return []
         if self.f:
-            self.f.seek( offset )
-            return self.read_at_current_offset( self.f, **self.data_kwargs )
+            return [ self.read_at_offset( self.f, offset ) for offset in offsets ]
+        elif handle_pool is not None:
+            pool = handle_pool
+            key = ( self.data_filename, self.file_type, self.use_cache )
+            f = pool.acquire( key, self.open_data )
+            try:
+                return [ self.read_at_offset( f, offset ) for offset in offsets ]
+            finally:
+                pool.release( key, f )
         else:
             f = self.open_data()
             try:
-                f.seek( offset )
-                return self.read_at_current_offset( f, **self.data_kwargs ) 
+                return [ self.read_at_offset( f, offset ) for offset in offsets ]
             finally:
                 f.close()
-                
+
+    def read_at_offset( self, f, offset ):
+        f.seek( offset )
+        return self.read_at_current_offset( f, **self.data_kwargs )
+
     def read_at_current_offset( self, file, **kwargs ):
         raise TypeError( "Abstract Method" )
 
 class Indexes:
     """A set of indexes, each identified by a unique name"""
 
-    def __init__( self, filename=None ):
+    def __init__( self, filename=None, use_mmap=False ):
         self.indexes = dict()
-        if filename is not None: self.open( filename )
+        self.data = None
+        if filename is not None: self.open( filename, use_mmap )
 
     def add( self, name, start, end, val, max=DEFAULT_MAX ):
         if name not in self.indexes:
             self.indexes[name] = Index( max=max )
         self.indexes[name].add( start, end, val )
 
+    def add_arrays( self, name, starts, ends, vals, max=DEFAULT_MAX ):
+        """
+        Add many intervals for `name` at once, see `Index.add_arrays`.
+        """
+        if name not in self.indexes:
+            self.indexes[name] = Index( max=max )
+        self.indexes[name].add_arrays( starts, ends, vals )
+
     def get( self, name ):
         if self.indexes[name] is None:
             offset, value_size = self.offsets[name]
-            self.indexes[name] = Index( filename=self.filename, offset=offset, value_size=value_size, version=self.version )
+            self.indexes[name] = Index( filename=self.filename, offset=offset, value_size=value_size, version=self.version, data=self.data )
         return self.indexes[name]
 
     def find( self, name, start, end ):
@@ -287,10 +497,24 @@ class Indexes:
         else:
             return []
 
-    def open( self, filename ):
+    def find_many( self, name, starts, ends ):
+        """
+        Find the intervals overlapping each query (starts[i],ends[i]), see
+        `Index.find_many`.
+        """
+        if name in self.indexes:
+            return self.get( name ).find_many( starts, ends )
+        else:
+            return empty_hits()
+
+    def open( self, filename, use_mmap=False ):
         self.filename = filename
         self.offsets = dict()  # (will map key to (offset,value_size))
         f = open( filename )
+        if use_mmap:
+            # Shared by all the indexes in the file, bins are then read as
+            # arrays directly from the mapping
+            self.data = mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_READ )
         magic, version, length = read_packed( f, ">3I" )
         if magic != MAGIC:
             raise Exception("File does not have expected header")
@@ -339,13 +563,14 @@ class Indexes:
 
 class Index:
 
-    def __init__( self, min=MIN, max=DEFAULT_MAX, filename=None, offset=0, value_size=None, version=None ):
+    def __init__( self, min=MIN, max=DEFAULT_MAX, filename=None, offset=0, value_size=None, version=None, data=None ):
         self._value_size = value_size
         self.max_val = 1   # (1, rather than 0, to force value_size > 0)
+        self.data = None
         if filename is None:
             self.new( min, max )
         else:
-            self.open( filename, offset, version )
+            self.open( filename, offset, version, data )
 
     def get_value_size ( self ):
         if self._value_size != None:
@@ -367,14 +592,17 @@ class Index:
         # Create empty bins
         self.bins = [ [] for i in range( self.bin_count ) ]
 
-    def open( self, filename, offset, version ):
+    def open( self, filename, offset, version, data=None ):
         self.filename = filename
         self.offset = offset
-        # Open the file and seek to where we expect our header
-        f = open( filename )
-        f.seek( offset )
+        # A memory map of the whole file, if given
+        self.data = data
+        # Bins in the shared cache are identified by file and position, the
+        # modification time guards against the file being rewritten
+        stat = os.stat( filename )
+        self.file_key = ( filename, stat.st_mtime, stat.st_size )
         # Read min/max
-        min, max = read_packed( f, ">2I" )
+        min, max = unpack( ">2I", self.read_data( offset, 8 ) )
         self.new( min, max )
         # Decide how many levels of bins based on 'max'
         if version < 2:
@@ -382,58 +610,181 @@ class Index:
             self.offsets = offsets_for_max_size( OLD_MAX - 1 )
         else:
             self.offsets = offsets_for_max_size( max )
-        # Read bin indexes
-        self.bin_offsets = []
-        self.bin_sizes = []
-        for i in range( self.bin_count ):
-            o, s = read_packed( f, ">2I" )
-            self.bin_offsets.append( o )
-            self.bin_sizes.append( s )
+        # Read bin indexes, (offset,size) pairs
+        table = numpy.frombuffer( self.read_data( offset + 8, 8 * self.bin_count ), dtype=">u4" )
+        self.bin_offsets = table[0::2].astype( numpy.int64 )
+        self.bin_sizes = table[1::2].astype( numpy.int64 )
         # Initialize bins to None, indicating that they need to be loaded
         self.bins = [ None for i in range( self.bin_count ) ]
 
+    def read_data( self, offset, size ):
+        """Read `size` bytes at `offset` in the index file"""
+        if self.data is not None:
+            return self.data[ offset : offset + size ]
+        elif handle_pool is not None:
+            return handle_pool.read( self.filename, offset, size )
+        f = open( self.filename )
+        try:
+            f.seek( offset )
+            return f.read( size )
+        finally:
+            f.close()
+
     def add( self, start, end, val ):
         """Add the interval (start,end) with associated value val to the index"""
         insort( self.bins[ bin_for_range( start, end, offsets=self.offsets ) ], ( start, end, val ) )
         assert val >= 0
         self.max_val = max(self.max_val,val)
 
+    def add_arrays( self, starts, ends, vals ):
+        """
+        Add the intervals (starts[i],ends[i]) with values vals[i] using a
+        single sort rather than an insertion per interval. This is meant for
+        building a new index to write: the bins become record arrays and
+        must not already contain intervals.
+        """
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        vals = numpy.asarray( vals, dtype=numpy.int64 )
+        if len( vals ) == 0:
+            return
+        if any( len( bin ) for bin in self.bins ):
+            raise ValueError( "add_arrays requires an empty index" )
+        assert vals.min() >= 0
+        self.max_val = max( self.max_val, int( vals.max() ) )
+        bins = bins_for_ranges( starts, ends, self.offsets )
+        order = numpy.lexsort( ( vals, ends, starts, bins ) )
+        records = numpy.empty( len( order ), dtype=bin_dtype )
+        records['start'] = starts[order]
+        records['end'] = ends[order]
+        records['val'] = vals[order]
+        bins = bins[order]
+        bounds = numpy.flatnonzero( numpy.diff( bins ) ) + 1
+        for lo, hi in zip( numpy.concatenate( ( [ 0 ], bounds ) ), numpy.concatenate( ( bounds, [ len( bins ) ] ) ) ):
+            self.bins[ bins[lo] ] = records[lo:hi]
+
     def find( self, start, end ):
+        if self.data is not None:
+            query, starts, ends, vals = self.find_many( [ start ], [ end ] )
+            return zip( starts.tolist(), ends.tolist(), vals.tolist() )
         rval = []
         start_bin = ( max( start, self.min ) ) >> BIN_FIRST_SHIFT
         end_bin = ( min( end, self.max ) - 1 ) >> BIN_FIRST_SHIFT
         for offset in self.offsets:
             for i in range( start_bin + offset, end_bin + offset + 1 ):
-                if self.bins[i] is None: self.load_bin( i )
                 # Iterate over bin and insert any overlapping elements into return value
-                for el_start, el_end, val in self.bins[i]:
+                for el_start, el_end, val in self.get_bin( i ):
                     if el_start < end and el_end > start:
                         insort_right( rval, ( el_start, el_end, val ) )
             start_bin >>= BIN_NEXT_SHIFT
             end_bin >>= BIN_NEXT_SHIFT
         return rval
 
+    def find_many( self, starts, ends ):
+        """
+        Find the intervals overlapping each query (starts[i],ends[i]),
+        visiting each bin once for all queries that touch it. Returns arrays
+        ( query, start, end, val ) with one element per hit, where query is
+        the index of the query interval, sorted by query and then as `find`
+        sorts its results.
+        """
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        parts = []
+        start_bins = numpy.maximum( starts, self.min ) >> BIN_FIRST_SHIFT
+        end_bins = ( numpy.minimum( ends, self.max ) - 1 ) >> BIN_FIRST_SHIFT
+        for offset in self.offsets:
+            # One (query,bin) pair for every bin a query touches at this level
+            counts = numpy.maximum( end_bins - start_bins + 1, 0 )
+            total = counts.sum()
+            if total > 0:
+                firsts = numpy.cumsum( counts ) - counts
+                queries = numpy.repeat( numpy.arange( len( starts ) ), counts )
+                bins = numpy.repeat( start_bins + offset - firsts, counts ) + numpy.arange( total )
+                order = numpy.argsort( bins, kind="mergesort" )
+                queries = queries[order]
+                bins = bins[order]
+                bounds = numpy.concatenate( ( [ 0 ], numpy.flatnonzero( numpy.diff( bins ) ) + 1, [ total ] ) )
+                for lo, hi in zip( bounds[:-1], bounds[1:] ):
+                    entries = self.bin_array( bins[lo] )
+                    if len( entries ) == 0:
+                        continue
+                    el_starts = entries['start'].astype( numpy.int64 )
+                    el_ends = entries['end'].astype( numpy.int64 )
+                    # Entries are sorted by start, so those starting before
+                    # the end of a query are a prefix of the bin
+                    qs = queries[lo:hi]
+                    n = numpy.searchsorted( el_starts, ends[qs] )
+                    hit_queries = numpy.repeat( qs, n )
+                    hit_entries = numpy.arange( n.sum() ) - numpy.repeat( numpy.cumsum( n ) - n, n )
+                    keep = el_ends[hit_entries] > starts[hit_queries]
+                    hit_queries = hit_queries[keep]
+                    hit_entries = hit_entries[keep]
+                    parts.append( ( hit_queries, el_starts[hit_entries], el_ends[hit_entries],
+                                    entries['val'][hit_entries].astype( numpy.int64 ) ) )
+            start_bins >>= BIN_NEXT_SHIFT
+            end_bins >>= BIN_NEXT_SHIFT
+        if not parts:
+            return empty_hits()
+        query, hit_starts, hit_ends, vals = [ numpy.concatenate( p ) for p in zip( *parts ) ]
+        order = numpy.lexsort( ( vals, hit_ends, hit_starts, query ) )
+        return query[order], hit_starts[order], hit_ends[order], vals[order]
+
+    def bin_array( self, index ):
+        """
+        Return bin `index` as a structured array with fields start, end and
+        val, a view of the file when it is memory mapped.
+        """
+        value_size = self.value_size
+        if self.data is not None and value_size in ( 4, 8 ):
+            dtype = numpy.dtype( [ ( "start", ">u4" ), ( "end", ">u4" ), ( "val", ">u%d" % value_size ) ] )
+            size = int( self.bin_sizes[index] )
+            if size == 0:
+                return numpy.empty( 0, dtype )
+            return numpy.frombuffer( self.data, dtype=dtype, count=size, offset=int( self.bin_offsets[index] ) )
+        return numpy.array( self.get_bin( index ), dtype=bin_dtype )
+
     def iterate( self ):
         for i in range( self.bin_count ):
-            if self.bins[i] is None: self.load_bin( i )
-            for entry in self.bins[i]:  yield entry
+            for entry in self.get_bin( i ):  yield entry
+
+    def get_bin( self, index ):
+        """
+        Return the intervals in bin `index`, loading them if needed. With the
+        shared cache enabled loaded bins are kept there rather than in this
+        index.
+        """
+        bin = self.bins[index]
+        if bin is not None:
+            return bin
+        cache = bin_cache
+        if cache is None or self.bin_sizes[index] == 0:
+            self.load_bin( index )
+            return self.bins[index]
+        key = ( self.file_key, int( self.bin_offsets[index] ) )
+        with bin_cache_lock:
+            bin = cache.get( key )
+        if bin is None:
+            bin = self.read_bin( index )
+            with bin_cache_lock:
+                cache[key] = bin
+        return bin
 
     def load_bin( self, index ):
+        self.bins[index] = self.read_bin( index )
+
+    def read_bin( self, index ):
         bin = []
         if self.bin_sizes[index] == 0:
-            self.bins[index] = bin
-            return
-        f = open( self.filename )
-        f.seek( self.bin_offsets[index] )
+            return bin
         # One big read for happy NFS
         item_size = self.value_size + calcsize( ">2I" )
-        buffer = f.read( self.bin_sizes[index] * item_size )
+        buffer = self.read_data( int( self.bin_offsets[index] ), int( self.bin_sizes[index] ) * item_size )
         for i in range( self.bin_sizes[index] ):
             start, end = unpack( ">2I", buffer[ i*item_size : i*item_size+8 ] )
             val = unpack_uints( buffer[ i*item_size+8 : (i+1)*item_size ] )
             bin.append( (start, end, val) )
-        self.bins[index] = bin
-        f.close()
+        return bin
 
     def write( self, f ):
         value_size = self.value_size
@@ -447,6 +798,12 @@ class Index:
             base += len( bin ) * item_size
         # Write contents of each bin
         for bin in self.bins:
+            if isinstance( bin, numpy.ndarray ):
+                # From add_arrays, written in one go
+                assert value_size <= 8, "unsupported value size: %s" % value_size
+                dtype = [ ( "start", ">u4" ), ( "end", ">u4" ), ( "val", ">u%d" % value_size ) ]
+                f.write( bin.astype( dtype ).tostring() )
+                continue
             for start, end, val in bin:
                 write_packed( f, ">2I", start, end )
                 write_packed_uints( f, val, value_size )
@@ -459,6 +816,22 @@ class Index:
             rval += len( bin ) * item_size
         return rval
 
+# Bins as arrays, see `Index.bin_array`
+bin_dtype = numpy.dtype( [ ( "start", numpy.int64 ), ( "end", numpy.int64 ), ( "val", numpy.int64 ) ] )
+
+def empty_hits():
+    """Result of `Index.find_many` when nothing overlaps"""
+    return tuple( numpy.zeros( 0, dtype=numpy.int64 ) for i in range( 4 ) )
+
+def chunks( iterable, size ):
+    """Split `iterable` into lists of `size` elements (the last may be shorter)"""
+    iterator = iter( iterable )
+    while True:
+        chunk = list( islice( iterator, size ) )
+        if not chunk:
+            return
+        yield chunk
+
 def write_packed( f, pattern, *vals ):
     f.write( pack( pattern, *vals ) )
 
@@ -2,6 +2,7 @@ import interval_index_file
 from interval_index_file import Indexes
 from tempfile import mktemp
 import random
+import numpy
 
 def test_offsets():
     assert interval_index_file.offsets_for_max_size( 512*1024*1024  - 1 ) == [ 512 + 64 + 8 + 1, 64 + 8 + 1, 8 + 1, 1, 0 ]
@@ -48,3 +49,101 @@ def test_interval_index_file():
 def test_zero():
     ix = Indexes()
     ix.add("t.idx", 0, 0, 1, 123)
+
+def test_shared_cache():
+    ix = Indexes()
+    for i in range( 2000 ):
+        ix.add( "seq", i * 1000, i * 1000 + 500, i, max=interval_index_file.MAX )
+    fname = mktemp()
+    f = open( fname, "w" )
+    ix.write( f )
+    f.close()
+    expected = [ Indexes( fname ).find( "seq", s, s + 300000 ) for s in range( 0, 2000000, 250000 ) ]
+    interval_index_file.enable_shared_cache( max_open_files=2, max_cached_intervals=5000 )
+    try:
+        for repeat in range( 3 ):
+            # A new instance each time, bins are still loaded only once
+            ix = Indexes( fname )
+            assert [ ix.find( "seq", s, s + 300000 ) for s in range( 0, 2000000, 250000 ) ] == expected
+            assert not any( ix.get( "seq" ).bins )
+            if repeat == 0:
+                misses = interval_index_file.shared_cache_stats()["bin_misses"]
+        stats = interval_index_file.shared_cache_stats()
+        assert stats["file_opens"] == 1
+        assert stats["bin_misses"] == stats["cached_bins"] == misses
+        assert stats["bin_hits"] >= 2 * misses
+        assert stats["cached_intervals"] <= 5000
+    finally:
+        interval_index_file.disable_shared_cache()
+    assert interval_index_file.shared_cache_stats() is None
+
+def test_handle_pool():
+    pool = interval_index_file.FileHandlePool( max_open=1 )
+    fname = mktemp()
+    open( fname, "w" ).write( "0123456789" )
+    opened = []
+    def opener():
+        opened.append( 1 )
+        return open( fname )
+    a = pool.acquire( "a", opener )
+    b = pool.acquire( "a", opener )
+    assert a is not b and len( opened ) == 2
+    pool.release( "a", a )
+    pool.release( "a", b )
+    assert a.closed and not b.closed
+    assert pool.acquire( "a", opener ) is b
+    pool.release( "a", b )
+    assert pool.read( fname, 3, 4 ) == "3456"
+    assert b.closed
+    pool.close()
+    assert pool.idle_count == 0
+
+def test_mmap_find_many():
+    ix = Indexes()
+    intervals = []
+    for i in range( 3000 ):
+        start = random.randint( 0, 50000000 )
+        end = start + random.choice( [ 0, 1, 100, 10000, 1000000, 20000000 ] )
+        ix.add( "seq", start, end, i, max=64*1024*1024 )
+        # Values wider than 4 bytes
+        ix.add( "wide", start, end, i << 33 )
+        intervals.append( ( start, end, i ) )
+    fname = mktemp()
+    f = open( fname, "w" )
+    ix.write( f )
+    f.close()
+    plain = Indexes( fname )
+    mapped = Indexes( fname, use_mmap=True )
+    starts = [ random.randint( 0, 60000000 ) for i in range( 200 ) ]
+    ends = [ s + random.choice( [ 0, 1, 5000, 3000000 ] ) for s in starts ]
+    for name in "seq", "wide":
+        query, hit_starts, hit_ends, vals = mapped.find_many( name, starts, ends )
+        hits = zip( hit_starts.tolist(), hit_ends.tolist(), vals.tolist() )
+        assert numpy.all( numpy.diff( query ) >= 0 )
+        for i, ( start, end ) in enumerate( zip( starts, ends ) ):
+            expected = plain.find( name, start, end )
+            assert mapped.find( name, start, end ) == expected
+            assert [ h for q, h in zip( query, hits ) if q == i ] == expected
+            assert len( ix.find( name, start, end ) ) == len( expected )
+        # In memory indexes support the same queries
+        assert numpy.all( ix.find_many( name, starts, ends )[3] == vals )
+    assert [ len( a ) for a in mapped.find_many( "nothing", starts, ends ) ] == [ 0, 0, 0, 0 ]
+
+def test_add_arrays():
+    starts = numpy.random.randint( 0, 100000000, 5000 )
+    ends = starts + numpy.random.randint( 0, 2000000, 5000 )
+    vals = numpy.random.randint( 0, 2**40, 5000 )
+    a, b = Indexes(), Indexes()
+    for start, end, val in zip( starts, ends, vals ):
+        a.add( "seq", start, end, val, max=200000000 )
+    b.add_arrays( "seq", starts, ends, vals, max=200000000 )
+    files = []
+    for ix in a, b:
+        fname = mktemp()
+        f = open( fname, "w" )
+        ix.write( f )
+        f.close()
+        files.append( open( fname ).read() )
+    assert files[0] == files[1]
+    assert interval_index_file.bins_for_ranges( starts, ends ).tolist() == \
+           [ interval_index_file.bin_for_range( s, e ) for s, e in zip( starts, ends ) ]
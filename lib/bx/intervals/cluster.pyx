@@ -14,8 +14,16 @@ among nodes are performed whenever a node is changed/added that will cause other
 nodes to form a new cluster.
 
 C source code is in src/cluster.c
+
+For input sorted by start `SortedClusterer` finds the same clusters without
+a tree: only the last cluster can still grow, so each cluster is finished as
+soon as an interval starts more than the max separation after its end, and
+only the intervals of that cluster are kept in memory.
 """
 
+cdef extern from "stdlib.h":
+    void free(void *)
+
 cdef extern from "cluster.h":
     
     cdef struct struct_interval:
@@ -120,3 +128,141 @@ cdef class ClusterTree:
         freeclusteritr(itr)
         return lines
         
+
+# ---- Clustering sorted input ------------------------------------------------
+
+include "long_vector.pxi"
+
+cdef class SortedClusterer:
+    ''' Finds the clusters of intervals inserted in order of start, with the
+        same arguments and results as ClusterTree. Finished clusters are
+        collected until taken with pop_regions or pop_arrays, so memory is
+        only needed for the cluster being built and those not yet taken.
+
+        clusterer = SortedClusterer(0, 0)
+        Insert (1, 2, 3), (3, 4, 0), (3, 8, 4), (6, 7, 1), (9, 10, 2), finish()
+        clusterer.pop_regions() returns [(1, 2, [3]), (3, 8, [0, 1, 4]), (9, 10, [2])]
+    '''
+    cdef long mincols
+    cdef long minregions
+    # The cluster being built, its ids are at the end of `ids`
+    cdef long start, end, last_start
+    cdef bint active
+    cdef size_t first_id
+    # Finished clusters, the ids of cluster i are ids[offsets[i]:offsets[i+1]]
+    cdef LongVector starts, ends, offsets, ids
+
+    def __cinit__(self, mincols, minregions):
+        self.mincols = mincols
+        self.minregions = minregions
+        self.active = False
+        self.first_id = 0
+        vector_push(&self.offsets, 0)
+
+    def __dealloc__(self):
+        free(self.starts.data)
+        free(self.ends.data)
+        free(self.offsets.data)
+        free(self.ids.data)
+
+    cdef int _insert(self, long s, long e, long id) except -1:
+        if s > e: raise ValueError("Interval start must be before end")
+        if self.active:
+            if s < self.last_start:
+                raise ValueError("Intervals must be inserted in order of start")
+            if s - self.mincols > self.end:
+                self._close()
+        if not self.active:
+            self.active = True
+            self.start = s
+            self.end = e
+        elif e > self.end:
+            self.end = e
+        self.last_start = s
+        vector_push(&self.ids, id)
+        return 0
+
+    cdef int _close(self) except -1:
+        # Keep the ids of the cluster if it has enough intervals, otherwise
+        # forget them
+        if not self.active:
+            return 0
+        self.active = False
+        if <long>(self.ids.size - self.first_id) >= self.minregions:
+            vector_push(&self.starts, self.start)
+            vector_push(&self.ends, self.end)
+            vector_push(&self.offsets, self.ids.size)
+            self.first_id = self.ids.size
+        else:
+            self.ids.size = self.first_id
+        return 0
+
+    def insert(self, s, e, id):
+        ''' Insert an interval with start, end, id as parameters, starting at
+            or after all intervals inserted before '''
+        self._insert(s, e, id)
+
+    def insert_batch(self, starts, ends, ids):
+        ''' Insert the intervals [starts[i], ends[i]) with ids[i] '''
+        import numpy
+        cdef long[::1] s = numpy.ascontiguousarray(starts, dtype=numpy.int_)
+        cdef long[::1] e = numpy.ascontiguousarray(ends, dtype=numpy.int_)
+        cdef long[::1] n = numpy.ascontiguousarray(ids, dtype=numpy.int_)
+        if not (s.shape[0] == e.shape[0] == n.shape[0]):
+            raise ValueError("starts, ends and ids must be of the same length")
+        cdef Py_ssize_t i
+        for i in range(s.shape[0]):
+            self._insert(s[i], e[i], n[i])
+
+    def finish(self):
+        ''' Finish the cluster being built, call when all intervals (e.g. of
+            a chromosome) have been inserted '''
+        self._close()
+
+    property pending:
+        ''' Number of finished clusters not yet taken '''
+        def __get__(self):
+            return self.starts.size
+
+    def pop_arrays(self):
+        ''' Take the finished clusters as arrays (starts, ends, offsets, ids),
+            the sorted ids of the intervals in cluster i are
+            ids[offsets[i]:offsets[i+1]] '''
+        import numpy
+        cdef size_t keep = self.ids.size - self.first_id
+        cdef size_t i
+        starts = vector_to_array(&self.starts)
+        ends = vector_to_array(&self.ends)
+        offsets = vector_to_array(&self.offsets)
+        ids = vector_to_array(&self.ids)[:self.first_id]
+        clusters = numpy.repeat(numpy.arange(len(starts)), numpy.diff(offsets))
+        ids = ids[numpy.lexsort((ids, clusters))]
+        # Move the ids of the cluster being built to the front
+        for i in range(keep):
+            self.ids.data[i] = self.ids.data[self.first_id + i]
+        self.ids.size = keep
+        self.first_id = 0
+        self.starts.size = self.ends.size = 0
+        self.offsets.size = 1
+        return starts, ends, offsets, ids
+
+    def pop_regions(self):
+        ''' Take the finished clusters as a list of tuples of (start, end,
+            array of sorted ids), in ascending order of start '''
+        starts, ends, offsets, ids = self.pop_arrays()
+        offsets = offsets.tolist()
+        return [ (start, end, ids[offsets[i]:offsets[i+1]]) for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())) ]
+
+def iter_sorted_clusters(intervals, mincols, minregions):
+    ''' Yield the clusters (start, end, array of sorted ids) of the
+        (start, end, id) tuples `intervals`, which must be sorted by start,
+        as soon as each is finished '''
+    clusterer = SortedClusterer(mincols, minregions)
+    for s, e, id in intervals:
+        clusterer.insert(s, e, id)
+        if clusterer.pending:
+            for region in clusterer.pop_regions():
+                yield region
+    clusterer.finish()
+    for region in clusterer.pop_regions():
+        yield region
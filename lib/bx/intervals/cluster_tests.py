@@ -1,4 +1,5 @@
 import sys, os
+import random
 import unittest
 try:
     sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
@@ -6,7 +7,7 @@ except:
     sys.path.insert(0, os.path.dirname(os.path.abspath(".")))
 
 # from bx.intervals.cluster import ClusterTree
-from cluster import ClusterTree
+from cluster import ClusterTree, SortedClusterer, iter_sorted_clusters
 
 class TestCluster(unittest.TestCase):
     def setUp(self):
@@ -98,6 +99,61 @@ class TestCluster(unittest.TestCase):
 
         self.assertEqual( [], self.tree.getregions() )
         
+class TestSortedClusterer(unittest.TestCase):
+    def regions(self, regions):
+        return [ (s, e, list(ids)) for s, e, ids in regions ]
+
+    def test_example(self):
+        clusterer = SortedClusterer(0, 0)
+        for s, e, i in [(1, 2, 3), (3, 4, 0), (3, 8, 4), (6, 7, 1)]:
+            clusterer.insert(s, e, i)
+        # The first cluster is finished once an interval starts after it
+        self.assertEqual( [(1, 2, [3])], self.regions(clusterer.pop_regions()) )
+        clusterer.insert(9, 10, 2)
+        clusterer.finish()
+        self.assertEqual( [(3, 8, [0, 1, 4]), (9, 10, [2])], self.regions(clusterer.pop_regions()) )
+        self.assertEqual( [], clusterer.pop_regions() )
+
+    def test_same_as_tree(self):
+        for i in range(100):
+            mincols = random.choice([0, 1, 10])
+            minregions = random.choice([0, 1, 2, 3])
+            pairs = sorted((random.randint(0, 2000), random.randint(0, 50)) for j in range(random.randint(0, 300)))
+            intervals = [ (s, s + l, j) for j, (s, l) in enumerate(pairs) ]
+            tree = ClusterTree(mincols, minregions)
+            for s, e, j in intervals:
+                tree.insert(s, e, j)
+            expected = tree.getregions()
+            self.assertEqual( expected, self.regions(iter_sorted_clusters(intervals, mincols, minregions)) )
+            clusterer = SortedClusterer(mincols, minregions)
+            if intervals:
+                clusterer.insert_batch(*zip(*intervals))
+            clusterer.finish()
+            starts, ends, offsets, ids = clusterer.pop_arrays()
+            self.assertEqual( len(offsets), len(starts) + 1 )
+            self.assertEqual( expected, [ (s, e, ids[offsets[j]:offsets[j+1]].tolist()) for j, (s, e) in enumerate(zip(starts, ends)) ] )
+
+    def test_unsorted(self):
+        clusterer = SortedClusterer(0, 0)
+        clusterer.insert(5, 10, 0)
+        self.assertRaises(ValueError, clusterer.insert, 4, 6, 1)
+        self.assertRaises(ValueError, clusterer.insert, 8, 6, 1)
+
+    def test_find_clusters_sorted(self):
+        from bx.intervals.io import GenomicIntervalReader
+        from bx.intervals.operations.find_clusters import find_clusters, find_clusters_sorted
+        lines = [ "#header" ]
+        for chrom in ( "chr1", "chr2" ):
+            starts = sorted(random.randint(0, 5000) for j in range(200))
+            lines.extend( "%s\t%d\t%d" % (chrom, s, s + random.randint(1, 100)) for s in starts )
+        trees, extra = find_clusters(GenomicIntervalReader(lines), mincols=5, minregions=2)
+        expected = [ (chrom, s, e, ids) for chrom in sorted(trees) for s, e, ids in trees[chrom].getregions() ]
+        sorted_extra = {}
+        found = [ (chrom, s, e, list(ids)) for chrom, s, e, ids in
+                  find_clusters_sorted(GenomicIntervalReader(lines), mincols=5, minregions=2, extra=sorted_extra) ]
+        self.assertEqual( expected, found )
+        self.assertEqual( sorted(extra), sorted(sorted_extra) )
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""
+An interval index over a whole genome, with a `StaticIntervalIndex` for
+each chromosome.
+
+`GenomeIntervalIndex` is built in bulk from intervals on many chromosomes
+(arrays, "interval" like objects such as those read by
+`bx.intervals.io.GenomicIntervalReader`, or a BED file), optionally building
+the index of each chromosome in a pool of worker processes. Intervals are
+numbered in the order they are given and queries return these numbers (or
+the values associated with them), for one query or for arrays of queries
+on any mix of chromosomes.
+
+>>> index = GenomeIntervalIndex( [ "chr1", "chr2", "chr1" ], [ 0, 5, 20 ], [ 10, 15, 30 ], [ "a", "b", "c" ] )
+>>> index.find( "chr1", 5, 25 )
+['a', 'c']
+>>> queries, hits = index.find_batch( [ "chr2", "chr1", "chrX" ], [ 0, 0, 0 ], [ 100, 100, 100 ] )
+>>> queries
+array([0, 1, 1])
+>>> hits
+array([1, 0, 2])
+>>> index.after( "chr1", 10 )
+['c']
+"""
+
+from multiprocessing import Pool, cpu_count
+
+import numpy
+
+from bx.intervals.static_index import StaticIntervalIndex, SAVED_ARRAYS
+
+__all__ = [ 'GenomeIntervalIndex', 'group_by_chrom' ]
+
+def group_by_chrom( chroms ):
+    """
+    Return ( chrom, index array ) for each distinct chromosome in `chroms`,
+    in order of name, each with the positions of that chromosome in order
+    """
+    names, codes = numpy.unique( numpy.asarray( chroms, dtype=str ), return_inverse=True )
+    order = numpy.argsort( codes, kind="mergesort" )
+    bounds = numpy.searchsorted( codes[order], numpy.arange( len( names ) + 1 ) )
+    return [ ( name, order[lo:hi] ) for name, lo, hi in zip( names.tolist(), bounds[:-1], bounds[1:] ) ]
+
+def build_arrays( task ):
+    """Arrays of the index of one chromosome (run in the worker processes)"""
+    starts, ends = task
+    index = StaticIntervalIndex( starts, ends )
+    return dict( ( name, getattr( index, name ) ) for name in SAVED_ARRAYS )
+
+class GenomeIntervalIndex( object ):
+    """
+    Index of the intervals chroms[i]:[starts[i],ends[i]) with associated
+    values (values[i], or i if no values are given). The indexes of the
+    chromosomes are built by `processes` worker processes (one per CPU if
+    None), or in this process if `processes` is 1.
+    """
+    def __init__( self, chroms, starts, ends, values=None, processes=1 ):
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        if not ( len( chroms ) == len( starts ) == len( ends ) ):
+            raise ValueError( "chroms, starts and ends must be of the same length" )
+        if values is not None and len( values ) != len( starts ):
+            raise ValueError( "values must be of the same length as chroms, starts and ends" )
+        self.values = values
+        self.count = len( starts )
+        groups = group_by_chrom( chroms )
+        tasks = [ ( starts[ids], ends[ids] ) for name, ids in groups ]
+        if processes is None:
+            processes = cpu_count()
+        if processes > 1 and len( tasks ) > 1:
+            pool = Pool( min( processes, len( tasks ) ) )
+            try:
+                arrays = pool.map( build_arrays, tasks, chunksize=1 )
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            arrays = map( build_arrays, tasks )
+        # The value of each interval in a chromosome index is its number
+        self.indexes = {}
+        for ( name, chrom_ids ), chrom_arrays in zip( groups, arrays ):
+            self.indexes[name] = StaticIntervalIndex.from_arrays( chrom_arrays, chrom_ids )
+
+    @classmethod
+    def from_intervals( cls, intervals, processes=1 ):
+        """
+        Index "interval" like objects (with chrom, start and end attributes,
+        e.g. from a `GenomicIntervalReader`), the objects are the values.
+        Anything without a chrom (e.g. headers and comments) is skipped.
+        """
+        chroms, starts, ends, values = [], [], [], []
+        for interval in intervals:
+            chrom = getattr( interval, "chrom", None )
+            if chrom is None:
+                continue
+            chroms.append( chrom )
+            starts.append( interval.start )
+            ends.append( interval.end )
+            values.append( interval )
+        return cls( chroms, starts, ends, values, processes )
+
+    @classmethod
+    def from_bed( cls, f, processes=1, keep_lines=False ):
+        """
+        Index the intervals of a BED file, skipping comment, track and blank
+        lines. The values are the record numbers, or the lines (without the
+        newline) if `keep_lines`.
+        """
+        chroms, starts, ends, lines = [], [], [], []
+        for line in f:
+            if line.startswith( "#" ) or line.startswith( "track" ) or line.isspace():
+                continue
+            fields = line.split( None, 3 )
+            chroms.append( fields[0] )
+            starts.append( int( fields[1] ) )
+            ends.append( int( fields[2] ) )
+            if keep_lines:
+                lines.append( line.rstrip( "\r\n" ) )
+        return cls( chroms, starts, ends, lines if keep_lines else None, processes )
+
+    def __len__( self ):
+        return self.count
+
+    def __contains__( self, chrom ):
+        return chrom in self.indexes
+
+    def chroms( self ):
+        return sorted( self.indexes )
+
+    def ordered_indices( self ):
+        """Numbers of all the intervals, sorted by chrom and then start"""
+        parts = []
+        for chrom in self.chroms():
+            index = self.indexes[chrom]
+            parts.append( index.values[ index.ids[ numpy.argsort( index.rank ) ] ] )
+        if not parts:
+            return numpy.zeros( 0, numpy.int64 )
+        return numpy.concatenate( parts )
+
+    def traverse( self, fn ):
+        """call fn for each interval, in order of chrom and start"""
+        for value in self.lookup( self.ordered_indices() ):
+            fn( value )
+
+    def lookup( self, ids ):
+        """The values for the interval numbers `ids`"""
+        if self.values is None:
+            return [ int( i ) for i in ids ]
+        return [ self.values[i] for i in ids ]
+
+    # ---- Single queries -----------------------------------------------------
+
+    def find_indices( self, chrom, start, end ):
+        """Array of the numbers of the intervals overlapping chrom:[start,end)"""
+        index = self.indexes.get( chrom )
+        if index is None:
+            return numpy.zeros( 0, numpy.int64 )
+        return index.values[ index.find_indices( start, end ) ]
+
+    def find( self, chrom, start, end ):
+        """
+        Return a list of the intervals overlapping chrom:[start,end), sorted
+        by start
+        """
+        return self.lookup( self.find_indices( chrom, start, end ) )
+
+    def before( self, chrom, position, num_intervals=1, max_dist=2500 ):
+        """
+        Find `num_intervals` intervals on `chrom` that lie before `position`
+        and are no further than `max_dist` positions away, nearest first
+        """
+        index = self.indexes.get( chrom )
+        if index is None:
+            return []
+        return self.lookup( index.values[ index.before_indices( position, num_intervals, max_dist ) ] )
+
+    def after( self, chrom, position, num_intervals=1, max_dist=2500 ):
+        """
+        Find `num_intervals` intervals on `chrom` that lie after `position`
+        and are no further than `max_dist` positions away, nearest first
+        """
+        index = self.indexes.get( chrom )
+        if index is None:
+            return []
+        return self.lookup( index.values[ index.after_indices( position, num_intervals, max_dist ) ] )
+
+    # ---- Batch queries ------------------------------------------------------
+
+    def group_queries( self, chroms ):
+        """Yield the index and the query numbers for each chromosome queried"""
+        for name, which in group_by_chrom( chroms ):
+            if name in self.indexes:
+                yield self.indexes[name], which
+
+    def find_batch( self, chroms, starts, ends ):
+        """
+        Find the intervals overlapping each of the queries
+        chroms[i]:[starts[i],ends[i]). Returns arrays ( query_index,
+        hit_index ) of matching pairs, sorted by query and then by start of
+        the interval.
+        """
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        queries, hits = [], []
+        for index, which in self.group_queries( chroms ):
+            q, h = index.find_batch( starts[which], ends[which] )
+            queries.append( which[q] )
+            hits.append( index.values[h] )
+        return merge_by_query( queries, hits )
+
+    def nearest_batch( self, chroms, starts, ends, direction, num_intervals=1, max_dist=2500, strands=None ):
+        """
+        For each of the queries chroms[i]:[starts[i],ends[i]) find up to
+        `num_intervals` intervals no further than `max_dist` away that are
+        completely "before", "after", "upstream" or "downstream" of it
+        (`strands` gives the strand of each query, as "+"/"-" or 1/-1, for
+        upstream and downstream). Returns arrays ( query_index, hit_index ),
+        with the intervals for each query nearest first.
+        """
+        if direction not in ( "before", "after", "upstream", "downstream" ):
+            raise ValueError( "Unknown direction: %s" % direction )
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        if direction in ( "before", "after" ) or strands is None:
+            left = numpy.empty( len( starts ), dtype=bool )
+            left.fill( direction in ( "before", "upstream" ) )
+        else:
+            strands = numpy.asarray( strands )
+            if strands.dtype.kind in "SUO":
+                minus = strands == "-"
+            else:
+                minus = strands == -1
+            left = minus == ( direction == "downstream" )
+        queries, hits = [], []
+        for index, which in self.group_queries( chroms ):
+            for i in which:
+                if left[i]:
+                    found = index.before_indices( starts[i], num_intervals, max_dist )
+                else:
+                    found = index.after_indices( ends[i], num_intervals, max_dist )
+                queries.append( numpy.repeat( i, len( found ) ) )
+                hits.append( index.values[found] )
+        return merge_by_query( queries, hits )
+
+def merge_by_query( queries, hits ):
+    """Concatenate the query and hit arrays, sorted by query"""
+    if not queries:
+        return numpy.zeros( 0, numpy.int64 ), numpy.zeros( 0, numpy.int64 )
+    queries = numpy.concatenate( queries ).astype( numpy.int64 )
+    hits = numpy.concatenate( hits ).astype( numpy.int64 )
+    order = numpy.argsort( queries, kind="mergesort" )
+    return queries[order], hits[order]
@@ -0,0 +1,96 @@
+"""
+Tests for `bx.intervals.genome_index`, comparing the results to an
+`IntervalTree` for each chromosome.
+"""
+
+import random
+
+import numpy
+
+from bx.intervals.intersection import Interval, IntervalTree
+from bx.intervals.io import GenomicIntervalReader
+from bx.intervals.genome_index import GenomeIntervalIndex
+
+chroms = [ "chr1", "chr2", "chr10", "chrX" ]
+
+def random_intervals( n, size=100000 ):
+    intervals = []
+    for i in range( n ):
+        start = random.randint( 0, size )
+        end = start + random.randint( 0, random.choice( [ 1, 50, 500, 5000 ] ) )
+        intervals.append( ( random.choice( chroms ), start, end ) )
+    return intervals
+
+def build_trees( intervals ):
+    trees = {}
+    for i, ( chrom, start, end ) in enumerate( intervals ):
+        trees.setdefault( chrom, IntervalTree() ).insert( start, end, Interval( start, end, value=i ) )
+    return trees
+
+def random_queries( n ):
+    query_chroms = [ random.choice( chroms + [ "chrY" ] ) for i in range( n ) ]
+    starts = numpy.random.randint( 0, 110000, n )
+    ends = starts + numpy.random.randint( 0, 2000, n )
+    strands = [ random.choice( "+-" ) for i in range( n ) ]
+    return query_chroms, starts, ends, strands
+
+def test_find():
+    intervals = random_intervals( 3000 )
+    trees = build_trees( intervals )
+    index = GenomeIntervalIndex( *zip( *intervals ) )
+    assert len( index ) == 3000 and index.chroms() == sorted( chroms )
+    query_chroms, starts, ends, strands = random_queries( 300 )
+    queries, hits = index.find_batch( query_chroms, starts, ends )
+    assert numpy.all( numpy.diff( queries ) >= 0 )
+    for i, ( chrom, start, end ) in enumerate( zip( query_chroms, starts, ends ) ):
+        expected = []
+        if chrom in trees:
+            expected = sorted( f.value for f in trees[chrom].find( start, end ) )
+        found = index.find( chrom, start, end )
+        assert sorted( found ) == expected
+        assert [ intervals[f][1] for f in found ] == sorted( intervals[f][1] for f in found )
+        assert hits[ queries == i ].tolist() == found
+
+def test_nearest_batch():
+    intervals = random_intervals( 3000 )
+    trees = build_trees( intervals )
+    index = GenomeIntervalIndex( *zip( *intervals ) )
+    query_chroms, starts, ends, strands = random_queries( 300 )
+    for n, max_dist in ( ( 1, 2500 ), ( 3, 100 ), ( 10, 5000 ) ):
+        for direction, method in ( ( "before", "before_interval" ), ( "after", "after_interval" ),
+                                   ( "upstream", "upstream_of_interval" ), ( "downstream", "downstream_of_interval" ) ):
+            queries, hits = index.nearest_batch( query_chroms, starts, ends, direction, n, max_dist, strands )
+            for i, ( chrom, start, end, strand ) in enumerate( zip( query_chroms, starts, ends, strands ) ):
+                expected = []
+                if chrom in trees:
+                    query = Interval( start, end, strand=strand )
+                    expected = getattr( trees[chrom], method )( query, n, max_dist )
+                found = [ intervals[h] for h in hits[ queries == i ] ]
+                # Other intervals may be chosen on ties, so compare positions
+                if found and found[0][2] <= start:
+                    assert [ f[2] for f in found ] == sorted( [ e.end for e in expected ], reverse=True )
+                else:
+                    assert [ f[1] for f in found ] == sorted( e.start for e in expected )
+
+def test_processes():
+    intervals = random_intervals( 3000 )
+    index = GenomeIntervalIndex( *zip( *intervals ) )
+    parallel = GenomeIntervalIndex( *zip( *intervals ), processes=2 )
+    query_chroms, starts, ends, strands = random_queries( 300 )
+    for a, b in zip( index.find_batch( query_chroms, starts, ends ), parallel.find_batch( query_chroms, starts, ends ) ):
+        assert numpy.all( a == b )
+
+def test_readers():
+    lines = [ "track name=test", "chr2\t10\t20\ta\t0\t+", "#comment", "chr1\t5\t15\tb\t0\t-", "chr2\t0\t12\tc\t0\t+" ]
+    index = GenomeIntervalIndex.from_bed( lines )
+    assert index.find( "chr2", 11, 12 ) == [ 2, 0 ]
+    assert index.ordered_indices().tolist() == [ 1, 2, 0 ]
+    index = GenomeIntervalIndex.from_bed( lines, keep_lines=True )
+    assert index.find( "chr1", 0, 6 ) == [ "chr1\t5\t15\tb\t0\t-" ]
+    index = GenomeIntervalIndex.from_intervals( GenomicIntervalReader( lines ) )
+    assert [ i.fields[3] for i in index.find( "chr2", 11, 12 ) ] == [ "c", "a" ]
+    assert index.before( "chr2", 100 )[0].fields[3] == "a"
+    assert index.after( "chr3", 100 ) == []
+    empty = GenomeIntervalIndex( [], [], [] )
+    assert len( empty ) == 0 and empty.find( "chr1", 0, 10 ) == []
+    assert len( empty.find_batch( [ "chr1" ], [ 0 ], [ 10 ] )[0] ) == 0
@@ -11,7 +11,8 @@ preserves all information about the intervals (unlike bitset projection methods)
 #    This module original contained an implementation based on sorted endpoints
 #    and a binary search, using an idea from Scott Schwartz and Piotr Berman.
 #    Later an interval tree implementation was implemented by Ian for Galaxy's
-#    join tool (see `bx.intervals.operations.quicksect.py`). This was then
+#    join tool (`bx.intervals.operations.quicksect`, since removed, the join
+#    now uses `bx.intervals.genome_index`). This was then
 #    converted to Cython by Brent, who also added support for
 #    upstream/downstream/neighbor queries. This was modified by James to
 #    handle half-open intervals strictly, to maintain sort order, and to
@@ -28,6 +29,8 @@ cdef extern from "stdlib.h":
     int rand()
     int strlen(char *)
     int iabs(int)
+    void *malloc(size_t)
+    void free(void *)
 
 cdef inline int imax2(int a, int b):
     if b > a: return b
@@ -57,6 +60,38 @@ cdef inline int imin2(int a, int b):
 
 cdef float nlog = -1.0 / log(0.5)
 
+# ---- Buffers for the results of batch queries -------------------------------
+
+include "long_vector.pxi"
+
+cdef struct Nearest:
+    # The best `capacity` candidates so far, best first
+    long *keys
+    long *indexes
+    int count
+    int capacity
+    # Larger keys are better
+    int descending
+
+cdef void nearest_add(Nearest *n, long key, long index):
+    # Candidates with equal keys are kept in the order they are found
+    cdef int pos = n.count
+    while pos > 0 and ((n.descending and key > n.keys[pos-1]) or (not n.descending and key < n.keys[pos-1])):
+        pos -= 1
+    if pos >= n.capacity:
+        return
+    cdef int i = n.count
+    if i == n.capacity:
+        i -= 1
+    else:
+        n.count += 1
+    while i > pos:
+        n.keys[i] = n.keys[i-1]
+        n.indexes[i] = n.indexes[i-1]
+        i -= 1
+    n.keys[pos] = key
+    n.indexes[pos] = index
+
 cdef class IntervalNode:
     """
     A single node of an `IntervalTree`.
@@ -67,6 +102,8 @@ cdef class IntervalNode:
     cdef float priority
     cdef public object interval
     cdef public int start, end
+    # Number of the interval in an `IntervalTree`, in order of insertion
+    cdef public long index
     cdef int minend, maxend, minstart
     cdef IntervalNode cleft, cright, croot
 
@@ -98,8 +135,9 @@ cdef class IntervalNode:
         self.cleft    = EmptyNode
         self.cright   = EmptyNode
         self.croot    = EmptyNode
+        self.index    = -1
         
-    cpdef IntervalNode insert(IntervalNode self, int start, int end, object interval):
+    cpdef IntervalNode insert(IntervalNode self, int start, int end, object interval, long index=-1):
         """
         Insert a new IntervalNode into the tree of which this node is
         currently the root. The return value is the new root of the tree (which
@@ -115,18 +153,20 @@ cdef class IntervalNode:
         if decision_endpoint > self.start:
             # insert to cright tree
             if self.cright is not EmptyNode:
-                self.cright = self.cright.insert( start, end, interval )
+                self.cright = self.cright.insert( start, end, interval, index )
             else:
                 self.cright = IntervalNode( start, end, interval )
+                self.cright.index = index
             # rebalance tree
             if self.priority < self.cright.priority:
                 croot = self.rotate_left()
         else:
             # insert to cleft tree
             if self.cleft is not EmptyNode:
-                self.cleft = self.cleft.insert( start, end, interval)
+                self.cleft = self.cleft.insert( start, end, interval, index )
             else:
                 self.cleft = IntervalNode( start, end, interval)
+                self.cleft.index = index
             # rebalance tree
             if self.priority < self.cleft.priority:
                 croot = self.rotate_right()
@@ -188,6 +228,41 @@ cdef class IntervalNode:
             self.cright._intersect( start, end, results )
     
 
+    cdef int _intersect_indexes( IntervalNode self, int start, int end, long query, LongVector *queries, LongVector *hits ) except -1:
+        # Same as _intersect, but saving the query and interval numbers
+        if self.cleft is not EmptyNode and self.cleft.maxend > start:
+            self.cleft._intersect_indexes( start, end, query, queries, hits )
+        if ( self.end > start ) and ( self.start < end ):
+            vector_push( queries, query )
+            vector_push( hits, self.index )
+        if self.cright is not EmptyNode and self.start < end:
+            self.cright._intersect_indexes( start, end, query, queries, hits )
+        return 0
+
+    cdef void _nearest_left(IntervalNode self, int position, Nearest *best, int max_dist):
+        # Same as _seek_left, but keeping only the best candidates
+        if self.maxend + max_dist < position:
+            return
+        if self.minstart > position:
+            return
+        if self.cright is not EmptyNode:
+            self.cright._nearest_left(position, best, max_dist)
+        if -1 < position - self.end < max_dist:
+            nearest_add(best, self.end, self.index)
+        if self.cleft is not EmptyNode:
+            self.cleft._nearest_left(position, best, max_dist)
+
+    cdef void _nearest_right(IntervalNode self, int position, Nearest *best, int max_dist):
+        # Same as _seek_right, but keeping only the best candidates
+        if self.maxend < position: return
+        if self.minstart - max_dist > position: return
+        if self.cleft is not EmptyNode:
+            self.cleft._nearest_right(position, best, max_dist)
+        if -1 < self.start - position < max_dist:
+            nearest_add(best, self.start, self.index)
+        if self.cright is not EmptyNode:
+            self.cright._nearest_right(position, best, max_dist)
+
     cdef void _seek_left(IntervalNode self, int position, list results, int n, int max_dist):
         # we know we can bail in these 2 cases.
         if self.maxend + max_dist < position:
@@ -379,20 +454,26 @@ cdef class IntervalTree:
     """
     
     cdef IntervalNode root
+    cdef long count
     
     def __cinit__( self ):
         root = None
+        self.count = 0
     
     # ---- Position based interfaces -----------------------------------------
     
     def insert( self, int start, int end, object value=None ):
         """
         Insert the interval [start,end) associated with value `value`.
+        Intervals are numbered in the order they are inserted, starting at
+        0, batch queries return these numbers.
         """
         if self.root is None:
             self.root = IntervalNode( start, end, value )
+            self.root.index = self.count
         else:
-            self.root = self.root.insert( start, end, value )
+            self.root = self.root.insert( start, end, value, self.count )
+        self.count += 1
         
     add = insert
 
@@ -423,6 +504,99 @@ cdef class IntervalTree:
             return []
         return self.root.right( position, num_intervals, max_dist )
 
+    # ---- Batch interfaces ---------------------------------------------------
+
+    def find_batch( self, starts, ends ):
+        """
+        Find the intervals overlapping each of [starts[i],ends[i]), returning
+        arrays ( query_index, hit_index ) with a pair for each overlap, where
+        hit_index is the number of the interval (in order of insertion).
+        Pairs are ordered by query and then as `find` orders intervals.
+        """
+        import numpy
+        cdef long[::1] query_starts = numpy.ascontiguousarray( starts, dtype=numpy.int_ )
+        cdef long[::1] query_ends = numpy.ascontiguousarray( ends, dtype=numpy.int_ )
+        if query_starts.shape[0] != query_ends.shape[0]:
+            raise ValueError( "starts and ends must be of the same length" )
+        cdef LongVector queries, hits
+        cdef long i
+        queries.data = hits.data = NULL
+        queries.size = queries.capacity = hits.size = hits.capacity = 0
+        try:
+            if self.root is not None:
+                for i in range( query_starts.shape[0] ):
+                    self.root._intersect_indexes( query_starts[i], query_ends[i], i, &queries, &hits )
+            return vector_to_array( &queries ), vector_to_array( &hits )
+        finally:
+            free( queries.data )
+            free( hits.data )
+
+    def nearest_batch( self, starts, ends, direction, num_intervals=1, max_dist=2500, strands=None ):
+        """
+        For each of the query intervals [starts[i],ends[i]) find up to
+        `num_intervals` intervals no further than `max_dist` away that are
+        completely "before", "after", "upstream" or "downstream" of it (see
+        `before_interval` etc.; `strands` gives the strand of each query,
+        as "+"/"-" or 1/-1, for upstream and downstream). Returns arrays
+        ( query_index, hit_index ) as for `find_batch`, with the intervals
+        for each query nearest first.
+        """
+        import numpy
+        if direction not in ( "before", "after", "upstream", "downstream" ):
+            raise ValueError( "Unknown direction: %s" % direction )
+        cdef long[::1] query_starts = numpy.ascontiguousarray( starts, dtype=numpy.int_ )
+        cdef long[::1] query_ends = numpy.ascontiguousarray( ends, dtype=numpy.int_ )
+        cdef long nqueries = query_starts.shape[0]
+        if query_ends.shape[0] != nqueries:
+            raise ValueError( "starts and ends must be of the same length" )
+        # Which queries look to the left (before) of the interval
+        if direction in ( "before", "after" ) or strands is None:
+            left = numpy.empty( nqueries, dtype=numpy.int8 )
+            left.fill( direction in ( "before", "upstream" ) )
+        else:
+            strands = numpy.asarray( strands )
+            if strands.dtype.kind in "SUO":
+                minus = strands == "-"
+            else:
+                minus = strands == -1
+            left = ( minus == ( direction == "downstream" ) ).astype( numpy.int8 )
+        cdef char[::1] query_left = left
+        cdef int n = num_intervals, dist = max_dist
+        cdef Nearest best
+        cdef LongVector queries, hits
+        cdef long i
+        cdef int j
+        if n <= 0:
+            return numpy.zeros( 0, dtype=numpy.int_ ), numpy.zeros( 0, dtype=numpy.int_ )
+        best.keys = <long *>malloc( n * sizeof( long ) )
+        best.indexes = <long *>malloc( n * sizeof( long ) )
+        best.capacity = n
+        queries.data = hits.data = NULL
+        queries.size = queries.capacity = hits.size = hits.capacity = 0
+        try:
+            if best.keys == NULL or best.indexes == NULL:
+                raise MemoryError()
+            if self.root is not None:
+                for i in range( nqueries ):
+                    best.count = 0
+                    if query_left[i]:
+                        best.descending = 1
+                        # use start - 1 because .left() assumes strictly left-of
+                        self.root._nearest_left( query_starts[i] - 1, &best, dist )
+                    else:
+                        best.descending = 0
+                        # use end + 1 because .right() assumes strictly right-of
+                        self.root._nearest_right( query_ends[i] + 1, &best, dist )
+                    for j in range( best.count ):
+                        vector_push( &queries, i )
+                        vector_push( &hits, best.indexes[j] )
+            return vector_to_array( &queries ), vector_to_array( &hits )
+        finally:
+            free( best.keys )
+            free( best.indexes )
+            free( queries.data )
+            free( hits.data )
+
     # ---- Interval-like object based interfaces -----------------------------
 
     def insert_interval( self, interval ):
@@ -1,4 +1,5 @@
 import sys, os
+import random
 import unittest
 try:
     sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
@@ -214,6 +215,61 @@ class IntervalTreeTest(unittest.TestCase):
         fn = lambda ival: self.assert_(ival.interval)
         self.iv.traverse(fn)
 
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(1)
+        iv = IntervalTree()
+        self.intervals = []
+        for i in range(2000):
+            start = random.randint(0, 100000)
+            end = start + random.randint(1, 500)
+            # The value holds the number of the interval
+            iv.insert(start, end, Interval(start, end, value=i))
+            self.intervals.append((start, end))
+        self.iv = iv
+        self.starts = [random.randint(0, 100000) for i in range(500)]
+        self.ends = [s + random.randint(0, 1000) for s in self.starts]
+        self.strands = [random.choice("+-") for s in self.starts]
+
+    def check(self, pairs, expected):
+        queries, hits = pairs
+        self.assertEqual(len(queries), len(hits))
+        found = [[] for e in expected]
+        for q, h in zip(queries, hits):
+            found[q].append(h)
+        self.assertEqual(found, expected)
+
+    def test_find_batch(self):
+        expected = [[f.value for f in self.iv.find(s, e)] for s, e in zip(self.starts, self.ends)]
+        self.check(self.iv.find_batch(self.starts, self.ends), expected)
+
+    def test_nearest_batch(self):
+        queries = [Interval(s, e, strand=strand) for s, e, strand in zip(self.starts, self.ends, self.strands)]
+        for n, max_dist in ((1, 2500), (3, 100), (10, 5000)):
+            for direction, fn in (("before", self.iv.before_interval), ("after", self.iv.after_interval),
+                                  ("upstream", self.iv.upstream_of_interval), ("downstream", self.iv.downstream_of_interval)):
+                expected = []
+                for q in queries:
+                    # left and right leave the intervals unsorted when
+                    # they find exactly n
+                    found = fn(q, num_intervals=n, max_dist=max_dist)
+                    if found and found[0].end <= q.start:
+                        found.sort(key=lambda f: -f.end)
+                    else:
+                        found.sort(key=lambda f: f.start)
+                    expected.append([f.value for f in found])
+                found = self.iv.nearest_batch(self.starts, self.ends, direction, num_intervals=n,
+                                              max_dist=max_dist, strands=self.strands)
+                self.check(found, expected)
+
+    def test_empty(self):
+        iv = IntervalTree()
+        for queries, hits in (iv.find_batch([1, 2], [10, 20]), iv.nearest_batch([1], [10], "after")):
+            self.assertEqual(len(queries), 0)
+            self.assertEqual(len(hits), 0)
+        self.assertRaises(ValueError, iv.nearest_batch, [1], [10], "sideways")
+
 if __name__ == "__main__":
 
     unittest.main()
@@ -72,6 +72,43 @@ class GenomicInterval( TableRow ):
             self.fields[self.chrom_col] = str( value )
         elif name == "start":
             self.fields[self.start_col] = str( value )
+        elif name == "end":
+            self.fields[self.end_col] = str( value )
+        elif name == "strand":
+            if self.strand_col < self.nfields and self.strand_col >= 0:
+                self.fields[self.strand_col] = str( value )
+        object.__setattr__( self, name, value )
+    def __str__( self ):
+        return "\t".join( self.fields )
+    def copy( self ):
+        return GenomicInterval(self.reader, list( self.fields ), self.chrom_col, self.start_col, self.end_col, self.strand_col, self.strand)
+
+class GenomicIntervalReader( TableReader ):
+    """
+    Reader for iterating a set of intervals in a tab separated file. Can
+    also parse header and comment lines if requested.
+
+    >>> from bx.tabular.io import Comment, Header
+    >>> r = GenomicIntervalReader( [ "#chrom\\tname\\tstart\\tend\\textra",
+    ...               "chr1\\tfoo\\t1\\t100\\txxx",
+    ...               "chr2\\tbar\\t20\\t300\\txxx",
+    ...               "#I am a comment",
+    ...               "chr2\\tbar\\t20\\t300\\txxx" ], start_col=2, end_col=3 )
+    >>> header = r.next()
+    >>> elements = list( r )
+    >>> elements.insert( 0, header )
+    >>> assert type( elements[0] ) is Header
+    >>> str( elements[0] )
+    '#chrom\\tname\\tstart\\tend\\textra'
+    >>> assert type( elements[1] ) is GenomicInterval
+    >>> print elements[1].start, elements[1].end
+    1 100
+    >>> str( elements[1] )
+    'chr1\\tfoo\\t1\\t100\\txxx'
+    >>> elements[1].start = 30
+    >>> print elements[1].start, elements[1].end
+    30 100
+    >>> str( elements[1] )
     'chr1\\tfoo\\t30\\t100\\txxx'
     >>> assert type( elements[2] ) is GenomicInterval
     >>> assert type( elements[3] ) is Comment
@@ -105,6 +142,63 @@ class GenomicInterval( TableRow ):
                         size = lens.get( chrom, MAX )
                         try:
                             bbs = BinnedBitSet( size )
+                        except ValueError, e:
+                            # We will only reach here when constructing this bitset from the lens dict
+                            # since the value of MAX is always safe.
+                            raise Exception( "Invalid chrom length %s in 'lens' dictionary. %s" % ( str( size ), str( e ) ) )
+                        bitsets[chrom] = bbs
+                    last_chrom = chrom
+                    last_bitset = bitsets[chrom]
+                start = max( int( interval[self.start_col] ), 0 )
+                end = min( int( interval[self.end_col] ), last_bitset.size)
+                last_bitset.set_range( start, end-start )
+        return bitsets
+
+class NiceReaderWrapper( GenomicIntervalReader ):
+    """
+    >>> from bx.tabular.io import Comment, Header
+    >>> r = NiceReaderWrapper( [ "#chrom\\tname\\tstart\\tend\\textra",
+    ...                          "chr1\\tfoo\\t1\\t100\\txxx",
+    ...                          "chr2\\tbar\\t20\\t300\\txxx",
+    ...                          "#I am a comment",
+    ...                          "chr2\\tbar\\t20\\t300\\txxx" ], start_col=2, end_col=3 )
+    >>> assert type(r.next()) == Header
+    >>> assert type(r.next()) == GenomicInterval
+    >>> assert type(r.next()) == GenomicInterval
+    >>> assert type(r.next()) == Comment
+    >>> assert type(r.next()) == GenomicInterval
+    """
+    def __init__( self, reader, **kwargs ):
+        GenomicIntervalReader.__init__( self, reader, **kwargs )
+        self.outstream = kwargs.get("outstream", None)
+        self.print_delegate = kwargs.get("print_delegate", None)
+        self.input_wrapper = iter( self.input )
+        self.input_iter = self.iterwrapper()
+        self.skipped = 0
+        self.skipped_lines = []
+    def __iter__( self ):
+        return self
+    def next( self ):
+        while 1:
+            try:
+                nextitem = GenomicIntervalReader.next( self )
+                return nextitem
+            except ParseError, e:
+                if self.outstream:
+                    if self.print_delegate and hasattr(self.print_delegate,"__call__"):
+                        self.print_delegate( self.outstream, e, self )
+                self.skipped += 1
+                # no reason to stuff an entire bad file into memmory
+                if self.skipped < 10:
+                    self.skipped_lines.append( ( self.linenum, self.current_line, str( e ) ) )
+    def iterwrapper( self ):
+        while 1:
+            self.current_line = self.input_wrapper.next()
+            yield self.current_line
+
+class BitsetSafeReaderWrapper( NiceReaderWrapper ):
+    def __init__( self, reader, lens={} ):
+        # This class handles any needed conversions for the bitset to work
         # It is assumed that the reader is an interval reader, i.e. it has chr_col, start_col, end_col and strand_col attributes. 
         NiceReaderWrapper.__init__( self, reader.input, chrom_col=reader.chrom_col, start_col=reader.start_col, end_col=reader.end_col, strand_col=reader.strand_col)
         self.lens = lens
@@ -118,3 +212,7 @@ class GenomicInterval( TableRow ):
                     # no reason to stuff an entire bad file into memmory
                     if self.skipped < 10:
                         self.skipped_lines.append( ( self.linenum, self.current_line, str( e ) ) )
+                except:
+                    pass
+            else:
+                return rval
@@ -0,0 +1,36 @@
+# Growable arrays of longs, for collecting the results of batch queries
+# (included by intersection.pyx and cluster.pyx). The owner frees `data`.
+
+cdef extern from "stdlib.h":
+    void *realloc(void *, size_t)
+
+cdef extern from "string.h":
+    void *memcpy(void *, void *, size_t)
+
+cdef struct LongVector:
+    long *data
+    size_t size
+    size_t capacity
+
+cdef int vector_push(LongVector *v, long x) except -1:
+    cdef long *data
+    if v.size == v.capacity:
+        if v.capacity == 0:
+            v.capacity = 1024
+        else:
+            v.capacity = v.capacity * 2
+        data = <long *>realloc(v.data, v.capacity * sizeof(long))
+        if data == NULL:
+            raise MemoryError()
+        v.data = data
+    v.data[v.size] = x
+    v.size += 1
+    return 0
+
+cdef object vector_to_array(LongVector *v, size_t start=0):
+    import numpy
+    rval = numpy.empty(v.size - start, dtype=numpy.int_)
+    cdef long[::1] view = rval
+    if v.size > start:
+        memcpy(&view[0], v.data + start, (v.size - start) * sizeof(long))
+    return rval
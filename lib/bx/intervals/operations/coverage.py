@@ -10,8 +10,17 @@ from warnings import warn
 
 from bx.intervals.io import *
 from bx.intervals.operations import *
+from bx.intervals.operations.sweep import overlapping, union_spans, spans_size
 
-def coverage(readers, comments=True):
+def coverage(readers, comments=True, presorted=False):
+    """
+    `presorted` requires every reader to be sorted by chrom and start (see
+    `bx.intervals.operations.sweep`).
+    """
+    if presorted:
+        for interval in coverage_presorted( readers, comments ):
+            yield interval
+        return
     # The incoming lens dictionary is a dictionary of chromosome lengths which are used to initialize the bitsets.
     primary = readers[0]
     intersect = readers[1:]
@@ -70,3 +79,24 @@ def coverage(readers, comments=True):
             interval.fields.append(str(bases_covered))
             interval.fields.append(str(percent))
             yield interval
+
+def coverage_presorted(readers, comments=True):
+    primary = readers[0]
+    intersect = list( readers[1:] )
+    intersect[0] = BitsetSafeReaderWrapper( intersect[0], lens={} )
+    for interval, overlaps in overlapping( primary, intersect ):
+        if isinstance(interval, Header):
+            yield interval
+        if isinstance(interval, Comment) and comments:
+            yield interval
+        elif isinstance(interval, GenomicInterval):
+            start = int(interval.start)
+            end = int(interval.end)
+            bases_covered = spans_size( union_spans( sum( overlaps, [] ), start, end ) )
+            if (end - start) == 0:
+                percent = 0
+            else:
+                percent = float(bases_covered) / float(end - start)
+            interval.fields.append(str(bases_covered))
+            interval.fields.append(str(percent))
+            yield interval
@@ -8,6 +8,10 @@ list of linenumbers from the original file).  The original can then be
 ran through with the linenumbers to extract clustered regions without
 disturbing original order, or the clusters may themselves be written
 as intervals.
+
+For input sorted by chrom and start `find_clusters_sorted` yields each
+cluster as soon as it is finished instead of building a tree for each
+chromosome, so memory does not grow with the size of the input.
 """
 
 import random
@@ -47,6 +51,54 @@ def find_clusters(reader, mincols=1, minregions=2):
     return chroms, extra
 
 
+def find_clusters_sorted(reader, mincols=1, minregions=2, extra=None):
+    """
+    Yield ( chrom, start, end, linenums ) for each cluster of the intervals
+    of `reader`, which must be sorted by chrom and start, in input order.
+    linenums is an array of the line numbers of the intervals in the
+    cluster. Lines that are not intervals are saved in the dict `extra` by
+    line number if given.
+    """
+    clusterer = None
+    chrom = None
+    seen = set()
+    linenum = -1
+    for interval in reader:
+        linenum += 1
+        if not isinstance(interval, GenomicInterval):
+            if extra is not None:
+                extra[linenum] = interval
+            continue
+        if interval.chrom != chrom:
+            if clusterer is not None:
+                clusterer.finish()
+                for start, end, lines in clusterer.pop_regions():
+                    yield chrom, start, end, lines
+            if interval.chrom in seen:
+                raise ValueError( "Input is not sorted, %s found again on line %d" % ( interval.chrom, linenum + 1 ) )
+            chrom = interval.chrom
+            seen.add( chrom )
+            clusterer = SortedClusterer( mincols, minregions )
+        try:
+            clusterer.insert( interval.start, interval.end, linenum )
+        except OverflowError, e:
+            try:
+                # This will work only if reader is a NiceReaderWrapper
+                reader.skipped += 1
+                if reader.skipped < 10:
+                    reader.skipped_lines.append( ( reader.linenum, reader.current_line, str( e ) ) )
+            except:
+                pass
+            continue
+        if clusterer.pending:
+            for start, end, lines in clusterer.pop_regions():
+                yield chrom, start, end, lines
+    if clusterer is not None:
+        clusterer.finish()
+        for start, end, lines in clusterer.pop_regions():
+            yield chrom, start, end, lines
+
+
 ### DEPRECATED: Use the ClusterTree in bx.intervals.cluster for this.
 ### It does the same thing, but is a C implementation.
 class ClusterNode( object ):
@@ -11,8 +11,20 @@ from warnings import warn
 
 from bx.intervals.io import *
 from bx.intervals.operations import *
+from bx.intervals.operations.sweep import overlapping, union_spans, intersect_spans, spans_size
 
-def intersect(readers, mincols=1, upstream_pad=0, downstream_pad=0, pieces=True, lens={}, comments=True):
+def intersect(readers, mincols=1, upstream_pad=0, downstream_pad=0, pieces=True, lens={}, comments=True, presorted=False):
+    """
+    If `presorted` all of `readers` must be sorted by chrom and start, they
+    are then swept together (see `bx.intervals.operations.sweep`). Padding
+    is not supported with `presorted` and raises ValueError.
+    """
+    if presorted:
+        if upstream_pad or downstream_pad:
+            raise ValueError( "Padding is not supported with presorted=True" )
+        for interval in intersect_presorted( readers, mincols, pieces, lens, comments ):
+            yield interval
+        return
     # The incoming lens dictionary is a dictionary of chromosome lengths which are used to initialize the bitsets.
     # Read all but first into bitsets and intersect to one
     primary = readers[0]
@@ -75,3 +87,30 @@ def intersect(readers, mincols=1, upstream_pad=0, downstream_pad=0, pieces=True,
                 except:
                     pass
                 continue
+
+def intersect_presorted(readers, mincols=1, pieces=True, lens={}, comments=True):
+    primary = readers[0]
+    intersect = list( readers[1:] )
+    intersect[0] = BitsetSafeReaderWrapper( intersect[0], lens=lens )
+    for interval, overlaps in overlapping( primary, intersect ):
+        if isinstance(interval, Header):
+            yield interval
+        if isinstance(interval, Comment) and comments:
+            yield interval
+        elif isinstance(interval, GenomicInterval):
+            start = int( interval.start )
+            end = int( interval.end )
+            # Bases covered by all of the other sets
+            spans = union_spans( overlaps[0], start, end )
+            for other in overlaps[1:]:
+                spans = intersect_spans( spans, union_spans( other, start, end ) )
+            if spans_size( spans ) >= mincols:
+                if pieces:
+                    out_intervals = spans
+                else:
+                    out_intervals = [ ( start, end ) ]
+                for start, end in out_intervals:
+                    new_interval = interval.copy()
+                    new_interval.start = start
+                    new_interval.end = end
+                    yield new_interval
@@ -3,11 +3,17 @@ Join two sets of intervals using their overlap as the key.  The
 intervals MUST be sorted by chrom(lexicographically),
 start(arithmetically) and end(arithmetically).  This works by simply
 walking through the inputs in O(n) time.
+
+By default the second set is read into memory, with `presorted=True` both
+sets are read together in a single pass (see
+`bx.intervals.operations.sweep`) and unmatched intervals of the second set
+are output as soon as no later interval of the first set can overlap them.
 """
 
 import psyco_full
 
 import math
+import numpy
 import traceback
 import fileinput
 from warnings import warn
@@ -17,22 +23,26 @@ from types import ListType
 
 from bx.intervals.io import *
 from bx.intervals.operations import *
-from quicksect import IntervalTree
+from bx.intervals.genome_index import GenomeIntervalIndex
+from bx.intervals.operations.sweep import overlapping, SortedIntervalStream
 
 
-def join(leftSet, rightSet, mincols=1, leftfill=True, rightfill=True, asfraction=False, matchStrand=STRAND_NEUTRAL, outColumns=[-1,-1]):
+def join(leftSet, rightSet, mincols=1, leftfill=True, rightfill=True, asfraction=False, matchStrand=STRAND_NEUTRAL, outColumns=[-1,-1], presorted=False):
+    if presorted:
+        for row in join_presorted( leftSet, rightSet, mincols, leftfill, rightfill, asfraction, matchStrand, outColumns ):
+            yield row
+        return
     # Read rightSet into memory:
     rightlen = 0
     leftlen = 0
     rightStrandCol = -1
     minoverlap = mincols
-    rightTree = IntervalTree()
-    
-    for item in rightSet:
-        if isinstance(item, GenomicInterval):
-            rightTree.insert( item, rightSet.linenum, item.fields )
-            if rightlen == 0: rightlen = item.nfields
-            if rightStrandCol == -1: rightStrandCol = item.strand_col
+    rightIntervals = [ item for item in rightSet if isinstance(item, GenomicInterval) ]
+    if rightIntervals:
+        rightlen = rightIntervals[0].nfields
+        rightStrandCol = rightIntervals[0].strand_col
+    rightIndex = GenomeIntervalIndex.from_intervals( rightIntervals )
+    visited = numpy.zeros( len( rightIntervals ), dtype=bool )
 
     for interval in leftSet:
         if leftlen == 0 and isinstance(interval, GenomicInterval):
@@ -40,11 +50,11 @@ def join(leftSet, rightSet, mincols=1, leftfill=True, rightfill=True, asfraction
         if not isinstance(interval, GenomicInterval):
             yield interval
         else:
-            result = []
-            rightTree.intersect( interval, lambda node: result.append( node ) )
+            hits = rightIndex.find_indices( interval.chrom, interval.start, interval.end )
+            result = rightIndex.lookup( hits )
             overlap_not_met = 0
             leftbases = interval.end - interval.start
-            for item in result:
+            for hit, item in zip( hits, result ):
                 rightbases = item.end - item.start
                 if (asfraction==True):
                     if rightbases < leftbases:
@@ -63,35 +73,86 @@ def join(leftSet, rightSet, mincols=1, leftfill=True, rightfill=True, asfraction
                 if overlap < mincols:
                     overlap_not_met += 1
                     continue
-                else:
-                    #check strand
-                    strandMatched = STRAND_INTEGER_VALUES[interval.strand] * STRAND_INTEGER_VALUES[item.other[rightStrandCol]]
-                    if (strandMatched == -1 and matchStrand > 0):
-                        #needed match but found a complement
-                        overlap_not_met += 1
-                        continue
-                    if (strandMatched == 1 and matchStrand < 0):
-                        #needed complement but found a match
-                        overlap_not_met += 1
-                        continue
-                    if (strandMatched == 0 and (matchStrand < -1 or matchStrand > 1)):
-                        #strict criteria but only permissive match found
-                        overlap_not_met += 1
-                        continue
+                elif not strands_compatible( interval.strand, item.fields[rightStrandCol], matchStrand ):
+                    overlap_not_met += 1
+                    continue
                 #strand criteria met
-                setattr( item, "visited", True )
-                yield(getSelectedColumns( interval.fields, item.other, outColumns ))
+                visited[hit] = True
+                yield(getSelectedColumns( interval.fields, item.fields, outColumns ))
             if (len(result) == 0 or overlap_not_met == len(result)) and rightfill:
                 yield(getSelectedColumns( interval.fields, rightlen, outColumns ))
     if leftfill:
-        def report_unvisited( node, results ):
-            if not hasattr(node, "visited"):
-                results.append( node )
-        results = []
-        rightTree.traverse( lambda x: report_unvisited( x, results ) )
-        for item in results:
-            yield(getSelectedColumns( leftlen, item.other, outColumns))
+        for hit in rightIndex.ordered_indices():
+            if not visited[hit]:
+                yield(getSelectedColumns( leftlen, rightIntervals[hit].fields, outColumns))
+
 
+def join_presorted(leftSet, rightSet, mincols=1, leftfill=True, rightfill=True, asfraction=False, matchStrand=STRAND_NEUTRAL, outColumns=[-1,-1]):
+    leftlen = 0
+    minoverlap = mincols
+    # Right intervals that have been joined, and ones no longer needed
+    visited = set()
+    unvisited = []
+    def on_drop( item ):
+        if id( item ) in visited:
+            visited.remove( id( item ) )
+        elif leftfill:
+            unvisited.append( item )
+    right = SortedIntervalStream( rightSet, on_drop )
+    rightlen = 0
+    if right.first is not None:
+        rightlen = right.first.nfields
+
+    for interval, overlaps in overlapping( leftSet, [ right ] ):
+        if leftlen == 0 and isinstance(interval, GenomicInterval):
+            leftlen = interval.nfields
+        # Unmatched right intervals are filled once the number of left
+        # columns is known
+        if leftlen:
+            for item in unvisited:
+                yield(getSelectedColumns( leftlen, item.fields, outColumns))
+            del unvisited[:]
+        if not isinstance(interval, GenomicInterval):
+            yield interval
+            continue
+        result = overlaps[0]
+        overlap_not_met = 0
+        leftbases = interval.end - interval.start
+        for item in result:
+            rightbases = item.end - item.start
+            if (asfraction==True):
+                if rightbases < leftbases:
+                    mincols = rightbases
+                else:
+                    mincols = leftbases
+                mincols = math.floor(mincols * minoverlap)
+            overlap = min( interval.end, item.end ) - max( interval.start, item.start )
+            if overlap < mincols or not strands_compatible( interval.strand, item.fields[item.strand_col], matchStrand ):
+                overlap_not_met += 1
+                continue
+            visited.add( id( item ) )
+            yield(getSelectedColumns( interval.fields, item.fields, outColumns ))
+        if (len(result) == 0 or overlap_not_met == len(result)) and rightfill:
+            yield(getSelectedColumns( interval.fields, rightlen, outColumns ))
+    for item in unvisited:
+        yield(getSelectedColumns( leftlen, item.fields, outColumns))
+
+def strands_compatible( strand1, strand2, matchStrand ):
+    """
+    Check the strands of two intervals against the STRAND_* criteria
+    `matchStrand`
+    """
+    strandMatched = STRAND_INTEGER_VALUES[strand1] * STRAND_INTEGER_VALUES[strand2]
+    if (strandMatched == -1 and matchStrand > 0):
+        #needed match but found a complement
+        return False
+    if (strandMatched == 1 and matchStrand < 0):
+        #needed complement but found a match
+        return False
+    if (strandMatched == 0 and (matchStrand < -1 or matchStrand > 1)):
+        #strict criteria but only permissive match found
+        return False
+    return True
 
 def getSelectedColumns( left, right, fields=[-1,-1] ):
     #left is a list or the length of the missing list
@@ -10,9 +10,19 @@ from warnings import warn
 
 from bx.intervals.io import *
 from bx.intervals.operations import *
+from bx.intervals.operations.sweep import merged_spans
 
 # sorting could make this a less memory intensive operation(?)
-def merge( interval, mincols=1 ):
+def merge( interval, mincols=1, presorted=False ):
+    """
+    With `presorted` the intervals must be sorted by chrom and start (see
+    `bx.intervals.operations.sweep`), runs of overlapping intervals are
+    then output in that order.
+    """
+    if presorted:
+        for output in merge_presorted( interval ):
+            yield output
+        return
     # Handle any ValueError, IndexError and OverflowError exceptions that may be thrown when
     # the bitsets are being created by skipping the problem lines
     interval = BitsetSafeReaderWrapper( interval, lens={} )
@@ -38,3 +48,18 @@ def merge( interval, mincols=1 ):
             except:
                 pass
             continue
+
+def merge_presorted( interval ):
+    interval = BitsetSafeReaderWrapper( interval, lens={} )
+    output = ["."] * (max(interval.chrom_col, interval.start_col, interval.end_col) + 1)
+    header_done = False
+    for chrom, start, end in merged_spans( interval ):
+        if interval.header and not header_done:
+            yield interval.header
+            header_done = True
+        output[interval.chrom_col] = chrom
+        output[interval.start_col] = str(start)
+        output[interval.end_col] = str(end)
+        yield output
+    if interval.header and not header_done:
+        yield interval.header
@@ -23,7 +23,7 @@ from cStringIO import StringIO
 
 from bx.intervals.io import *
 from bx.intervals.operations import *
-from quicksect import IntervalTree
+from bx.intervals.genome_index import GenomeIntervalIndex
 
 
 def getpairs(leftSet, rightSet, leftCol, mincols=1, asfraction=False, matchStrand=STRAND_NEUTRAL, skipChrNames=True, skipStrandNames=True):
@@ -32,13 +32,12 @@ def getpairs(leftSet, rightSet, leftCol, mincols=1, asfraction=False, matchStran
     rightlen = 0
     leftStrandCol = -1
     minoverlap = mincols
-    leftTree = IntervalTree()
     rightCols = list()
-    for item in leftSet:
-        if type( item ) is GenomicInterval:
-            leftTree.insert( item, leftSet.linenum, item.fields )
-            if leftlen == 0: leftlen = item.nfields
-            if leftStrandCol == -1: leftStrandCol = item.strand_col
+    leftIntervals = [ item for item in leftSet if type( item ) is GenomicInterval ]
+    if leftIntervals:
+        leftlen = leftIntervals[0].nfields
+        leftStrandCol = leftIntervals[0].strand_col
+    leftIndex = GenomeIntervalIndex.from_intervals( leftIntervals )
 
     for interval in rightSet:
         if rightlen == 0 and type( interval ) is GenomicInterval:
@@ -54,8 +53,7 @@ def getpairs(leftSet, rightSet, leftCol, mincols=1, asfraction=False, matchStran
         if not (type( interval ) is GenomicInterval):
             yield interval
         else:
-            result = []
-            leftTree.intersect( interval, lambda node: result.append( node ) )
+            result = leftIndex.find( interval.chrom, interval.start, interval.end )
             overlap_not_met = 0
             rightbases = interval.end - interval.start
             for item in result:
@@ -80,7 +78,7 @@ def getpairs(leftSet, rightSet, leftCol, mincols=1, asfraction=False, matchStran
                     continue
                 else:
                     #check strand
-                    strandMatched = STRAND_INTEGER_VALUES[interval.strand] * STRAND_INTEGER_VALUES[item.other[leftStrandCol]]
+                    strandMatched = STRAND_INTEGER_VALUES[interval.strand] * STRAND_INTEGER_VALUES[item.fields[leftStrandCol]]
                     if (strandMatched == -1 and matchStrand > 0):
                         #needed match but found a complement
                         overlap_not_met += 1
@@ -94,8 +92,7 @@ def getpairs(leftSet, rightSet, leftCol, mincols=1, asfraction=False, matchStran
                         overlap_not_met += 1
                         continue
                 #strand criteria met
-                setattr( item, "visited", True )
-                leftTerm = item.other[leftCol]
+                leftTerm = item.fields[leftCol]
                 for col in rightCols:
                     #take each field that's not a number
                     #split it on semicolons, commas, and spaces
@@ -12,8 +12,20 @@ from warnings import warn
 
 from bx.intervals.io import *
 from bx.intervals.operations import *
+from bx.intervals.operations.sweep import overlapping, union_spans, complement_spans, spans_size
 
-def subtract(readers, mincols=1, upstream_pad=0, downstream_pad=0, pieces=True, lens={}, comments=True):
+def subtract(readers, mincols=1, upstream_pad=0, downstream_pad=0, pieces=True, lens={}, comments=True, presorted=False):
+    """
+    If `presorted` the first reader and those subtracted from it must all
+    be sorted by chrom and start (see `bx.intervals.operations.sweep`).
+    Padding cannot be combined with `presorted` (ValueError).
+    """
+    if presorted:
+        if upstream_pad or downstream_pad:
+            raise ValueError( "Padding is not supported with presorted=True" )
+        for interval in subtract_presorted( readers, mincols, pieces, lens, comments ):
+            yield interval
+        return
     # The incoming lens dictionary is a dictionary of chromosome lengths which are used to initialize the bitsets.
     # Read all but first into bitsets and union to one (if confused, read DeMorgan's...)
     primary = readers[0]
@@ -70,3 +82,29 @@ def subtract(readers, mincols=1, upstream_pad=0, downstream_pad=0, pieces=True,
                     except:
                         pass
                     continue
+
+def subtract_presorted(readers, mincols=1, pieces=True, lens={}, comments=True):
+    primary = readers[0]
+    union = list( readers[1:] )
+    union[0] = BitsetSafeReaderWrapper( union[0], lens=lens )
+    for interval, overlaps in overlapping( primary, union ):
+        if isinstance(interval, Header):
+            yield interval
+        if isinstance(interval, Comment) and comments:
+            yield interval
+        elif isinstance(interval, GenomicInterval):
+            start = int(interval.start)
+            end = int(interval.end)
+            # Bases covered by any of the other sets
+            spans = union_spans( sum( overlaps, [] ), start, end )
+            out_intervals = []
+            if spans_size( spans ) >= mincols:
+                if pieces:
+                    out_intervals = complement_spans( spans, start, end )
+            else:
+                out_intervals = [ ( start, end ) ]
+            for start, end in out_intervals:
+                new_interval = interval.copy()
+                new_interval.start = start
+                new_interval.end = end
+                yield new_interval
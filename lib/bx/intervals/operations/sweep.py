@@ -0,0 +1,201 @@
+"""
+Sort-merge sweep over interval streams. All inputs must be sorted by chrom
+(lexicographically) and start (arithmetically), they are then read
+together in one pass keeping only the intervals that can still overlap
+the current position in memory, rather than building bitsets or trees
+for the whole genome.
+
+Items without a `chrom` attribute (headers and comments) are skipped in
+the secondary inputs and passed through from the primary input.
+
+The interval operations (intersect, subtract, coverage, merge and join)
+use this with `presorted=True`, in place of the bitsets or in memory index
+built for all but the first input, so memory use depends on how many
+intervals overlap at once rather than on the size of the inputs.
+"""
+
+class UnsortedInputError( ValueError ):
+    pass
+
+def is_interval( item ):
+    return getattr( item, "chrom", None ) is not None
+
+class Span( object ):
+    """
+    A minimal interval, `data` can hold anything associated with it (e.g.
+    the line it was read from)
+    """
+    __slots__ = [ "chrom", "start", "end", "data" ]
+    def __init__( self, chrom, start, end, data=None ):
+        self.chrom = chrom
+        self.start = start
+        self.end = end
+        self.data = data
+
+def spans_from_bed( f ):
+    """
+    Read the intervals of a BED file as `Span` objects holding the line,
+    skipping comment, track and blank lines.
+    """
+    for line in f:
+        if line.startswith( "#" ) or line.startswith( "track" ) or line.isspace():
+            continue
+        fields = line.split()
+        yield Span( fields[0], int( fields[1] ), int( fields[2] ), line )
+
+class SortedIntervalStream( object ):
+    """
+    Reads the intervals of a sorted input on demand. `overlapping` must be
+    called with query intervals sorted the same way. Each interval read is
+    passed to `on_drop` once no later query can overlap it.
+    """
+    def __init__( self, intervals, on_drop=None ):
+        self.intervals = iter( intervals )
+        self.on_drop = on_drop
+        self.active = []
+        self.pending = None
+        self.last = None
+        self.first = None
+        self.done = False
+        self.read_next()
+    def read_next( self ):
+        self.pending = None
+        for item in self.intervals:
+            if not is_interval( item ):
+                continue
+            key = ( item.chrom, int( item.start ) )
+            if self.last is not None and key < self.last:
+                raise UnsortedInputError( "Input is not sorted: %s:%d after %s:%d" % ( key + self.last ) )
+            self.last = key
+            if self.first is None:
+                self.first = item
+            self.pending = item
+            return
+        self.done = True
+    def drop( self, items ):
+        if self.on_drop is not None:
+            for item in items:
+                self.on_drop( item )
+    def overlapping( self, chrom, start, end ):
+        """Return the intervals overlapping chrom:[start,end)"""
+        # Read everything starting before the end of the query
+        while not self.done:
+            item = self.pending
+            if item.chrom > chrom or ( item.chrom == chrom and int( item.start ) >= end ):
+                break
+            if item.chrom < chrom:
+                self.drop( [ item ] )
+            else:
+                self.active.append( item )
+            self.read_next()
+        # Forget intervals ending before the query, later queries start
+        # at or after this one
+        keep = []
+        dropped = []
+        for item in self.active:
+            if item.chrom == chrom and int( item.end ) > start:
+                keep.append( item )
+            else:
+                dropped.append( item )
+        self.active = keep
+        self.drop( dropped )
+        return [ item for item in keep if int( item.start ) < end ]
+    def finish( self ):
+        """Drop all remaining intervals"""
+        self.drop( self.active )
+        self.active = []
+        while not self.done:
+            self.drop( [ self.pending ] )
+            self.read_next()
+
+def overlapping( primary, others ):
+    """
+    Yield ( item, overlaps ) for each item of `primary`, where overlaps
+    is a list with, for each of the `others` (iterables of intervals or
+    `SortedIntervalStream` objects), the list of its intervals overlapping
+    item (None for items that are not intervals).
+    """
+    streams = []
+    for other in others:
+        if not isinstance( other, SortedIntervalStream ):
+            other = SortedIntervalStream( other )
+        streams.append( other )
+    last = None
+    for item in primary:
+        if not is_interval( item ):
+            yield item, None
+            continue
+        chrom, start, end = item.chrom, int( item.start ), int( item.end )
+        if last is not None and ( chrom, start ) < last:
+            raise UnsortedInputError( "Input is not sorted: %s:%d after %s:%d" % ( ( chrom, start ) + last ) )
+        last = ( chrom, start )
+        yield item, [ stream.overlapping( chrom, start, end ) for stream in streams ]
+    for stream in streams:
+        stream.finish()
+
+def union_spans( intervals, start, end ):
+    """
+    Sorted list of ( start, end ) spans covered by `intervals` within
+    [start,end)
+    """
+    spans = []
+    for s, e in sorted( ( max( int( i.start ), start ), min( int( i.end ), end ) ) for i in intervals ):
+        if s >= e:
+            continue
+        if spans and s <= spans[-1][1]:
+            if e > spans[-1][1]:
+                spans[-1] = ( spans[-1][0], e )
+        else:
+            spans.append( ( s, e ) )
+    return spans
+
+def intersect_spans( a, b ):
+    """Spans covered by both of the sorted span lists `a` and `b`"""
+    rval = []
+    i = j = 0
+    while i < len( a ) and j < len( b ):
+        s = max( a[i][0], b[j][0] )
+        e = min( a[i][1], b[j][1] )
+        if s < e:
+            rval.append( ( s, e ) )
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return rval
+
+def complement_spans( spans, start, end ):
+    """Spans in [start,end) not covered by the sorted list `spans`"""
+    rval = []
+    for s, e in spans:
+        if s > start:
+            rval.append( ( start, s ) )
+        start = max( start, e )
+    if start < end:
+        rval.append( ( start, end ) )
+    return rval
+
+def spans_size( spans ):
+    return sum( e - s for s, e in spans )
+
+def merged_spans( intervals ):
+    """
+    Yield ( chrom, start, end ) for each run of overlapping or adjacent
+    intervals of a sorted input
+    """
+    stream = SortedIntervalStream( intervals )
+    chrom = None
+    while not stream.done:
+        item = stream.pending
+        stream.read_next()
+        s, e = int( item.start ), int( item.end )
+        if s >= e:
+            continue
+        if item.chrom == chrom and s <= end:
+            end = max( end, e )
+        else:
+            if chrom is not None:
+                yield chrom, start, end
+            chrom, start, end = item.chrom, s, e
+    if chrom is not None:
+        yield chrom, start, end
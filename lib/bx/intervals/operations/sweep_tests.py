@@ -0,0 +1,92 @@
+"""
+Tests for `bx.intervals.operations.sweep` and the presorted modes of the
+interval operations, which should give the same results as the bitset and
+tree based ones.
+"""
+
+import random
+
+from bx.intervals.io import GenomicIntervalReader
+from bx.intervals.operations.sweep import *
+from bx.intervals.operations.intersect import intersect
+from bx.intervals.operations.subtract import subtract
+from bx.intervals.operations.coverage import coverage
+from bx.intervals.operations.merge import merge
+from bx.intervals.operations.join import join
+
+def random_lines( n, chroms=( "chr1", "chr2", "chr3" ), size=5000 ):
+    lines = []
+    for i in range( n ):
+        chrom = random.choice( chroms )
+        start = random.randint( 0, size )
+        end = start + random.randint( 1, 200 )
+        lines.append( ( chrom, start, end, "name%d" % i, "0", random.choice( "+-" ) ) )
+    lines.sort()
+    return [ "\t".join( map( str, fields ) ) for fields in lines ]
+
+def reader( lines ):
+    return GenomicIntervalReader( lines )
+
+def as_strings( rows ):
+    return [ str( row ) if not isinstance( row, list ) else "\t".join( row ) for row in rows ]
+
+def test_operations():
+    for i in range( 5 ):
+        a, b, c = random_lines( 300 ), random_lines( 200 ), random_lines( 100, chroms=( "chr1", "chr4" ) )
+        for pieces in ( True, False ):
+            for mincols in ( 1, 10 ):
+                expected = as_strings( intersect( [ reader( a ), reader( b ) ], mincols=mincols, pieces=pieces ) )
+                assert as_strings( intersect( [ reader( a ), reader( b ) ], mincols=mincols, pieces=pieces, presorted=True ) ) == expected
+                expected = as_strings( subtract( [ reader( a ), reader( b ), reader( c ) ], mincols=mincols, pieces=pieces ) )
+                assert as_strings( subtract( [ reader( a ), reader( b ), reader( c ) ], mincols=mincols, pieces=pieces, presorted=True ) ) == expected
+        expected = as_strings( coverage( [ reader( a ), reader( b ) ] ) )
+        assert as_strings( coverage( [ reader( a ), reader( b ) ], presorted=True ) ) == expected
+        expected = sorted( as_strings( merge( reader( a ) ) ) )
+        assert sorted( as_strings( merge( reader( a ), presorted=True ) ) ) == expected
+        for mincols in ( 1, 50 ):
+            expected = sorted( as_strings( join( reader( a ), reader( c ), mincols=mincols ) ) )
+            assert sorted( as_strings( join( reader( a ), reader( c ), mincols=mincols, presorted=True ) ) ) == expected
+
+def test_join_right_before_left():
+    # Right intervals dropped before the first left interval is read are
+    # filled with as many columns as the left intervals have
+    a = [ "chr1\t100\t200\tl1\t0\t+" ]
+    c = [ "chr0\t5\t10\tr0\t0\t+", "chr1\t10\t20\tr1\t0\t+", "chr1\t150\t160\tr2\t0\t+" ]
+    expected = sorted( as_strings( join( reader( a ), reader( c ) ) ) )
+    rows = sorted( as_strings( join( reader( a ), reader( c ), presorted=True ) ) )
+    assert rows == expected
+    assert len( rows ) == 3
+    assert all( len( row.split( "\t" ) ) == 12 for row in rows )
+
+def test_presorted_padding():
+    a, b = random_lines( 10 ), random_lines( 10 )
+    for operation in intersect, subtract:
+        try:
+            list( operation( [ reader( a ), reader( b ) ], upstream_pad=10, presorted=True ) )
+        except ValueError:
+            pass
+        else:
+            assert False, "Padding with presorted input not detected"
+
+def test_active_intervals():
+    # Only intervals that can still overlap are kept
+    stream = SortedIntervalStream( Span( "chr1", i * 10, i * 10 + 15 ) for i in range( 1000 ) )
+    for i in range( 1000 ):
+        found = stream.overlapping( "chr1", i * 10, i * 10 + 1 )
+        assert [ s.start for s in found ] == [ j * 10 for j in ( i - 1, i ) if j >= 0 ]
+        assert len( stream.active ) <= 2
+
+def test_unsorted():
+    try:
+        list( overlapping( [ Span( "chr1", 10, 20 ), Span( "chr1", 5, 20 ) ], [] ) )
+    except UnsortedInputError:
+        pass
+    else:
+        assert False, "Unsorted input not detected"
+
+def test_spans():
+    assert union_spans( [ Span( "c", 0, 5 ), Span( "c", 3, 8 ), Span( "c", 10, 12 ) ], 2, 11 ) == [ ( 2, 8 ), ( 10, 11 ) ]
+    assert intersect_spans( [ ( 0, 5 ), ( 8, 12 ) ], [ ( 3, 10 ) ] ) == [ ( 3, 5 ), ( 8, 10 ) ]
+    assert complement_spans( [ ( 2, 8 ), ( 10, 11 ) ], 0, 12 ) == [ ( 0, 2 ), ( 8, 10 ), ( 11, 12 ) ]
+    assert list( merged_spans( [ Span( "c", 0, 5 ), Span( "c", 5, 8 ), Span( "c", 9, 10 ), Span( "d", 0, 1 ) ] ) ) == \
+        [ ( "c", 0, 8 ), ( "c", 9, 10 ), ( "d", 0, 1 ) ]
@@ -0,0 +1,420 @@
+"""
+An immutable interval index built in bulk from arrays of starts and ends.
+
+`StaticIntervalIndex` answers the same queries as
+`bx.intervals.intersection.IntervalTree` (find, before, after, upstream and
+downstream) but stores the intervals in a handful of numpy arrays rather
+than a tree of Python objects, so it is much smaller and quicker to build
+for large sets of intervals. It can not be modified after it is built.
+
+Intervals are grouped by length into classes whose lengths are within a
+factor of two of each other, and each class is sorted by start. An interval
+of a class can only overlap a query if it starts less than the longest
+length of the class before the query start, so each class needs a binary
+search and a scan of a window at most about twice as large as the matches.
+
+>>> index = StaticIntervalIndex( [ 0, 3, 3, 13 ], [ 10, 7, 40, 50 ], [ "a", "b", "c", "d" ] )
+>>> index.find( 2, 5 )
+['a', 'b', 'c']
+>>> index.find( 30, 50 )
+['c', 'd']
+>>> index.find_indices( 30, 50 )
+array([2, 3])
+>>> index.before( 10 )
+['b']
+>>> index.after( 10, num_intervals=2, max_dist=5000 )
+['d']
+
+Indexes for several chromosomes can be saved to a file with
+`write_index_file` and opened with `StaticIntervalIndexFile`, which memory
+maps the file so the arrays are used without reading or copying them (and
+the pages are shared by all processes using the file).
+"""
+
+import mmap
+import struct
+
+import numpy
+
+__all__ = [ 'StaticIntervalIndex', 'StaticIntervalIndexFile', 'write_index_file' ]
+
+MAGIC = 0x5D1A7E11
+VERSION = 1
+ALIGNMENT = 8
+
+# Arrays saved for each index, all other state is derived from these
+SAVED_ARRAYS = [ "starts", "ends", "ids", "classes", "bounds", "max_lengths", "rank", "by_end", "sorted_ends" ]
+
+def length_classes( lengths ):
+    """Length class of each length, floor( log2( length ) ) (0 below 2)"""
+    return numpy.maximum( numpy.frexp( numpy.maximum( lengths, 1 ) )[1] - 1, 0 ).astype( numpy.int64 )
+
+def sort_order( primary, secondary ):
+    """
+    Indices that sort by `primary` and then `secondary`, keeping the
+    original order of ties
+    """
+    if len( primary ) == 0:
+        return numpy.zeros( 0, numpy.int64 )
+    primary = primary - primary.min()
+    secondary = secondary - secondary.min()
+    bits = int( secondary.max() ).bit_length()
+    # Sort on a single combined key when the values are small enough
+    if int( primary.max() ).bit_length() + bits <= 62:
+        return numpy.argsort( ( primary << bits ) | secondary, kind="mergesort" )
+    return numpy.lexsort( ( secondary, primary ) )
+
+def expand_ranges( los, his ):
+    """
+    Return the index of the range and the position for every position in
+    the ranges [los[i],his[i])
+    """
+    counts = numpy.maximum( his - los, 0 )
+    total = counts.sum()
+    which = numpy.repeat( numpy.arange( len( los ) ), counts )
+    positions = numpy.repeat( los - numpy.cumsum( counts ) + counts, counts ) + numpy.arange( total )
+    return which, positions
+
+class StaticIntervalIndex( object ):
+    """
+    Index of the intervals [starts[i],ends[i]) with associated values
+    (values[i], or i if no values are given). Query results are sorted as
+    for `IntervalTree`; `find_batch` answers many queries at once and is
+    much faster than calling `find` for each.
+    """
+    def __init__( self, starts, ends, values=None ):
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        if starts.shape != ends.shape or starts.ndim != 1:
+            raise ValueError( "starts and ends must be one dimensional and of the same length" )
+        if values is not None and len( values ) != len( starts ):
+            raise ValueError( "values must be of the same length as starts and ends" )
+        self.values = values
+        classes = length_classes( ends - starts )
+        order = sort_order( classes, starts )
+        self.init_arrays( starts[order], ends[order], order, classes[order] )
+
+    def init_arrays( self, starts, ends, ids, classes ):
+        """Set up the index from arrays already in class / start order"""
+        n = len( starts )
+        self.starts = starts
+        self.ends = ends
+        self.ids = ids
+        # Position in the arrays of each length class
+        self.classes = numpy.unique( classes )
+        self.bounds = numpy.searchsorted( classes, numpy.append( self.classes, self.classes[-1] + 1 if n else 0 ) )
+        self.max_lengths = numpy.array( [ max( 0, ( ends[lo:hi] - starts[lo:hi] ).max() )
+                                          for lo, hi in zip( self.bounds[:-1], self.bounds[1:] ) ], dtype=numpy.int64 )
+        self.init_class_ranges()
+        # Rank of each interval ordered by start, end and number, used to
+        # sort query results
+        positions = numpy.empty( n, numpy.int64 )
+        positions[ids] = numpy.arange( n )
+        by_start = positions[ sort_order( starts[positions], ends[positions] ) ]
+        self.rank = numpy.empty( n, numpy.int64 )
+        self.rank[by_start] = numpy.arange( n )
+        # Order by end ( and start, number ) for the before queries
+        self.by_end = positions[ sort_order( ends[positions], starts[positions] ) ]
+        self.sorted_ends = ends[self.by_end]
+
+    def init_class_ranges( self ):
+        self.class_ranges = zip( self.bounds[:-1].tolist(), self.bounds[1:].tolist(), self.max_lengths.tolist() )
+
+    def __len__( self ):
+        return len( self.starts )
+
+    @classmethod
+    def from_arrays( cls, arrays, values=None ):
+        """
+        Index from the dict of `SAVED_ARRAYS` of an existing index (e.g.
+        read from a file), without sorting again
+        """
+        index = cls.__new__( cls )
+        for name in SAVED_ARRAYS:
+            setattr( index, name, arrays[name] )
+        index.values = values
+        index.init_class_ranges()
+        return index
+
+    @classmethod
+    def from_intervals( cls, intervals ):
+        """
+        Index "interval" like objects (with at least start and end
+        attributes), the objects are the values
+        """
+        intervals = list( intervals )
+        return cls( [ i.start for i in intervals ], [ i.end for i in intervals ], intervals )
+
+    def lookup( self, ids ):
+        """The values for the interval numbers `ids`"""
+        if self.values is None:
+            return [ int( i ) for i in ids ]
+        return [ self.values[i] for i in ids ]
+
+    # ---- Overlap queries ---------------------------------------------------
+
+    def find_batch( self, starts, ends ):
+        """
+        Find the intervals overlapping each of the query intervals
+        [starts[i],ends[i]). Returns arrays ( query_index, hit_index ) of
+        matching pairs, sorted by query and then as `find` would return
+        them.
+        """
+        starts = numpy.asarray( starts, dtype=numpy.int64 )
+        ends = numpy.asarray( ends, dtype=numpy.int64 )
+        # Searching for the queries in order is much faster
+        query_order = numpy.argsort( starts )
+        starts, ends = starts[query_order], ends[query_order]
+        queries, hits = [], []
+        for lo, hi, max_length in self.class_ranges:
+            class_starts = self.starts[lo:hi]
+            # Intervals in the class starting late enough to reach the query
+            first = numpy.searchsorted( class_starts, starts - max_length, side="right" ) + lo
+            last = numpy.searchsorted( class_starts, ends, side="left" ) + lo
+            which, positions = expand_ranges( first, last )
+            keep = self.ends[positions] > starts[which]
+            queries.append( which[keep] )
+            hits.append( positions[keep] )
+        if not queries:
+            return numpy.zeros( 0, numpy.int64 ), numpy.zeros( 0, numpy.int64 )
+        queries = query_order[ numpy.concatenate( queries ) ]
+        hits = numpy.concatenate( hits )
+        order = numpy.argsort( queries * len( self ) + self.rank[hits] )
+        return queries[order], self.ids[hits[order]]
+
+    def find_indices( self, start, end ):
+        """Array of the numbers of the intervals overlapping [start,end)"""
+        found = []
+        for lo, hi, max_length in self.class_ranges:
+            class_starts = self.starts[lo:hi]
+            first = class_starts.searchsorted( start - max_length, "right" ) + lo
+            last = class_starts.searchsorted( end, "left" ) + lo
+            if last > first:
+                found.append( numpy.flatnonzero( self.ends[first:last] > start ) + first )
+        if not found:
+            return numpy.zeros( 0, numpy.int64 )
+        found = numpy.concatenate( found )
+        return self.ids[ found[ numpy.argsort( self.rank[found] ) ] ]
+
+    def find( self, start, end ):
+        """
+        Return a sorted list of all intervals overlapping [start,end).
+        """
+        return self.lookup( self.find_indices( start, end ) )
+
+    # ---- Nearest neighbor queries ------------------------------------------
+
+    def before_indices( self, position, num_intervals=1, max_dist=2500 ):
+        """
+        Numbers of the (up to) `num_intervals` intervals ending before
+        `position` and no more than `max_dist` away, nearest first
+        """
+        lo = numpy.searchsorted( self.sorted_ends, position - max_dist, side="left" )
+        hi = numpy.searchsorted( self.sorted_ends, position, side="left" )
+        lo = max( lo, hi - num_intervals )
+        return self.ids[ self.by_end[lo:hi][::-1] ]
+
+    def after_indices( self, position, num_intervals=1, max_dist=2500 ):
+        """
+        Numbers of the (up to) `num_intervals` intervals starting after
+        `position` and no more than `max_dist` away, nearest first
+        """
+        candidates = []
+        for lo, hi, max_length in self.class_ranges:
+            class_starts = self.starts[lo:hi]
+            first = numpy.searchsorted( class_starts, position, side="right" )
+            last = numpy.searchsorted( class_starts, position + max_dist, side="right" )
+            candidates.append( numpy.arange( lo + first, lo + min( last, first + num_intervals ) ) )
+        if not candidates:
+            return numpy.zeros( 0, numpy.int64 )
+        candidates = numpy.concatenate( candidates )
+        order = numpy.argsort( self.rank[candidates] )
+        return self.ids[ candidates[ order[:num_intervals] ] ]
+
+    def before( self, position, num_intervals=1, max_dist=2500 ):
+        """
+        Find `num_intervals` intervals that lie before `position` and are no
+        further than `max_dist` positions away
+        """
+        return self.lookup( self.before_indices( position, num_intervals, max_dist ) )
+
+    def after( self, position, num_intervals=1, max_dist=2500 ):
+        """
+        Find `num_intervals` intervals that lie after `position` and are no
+        further than `max_dist` positions away
+        """
+        return self.lookup( self.after_indices( position, num_intervals, max_dist ) )
+
+    # ---- Interval-like object based interfaces -----------------------------
+
+    def before_interval( self, interval, num_intervals=1, max_dist=2500 ):
+        """
+        Find `num_intervals` intervals that lie completely before `interval`
+        and are no further than `max_dist` positions away
+        """
+        return self.before( interval.start, num_intervals, max_dist )
+
+    def after_interval( self, interval, num_intervals=1, max_dist=2500 ):
+        """
+        Find `num_intervals` intervals that lie completely after `interval` and
+        are no further than `max_dist` positions away
+        """
+        return self.after( interval.end, num_intervals, max_dist )
+
+    def upstream_of_interval( self, interval, num_intervals=1, max_dist=2500 ):
+        """
+        Find `num_intervals` intervals that lie completely upstream of
+        `interval` and are no further than `max_dist` positions away
+        """
+        if interval.strand == -1 or interval.strand == "-":
+            return self.after( interval.end, num_intervals, max_dist )
+        else:
+            return self.before( interval.start, num_intervals, max_dist )
+
+    def downstream_of_interval( self, interval, num_intervals=1, max_dist=2500 ):
+        """
+        Find `num_intervals` intervals that lie completely downstream of
+        `interval` and are no further than `max_dist` positions away
+        """
+        if interval.strand == -1 or interval.strand == "-":
+            return self.before( interval.start, num_intervals, max_dist )
+        else:
+            return self.after( interval.end, num_intervals, max_dist )
+
+    def traverse( self, fn ):
+        """
+        call fn for each element in the index, in order of start
+        """
+        order = numpy.argsort( self.rank )
+        for value in self.lookup( self.ids[order] ):
+            fn( value )
+
+# ---- Index files ------------------------------------------------------------
+
+# An index file has a header ( magic, version, offset of the directory ),
+# the arrays of all indexes as little endian values aligned to 8 bytes, and
+# then the directory. For each chromosome the directory has the name, and
+# the dtype, offset and length of each array.
+
+def write_index_file( f, indexes ):
+    """
+    Write the `StaticIntervalIndex` for each chromosome in the dict
+    `indexes` to the (seekable) file `f`. The values of the indexes can only
+    be saved if they are numpy arrays of numbers or fixed width strings
+    (e.g. record numbers or names).
+    """
+    header = struct.Struct( "<2IQ" )
+    start = f.tell()
+    f.write( header.pack( MAGIC, VERSION, 0 ) )
+    directory = []
+    for chrom in sorted( indexes ):
+        index = indexes[chrom]
+        arrays = [ ( name, getattr( index, name ) ) for name in SAVED_ARRAYS ]
+        if index.values is not None:
+            values = index.values
+            if not isinstance( values, numpy.ndarray ) or values.dtype.kind not in "biufS":
+                raise ValueError( "Values of %s can not be saved, only numeric or string arrays can" % chrom )
+            arrays.append( ( "values", values ) )
+        entries = []
+        for name, a in arrays:
+            a = numpy.ascontiguousarray( a, dtype=a.dtype.newbyteorder( "<" ) )
+            pos = f.tell()
+            if pos % ALIGNMENT:
+                f.write( "\0" * ( ALIGNMENT - pos % ALIGNMENT ) )
+            entries.append( ( name, a.dtype.str, f.tell() - start, len( a ) ) )
+            f.write( a.tostring() )
+        directory.append( ( chrom, entries ) )
+    directory_pos = f.tell()
+    f.write( struct.pack( "<I", len( directory ) ) )
+    for chrom, entries in directory:
+        write_string( f, chrom )
+        f.write( struct.pack( "<I", len( entries ) ) )
+        for name, dtype, offset, length in entries:
+            write_string( f, name )
+            write_string( f, dtype )
+            f.write( struct.pack( "<2Q", offset, length ) )
+    end = f.tell()
+    f.seek( start )
+    f.write( header.pack( MAGIC, VERSION, directory_pos - start ) )
+    f.seek( end )
+
+class StaticIntervalIndexFile( object ):
+    """
+    Read only access to the indexes in a file written by `write_index_file`,
+    by chromosome. With `use_mmap` (the default) the file is memory mapped
+    and opening it or an index only reads the directory.
+    """
+    def __init__( self, f, use_mmap=True ):
+        if isinstance( f, basestring ):
+            f = open( f, "rb" )
+        self.f = f
+        self.start = f.tell()
+        magic, version, directory_pos = struct.unpack( "<2IQ", f.read( 16 ) )
+        if magic != MAGIC:
+            raise ValueError( "Not an interval index file" )
+        if version > VERSION:
+            raise ValueError( "File is version %d but I don't know about anything beyond %d" % ( version, VERSION ) )
+        f.seek( self.start + directory_pos )
+        self.directory = {}
+        self.chroms = []
+        for i in range( struct.unpack( "<I", f.read( 4 ) )[0] ):
+            chrom = read_string( f )
+            entries = {}
+            for j in range( struct.unpack( "<I", f.read( 4 ) )[0] ):
+                name = read_string( f )
+                dtype = read_string( f )
+                offset, length = struct.unpack( "<2Q", f.read( 16 ) )
+                entries[name] = ( numpy.dtype( dtype ), offset, length )
+            self.directory[chrom] = entries
+            self.chroms.append( chrom )
+        self.mapped = None
+        if use_mmap:
+            try:
+                self.mapped = mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_READ )
+            except ( AttributeError, ValueError, EnvironmentError ):
+                pass
+        self.indexes = {}
+
+    def read_array( self, dtype, offset, length ):
+        if self.mapped is not None:
+            return numpy.frombuffer( self.mapped, dtype, length, self.start + offset )
+        self.f.seek( self.start + offset )
+        return numpy.fromstring( self.f.read( dtype.itemsize * length ), dtype )
+
+    def keys( self ):
+        return list( self.chroms )
+
+    def __contains__( self, chrom ):
+        return chrom in self.directory
+
+    def __getitem__( self, chrom ):
+        """The `StaticIntervalIndex` for `chrom`"""
+        if chrom not in self.indexes:
+            arrays = dict( ( name, self.read_array( *entry ) ) for name, entry in self.directory[chrom].iteritems() )
+            self.indexes[chrom] = StaticIntervalIndex.from_arrays( arrays, arrays.get( "values" ) )
+        return self.indexes[chrom]
+
+    def get( self, chrom, default=None ):
+        if chrom in self.directory:
+            return self[chrom]
+        return default
+
+    def find( self, chrom, start, end ):
+        """Values of the intervals on `chrom` overlapping [start,end)"""
+        if chrom not in self.directory:
+            return []
+        return self[chrom].find( start, end )
+
+    def close( self ):
+        self.indexes = {}
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        self.f.close()
+
+def write_string( f, s ):
+    f.write( struct.pack( "<I", len( s ) ) )
+    f.write( s )
+
+def read_string( f ):
+    return f.read( struct.unpack( "<I", f.read( 4 ) )[0] )
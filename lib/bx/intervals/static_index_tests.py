@@ -0,0 +1,118 @@
+"""
+Tests for `bx.intervals.static_index`, comparing the results to
+`bx.intervals.intersection.IntervalTree`.
+"""
+
+import operator
+import os
+import random
+import tempfile
+
+import numpy
+
+from bx.intervals.intersection import Interval, IntervalTree
+from bx.intervals.static_index import StaticIntervalIndex, StaticIntervalIndexFile, write_index_file
+
+def random_intervals( n, size=100000 ):
+    intervals = []
+    for i in range( n ):
+        start = random.randint( 0, size )
+        length = random.choice( [ 0, 1, 5, 50, 500, 5000, 50000 ] )
+        intervals.append( Interval( start, start + random.randint( 0, length ), value=i ) )
+    return intervals
+
+def build( intervals ):
+    tree = IntervalTree()
+    for interval in intervals:
+        tree.insert_interval( interval )
+    return tree, StaticIntervalIndex.from_intervals( intervals )
+
+def key( interval ):
+    return ( interval.start, interval.end, interval.value )
+
+def test_find():
+    intervals = random_intervals( 2000 )
+    tree, index = build( intervals )
+    starts = numpy.random.randint( 0, 110000, 300 )
+    ends = starts + numpy.random.randint( 0, 3000, 300 )
+    queries, hits = index.find_batch( starts, ends )
+    for i, ( start, end ) in enumerate( zip( starts, ends ) ):
+        expected = sorted( tree.find( start, end ), key=key )
+        found = index.find( start, end )
+        assert [ f.start for f in found ] == sorted( f.start for f in found )
+        assert sorted( found, key=key ) == expected
+        assert sorted( hits[ queries == i ] ) == sorted( e.value for e in expected )
+
+def test_neighbors():
+    intervals = random_intervals( 2000 )
+    tree, index = build( intervals )
+    for position in numpy.random.randint( 0, 110000, 300 ):
+        for n, max_dist in ( ( 1, 2500 ), ( 3, 100 ), ( 10, 100000 ) ):
+            before = index.before( position, n, max_dist )
+            after = index.after( position, n, max_dist )
+            # The tree does not sort its results when it finds exactly n
+            assert [ i.end for i in before ] == sorted( [ i.end for i in tree.before( position, n, max_dist ) ], reverse=True )
+            assert [ i.start for i in after ] == sorted( i.start for i in tree.after( position, n, max_dist ) )
+            assert all( position - max_dist <= i.end < position for i in before )
+            assert all( position < i.start <= position + max_dist for i in after )
+            strand = random.choice( "+-" )
+            query = Interval( position, position + 10, strand=strand )
+            # Compare the ends of intervals before the query and the starts
+            # of ones after it, other intervals may be chosen on ties
+            before_key = operator.attrgetter( "end" )
+            after_key = operator.attrgetter( "start" )
+            for method, key in ( ( "before_interval", before_key ), ( "after_interval", after_key ),
+                                 ( "upstream_of_interval", before_key if strand == "+" else after_key ),
+                                 ( "downstream_of_interval", after_key if strand == "+" else before_key ) ):
+                expected = getattr( tree, method )( query, n, max_dist )
+                found = getattr( index, method )( query, n, max_dist )
+                assert sorted( map( key, found ) ) == sorted( map( key, expected ) )
+
+def test_values():
+    index = StaticIntervalIndex( [ 10, 0, 5 ], [ 20, 8, 6 ] )
+    assert index.find( 0, 100 ) == [ 1, 2, 0 ]
+    assert index.before( 100, 2, 1000 ) == [ 0, 1 ]
+    assert len( index ) == 3
+    empty = StaticIntervalIndex( [], [] )
+    assert empty.find( 0, 10 ) == [] and empty.before( 10 ) == [] and empty.after( 0 ) == []
+    seen = []
+    index.traverse( seen.append )
+    assert seen == [ 1, 2, 0 ]
+
+def test_index_file():
+    indexes = {}
+    for chrom, n in ( ( "chr1", 1000 ), ( "chr2", 300 ), ( "chrM", 0 ) ):
+        intervals = random_intervals( n )
+        names = numpy.array( [ "name%d" % i.value for i in intervals ] )
+        indexes[chrom] = StaticIntervalIndex( [ i.start for i in intervals ], [ i.end for i in intervals ], names )
+    fd, fname = tempfile.mkstemp()
+    os.close( fd )
+    try:
+        f = open( fname, "wb" )
+        write_index_file( f, indexes )
+        f.close()
+        for use_mmap in ( True, False ):
+            index_file = StaticIntervalIndexFile( fname, use_mmap=use_mmap )
+            assert index_file.keys() == [ "chr1", "chr2", "chrM" ]
+            assert "chr1" in index_file and "chr3" not in index_file
+            assert index_file.find( "chr3", 0, 100 ) == []
+            for chrom, index in indexes.iteritems():
+                loaded = index_file[chrom]
+                assert len( loaded ) == len( index )
+                for start in numpy.random.randint( 0, 110000, 100 ):
+                    assert index_file.find( chrom, start, start + 100 ) == index.find( start, start + 100 )
+                    assert loaded.before( start, 3, 1000 ) == index.before( start, 3, 1000 )
+                    assert loaded.after( start, 3, 1000 ) == index.after( start, 3, 1000 )
+                starts = numpy.random.randint( 0, 110000, 100 )
+                for a, b in zip( loaded.find_batch( starts, starts + 500 ), index.find_batch( starts, starts + 500 ) ):
+                    assert numpy.all( a == b )
+            index_file.close()
+    finally:
+        os.remove( fname )
+    # Only arrays of values can be saved
+    try:
+        write_index_file( tempfile.TemporaryFile(), { "chr1": StaticIntervalIndex( [ 0 ], [ 1 ], [ object() ] ) } )
+    except ValueError:
+        pass
+    else:
+        assert False, "Saved values that are not an array"
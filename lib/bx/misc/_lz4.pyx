@@ -0,0 +1,67 @@
+"""
+Fast compression in the LZ4 block format (wrapping `lz4block.c`), used by
+`bx.binned_array` when the `lz4` package is not installed.
+
+Compressed data starts with the uncompressed size as a 4 byte little endian
+integer, like the blocks written by `lz4.block.compress`, so data written
+by either can be read by the other.
+
+>>> data = "ACGT" * 1000 + "TTAGGG" * 50
+>>> c = compress( data )
+>>> len( c ) < len( data ) // 10
+True
+>>> decompress( c ) == data
+True
+"""
+
+cdef extern from "Python.h":
+    char * PyString_AsString( object )
+    object PyString_FromStringAndSize( char *, Py_ssize_t )
+
+cdef extern from "lz4block.h":
+    int lz4_compress_bound( int size ) nogil
+    int lz4_compress( char * src, char * dst, int src_size, int dst_capacity ) nogil
+    int lz4_decompress( char * src, char * dst, int src_size, int dst_size ) nogil
+
+def compress( data, level=None ):
+    """
+    Compress the string `data`. There is a single compression level,
+    `level` is accepted (and ignored) for use as a binned array codec.
+    """
+    cdef int size = len( data )
+    cdef int bound = lz4_compress_bound( size )
+    cdef int n
+    cdef char * src = PyString_AsString( data )
+    cdef char * dst
+    result = PyString_FromStringAndSize( NULL, 4 + bound )
+    dst = PyString_AsString( result )
+    dst[0] = size & 0xFF
+    dst[1] = ( size >> 8 ) & 0xFF
+    dst[2] = ( size >> 16 ) & 0xFF
+    dst[3] = ( size >> 24 ) & 0xFF
+    with nogil:
+        n = lz4_compress( src, dst + 4, size, bound )
+    if n < 0:
+        raise ValueError( "LZ4 compression failed" )
+    return result[:4+n]
+
+def decompress( data ):
+    """Decompress the string `data` written by `compress`"""
+    cdef int n
+    cdef int src_size = len( data ) - 4
+    cdef unsigned char * header
+    cdef unsigned int size
+    cdef char * dst
+    if src_size < 1:
+        raise ValueError( "LZ4 data is truncated" )
+    header = <unsigned char *> PyString_AsString( data )
+    size = header[0] | ( header[1] << 8 ) | ( header[2] << 16 ) | ( <unsigned int> header[3] << 24 )
+    if size > 0x7FFFFFFF:
+        raise ValueError( "LZ4 data is corrupt" )
+    result = PyString_FromStringAndSize( NULL, size )
+    dst = PyString_AsString( result )
+    with nogil:
+        n = lz4_decompress( <char *> header + 4, dst, src_size, size )
+    if n != <int> size:
+        raise ValueError( "LZ4 data is corrupt" )
+    return result
@@ -2,6 +2,7 @@
 Wrappers for doing binary IO on file-like objects
 """
 
+import mmap
 import numpy
 import struct
 import sys
@@ -14,16 +15,34 @@ import sys
 class BadMagicNumber( IOError ):
     pass
 
+def map_file( file ):
+    """
+    Return a read only memory map of the whole of the open file `file`
+    (which must have a `fileno`), positioned at the current offset of
+    `file`. Mapped files can be used anywhere a file is expected, and
+    processes mapping the same file share its pages in the OS page cache.
+    """
+    if isinstance( file, mmap.mmap ):
+        return file
+    mapped = mmap.mmap( file.fileno(), 0, access=mmap.ACCESS_READ )
+    mapped.seek( file.tell() )
+    return mapped
+
 class BinaryFileReader( object ):
     """
     Wrapper for doing binary reads on any file like object.
     
     Currently this is not heavily optimized (it uses the `struct` module to
-    unpack)
+    unpack). If `use_mmap` is True (or `file` is already an `mmap`) the file
+    is memory mapped and `read_array` and `read_buffer` return views of the
+    mapping without copying.
     """    
-    def __init__( self, file, magic = None, is_little_endian = False ):
+    def __init__( self, file, magic = None, is_little_endian = False, use_mmap = False ):
         self.is_little_endian = is_little_endian
+        if use_mmap:
+            file = map_file( file )
         self.file = file
+        self.is_mapped = isinstance( file, mmap.mmap )
         if magic is not None:
             # Attempt to read magic number and chuck endianess
             bytes = file.read( 4 )
@@ -76,6 +95,31 @@ class BinaryFileReader( object ):
         if self.byteswap_needed:
             a.byteswap()
         return a
+
+    def read_array( self, dtype, count ):
+        """
+        Read `count` items of numpy `dtype` (which may be a structured type)
+        in the byte order of the file. The result is a read only view of
+        the mapping if the file is mapped.
+        """
+        dtype = numpy.dtype( dtype ).newbyteorder( self.endian_code )
+        if self.is_mapped:
+            pos = self.file.tell()
+            a = numpy.frombuffer( self.file, dtype=dtype, count=count, offset=pos )
+            self.file.seek( pos + dtype.itemsize * count )
+            return a
+        return numpy.fromstring( self.file.read( dtype.itemsize * count ), dtype=dtype, count=count )
+
+    def read_buffer( self, byte_count ):
+        """
+        Read `byte_count` bytes, as a buffer sharing memory with the mapping
+        if the file is mapped, otherwise as a string.
+        """
+        if self.is_mapped:
+            pos = self.file.tell()
+            self.file.seek( pos + byte_count )
+            return buffer( self.file, pos, byte_count )
+        return self.file.read( byte_count )
     
     def read( self, byte_count=1 ):
         return self.file.read( byte_count )
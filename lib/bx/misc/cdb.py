@@ -14,14 +14,12 @@ class FileCDBDict( DictMixin ):
     
     NOTE: The keys method could be implemented by scanning the main table.
     """
-    def __init__( self, file, is_little_endian=True ):
+    def __init__( self, file, is_little_endian=True, use_mmap=False ):
         # TODO: Deal with endianess
-        self.io = BinaryFileReader( file, is_little_endian=is_little_endian )
+        self.io = BinaryFileReader( file, is_little_endian=is_little_endian, use_mmap=use_mmap )
         self.header_offset = self.io.tell()
         # Read the whole header (only 2k)
-        self.header = []
-        for i in range( 256 ):
-            self.header.append( ( self.io.read_uint32(), self.io.read_uint32() ) )
+        self.header = [ tuple( x ) for x in self.io.read_array( "u4", 512 ).reshape( 256, 2 ).tolist() ]
     def __getitem__( self, key ):
         hash = cdbhash( key )
         # Find position of subtable using 8 LSBs of hash
@@ -27,6 +27,12 @@ def test():
         assert False, "KeyError was not raised"
     except KeyError, e:
         pass
+
+    # Memory mapped
+    file2.seek( 0 )
+    cdb = FileCDBDict( file2, use_mmap=True )
+    for key, value in d.iteritems():
+        assert cdb[key] == value
     
     # Close everything (deletes the temporary file)
     file2.close()
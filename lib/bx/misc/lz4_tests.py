@@ -0,0 +1,50 @@
+"""
+Tests for `bx.misc._lz4`.
+"""
+
+import random
+import struct
+
+from bx.misc import _lz4
+
+def check_round_trip( data ):
+    c = _lz4.compress( data )
+    assert struct.unpack( "<I", c[:4] )[0] == len( data )
+    assert _lz4.decompress( c ) == data
+    return c
+
+def test_round_trip():
+    random.seed( 1 )
+    noise = "".join( chr( random.randrange( 256 ) ) for i in range( 100000 ) )
+    for data in [ "", "a", "abcdefghijkl", "abcdefghijklm", "a" * 13, "a" * 100000,
+                  "ACGT" * 25000, noise, noise[:5000] * 20,
+                  "".join( random.choice( "ACGT" ) for i in range( 100000 ) ) ]:
+        check_round_trip( data )
+    # Repeated and incompressible data
+    assert len( check_round_trip( "a" * 100000 ) ) < 1000
+    assert len( check_round_trip( noise ) ) < len( noise ) * 1.01
+
+def test_format():
+    # Literals, an overlapping match of 23 bytes at offset 4, and the last
+    # 5 bytes as literals
+    c = _lz4.compress( "abcd" * 8 )
+    assert c == struct.pack( "<I", 32 ) + "\x4f" + "abcd" + "\x04\x00" + "\x04" + "\x50" + "dabcd"
+
+def test_lz4_package():
+    try:
+        import lz4.block
+    except ImportError:
+        return
+    data = "ACGT" * 10000 + "".join( chr( i % 251 ) for i in range( 10000 ) )
+    assert lz4.block.decompress( _lz4.compress( data ) ) == data
+    assert _lz4.decompress( lz4.block.compress( data ) ) == data
+
+def test_corrupt():
+    c = _lz4.compress( "ACGT" * 1000 )
+    for bad in [ "", c[:4], c[:-1], c[:4] + "\xff" * 10, struct.pack( "<I", 100 ) + c[4:] ]:
+        try:
+            _lz4.decompress( bad )
+        except ValueError:
+            pass
+        else:
+            assert False, "Corrupt data not detected"
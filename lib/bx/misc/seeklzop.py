@@ -52,6 +52,8 @@ class SeekableLzopFile( object ):
                 size = int( fields[3] )
                 self.block_info.append( ( offset, compressed_size, size ) )
         self.nblocks = len( self.block_info )
+        # Size of the uncompressed data
+        self.size = sum( size for offset, compressed_size, size in self.block_info )
         
     def close( self ):
         self.file.close()
@@ -72,6 +74,10 @@ class SeekableLzopFile( object ):
             return value
         
     def fix_dirty( self ):
+        self.dirty = False
+        self.at_eof = ( self.file_pos >= self.size )
+        if self.at_eof:
+            return
         chunk, offset = self.get_block_and_offset( self.file_pos )
         if self.current_block_index != chunk:
             self.current_block = StringIO( self.load_block( chunk ) )
@@ -79,7 +85,6 @@ class SeekableLzopFile( object ):
             self.current_block_index = chunk
         else:
             self.current_block.seek( offset )
-        self.dirty = False
         
     def get_block_and_offset( self, index ):
         return int( index // self.block_size ), int( index % self.block_size )
@@ -94,8 +99,7 @@ class SeekableLzopFile( object ):
         elif whence == 1:
             target_pos = self.file_pos + offset
         elif whence == 2:
-            raise Exception( "seek from end not supported" )
-            ## target_pos = self.size - offset
+            target_pos = self.size + offset
         else:
             raise Exception( "Invalid `whence` argument: %r", whence )
         # Check if this is a noop
@@ -0,0 +1,79 @@
+"""
+Least recently used cache bounded by the total size of its values rather
+than the number of entries, and keeping hit / miss counts.
+"""
+
+from collections import OrderedDict
+
+class SizedLRUCache( object ):
+    """
+    Maps keys to values, discarding the least recently used entries once
+    the sum of `sizeof( value )` exceeds `max_size`. With the default
+    `sizeof` (`len`) and string values the bound is in bytes; pass
+    `sizeof=lambda x: 1` to bound the number of entries.
+
+    >>> c = SizedLRUCache( 10 )
+    >>> c['a'] = "12345"
+    >>> c['b'] = "12345"
+    >>> c.get( 'a' )
+    '12345'
+    >>> c['c'] = "123"
+    >>> 'b' in c, 'a' in c, c.size
+    (False, True, 8)
+    >>> c.get( 'b' ), c.hits, c.misses
+    (None, 1, 1)
+    """
+    def __init__( self, max_size, sizeof=len ):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+    def __len__( self ):
+        return len( self.entries )
+    def __contains__( self, key ):
+        return key in self.entries
+    def get( self, key, default=None ):
+        """
+        Return the value for `key` (marking it as most recently used) or
+        `default`, counting a hit or a miss.
+        """
+        try:
+            value, size = self.entries.pop( key )
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries[key] = ( value, size )
+        self.hits += 1
+        return value
+    def __getitem__( self, key ):
+        value = self.get( key, self )
+        if value is self:
+            raise KeyError( key )
+        return value
+    def __setitem__( self, key, value ):
+        size = self.sizeof( value )
+        if key in self.entries:
+            self.size -= self.entries.pop( key )[1]
+        # Values larger than the whole cache are not worth keeping
+        if size > self.max_size:
+            return
+        self.entries[key] = ( value, size )
+        self.size += size
+        while self.size > self.max_size:
+            old_key, ( old_value, old_size ) = self.entries.popitem( last=False )
+            self.size -= old_size
+    def __delitem__( self, key ):
+        self.size -= self.entries.pop( key )[1]
+    def clear( self ):
+        """
+        Discard all entries, counters are kept.
+        """
+        self.entries.clear()
+        self.size = 0
+    def hit_rate( self ):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / float( total )
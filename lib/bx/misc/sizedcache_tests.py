@@ -0,0 +1,48 @@
+from bx.misc.sizedcache import SizedLRUCache
+
+def test_size_bound():
+    c = SizedLRUCache( 100 )
+    for i in range( 50 ):
+        c[i] = "x" * 10
+    assert len( c ) == 10
+    assert c.size == 100
+    assert sorted( c.entries.keys() ) == range( 40, 50 )
+
+def test_lru_order():
+    c = SizedLRUCache( 3, sizeof=lambda x: 1 )
+    c[1] = 1
+    c[2] = 2
+    c[3] = 3
+    assert c.get( 1 ) == 1
+    c[4] = 4
+    assert 2 not in c
+    assert 1 in c and 3 in c and 4 in c
+
+def test_replace_and_oversized():
+    c = SizedLRUCache( 10 )
+    c['a'] = "123"
+    c['a'] = "12345"
+    assert c.size == 5
+    c['b'] = "x" * 11
+    assert 'b' not in c
+    assert c.size == 5
+    del c['a']
+    assert c.size == 0
+
+def test_counters():
+    c = SizedLRUCache( 10 )
+    c['a'] = "1"
+    c.get( 'a' )
+    c.get( 'a' )
+    c.get( 'b' )
+    try:
+        c['b']
+    except KeyError:
+        pass
+    else:
+        assert False
+    assert c.hits == 2
+    assert c.misses == 2
+    assert c.hit_rate() == 0.5
+    c.clear()
+    assert len( c ) == 0 and c.hits == 2
@@ -4,6 +4,7 @@ Access to files containing sequence data in 'twobit' format.
 
 import sys
 import _twobit
+from bx.misc.binary_file import map_file
 
 from struct import *
 from UserDict import DictMixin
@@ -49,8 +50,15 @@ class TwoBitSequence( object ):
         return dna
         
 class TwoBitFile( DictMixin ):
-    def __init__( self, file, do_mask=True ):
+    def __init__( self, file, do_mask=True, use_mmap=False ):
+        """
+        If `use_mmap` is True `file` is memory mapped, so sequence reads do
+        not go through the file object and processes reading the same file
+        share one copy in the page cache.
+        """
         self.do_mask = do_mask
+        if use_mmap:
+            file = map_file( file )
         # Read magic and determine byte order
         self.byte_order = ">"
         magic = unpack( ">L", file.read( TWOBIT_MAGIC_SIZE ) )[0]
@@ -28,14 +28,15 @@ def test():
         test_fa = "test_data/seq_tests/%s.fa" % t
         test_twobit = "test_data/seq_tests/%s.2bit" % t
         yield check_random_subseq_matches, test_fa, test_twobit
+        yield check_random_subseq_matches, test_fa, test_twobit, True
 
-def check_random_subseq_matches( test_fa, test_twobit ):
+def check_random_subseq_matches( test_fa, test_twobit, use_mmap=False ):
     # Load Fasta data
     expected = {}
     for h, s in quick_fasta_iter( open( test_fa ) ):
         expected[h] = s
     # Open 2bit
-    t = twobit.TwoBitFile( open( test_twobit ) )
+    t = twobit.TwoBitFile( open( test_twobit ), use_mmap=use_mmap )
     for k, s in expected.iteritems():
         assert k in t.index
         # assert t.index[k].size == len(s)
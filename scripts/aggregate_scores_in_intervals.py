@@ -18,6 +18,7 @@ import psyco_full
 import sys
 import os, os.path
 from UserDict import DictMixin
+from itertools import islice
 import bx.wiggle
 from bx.binned_array import BinnedArray, FileBinnedArray
 from bx.bitset import *
@@ -66,35 +67,39 @@ def load_scores_ba_dir( dir ):
     """
     return FileBinnedArrayDir( dir )
     
-def main():
+# Number of intervals read at once
+CHUNK_SIZE = 10000
 
-    # Parse command line
-    options, args = doc_optparse.parse( __doc__ )
-    try:
-        score_fname = args[0]
-        interval_fname = args[1]
-        if len( args ) > 2:
-            out_file = open( args[2], 'w' )
+def aggregate_ranges( scores_by_chrom, masks, intervals ):
+    """
+    Average, minimum and maximum of the non-zero scores in each interval,
+    computed for all intervals on a chromosome at once
+    """
+    results = [ None ] * len( intervals )
+    by_chrom = dict()
+    for i, ( chrom, start, stop ) in enumerate( intervals ):
+        by_chrom.setdefault( chrom, [] ).append( i )
+    for chrom, indexes in by_chrom.iteritems():
+        starts = [ int( intervals[i][1] ) for i in indexes ]
+        stops = [ int( intervals[i][2] ) for i in indexes ]
+        if chrom in scores_by_chrom:
+            means, mins, maxs, counts = scores_by_chrom[chrom].get_ranges( starts, stops, ( 'mean', 'min', 'max', 'count' ), ignore_zeros=True )
         else:
-            out_file = sys.stdout
-        binned = bool( options.binned )
-        mask_fname = options.mask
-    except:
-        doc_optparse.exit()
-
-    if binned:
-        scores_by_chrom = load_scores_ba_dir( score_fname )
-    else:
-        scores_by_chrom = load_scores_wiggle( score_fname )
-
-    if mask_fname:
-        masks = binned_bitsets_from_file( open( mask_fname ) )
-    else:
-        masks = None
+            counts = [ 0 ] * len( indexes )
+        for j, i in enumerate( indexes ):
+            if counts[j] > 0:
+                results[i] = ( chrom, starts[j], stops[j], means[j], mins[j], maxs[j] )
+            else:
+                results[i] = ( chrom, starts[j], stops[j], "nan", "nan", "nan" )
+    return results
 
-    for line in open( interval_fname ):
-        fields = line.split()
-        chrom, start, stop = fields[0], int( fields[1] ), int( fields[2] )
+def aggregate_masked( scores_by_chrom, masks, intervals ):
+    """
+    Average, minimum and maximum of the non-zero scores in each interval,
+    skipping masked bases
+    """
+    for chrom, start, stop in intervals:
+        start, stop = int( start ), int( stop )
         total = 0
         count = 0
         min_score = 100000000
@@ -118,8 +123,46 @@ def main():
             avg = "nan"
             min_score = "nan"
             max_score = "nan"
-            
-        print >> out_file, "\t".join( map( str, [ chrom, start, stop, avg, min_score, max_score ] ) )
+        yield chrom, start, stop, avg, min_score, max_score
+
+def main():
+
+    # Parse command line
+    options, args = doc_optparse.parse( __doc__ )
+    try:
+        score_fname = args[0]
+        interval_fname = args[1]
+        if len( args ) > 2:
+            out_file = open( args[2], 'w' )
+        else:
+            out_file = sys.stdout
+        binned = bool( options.binned )
+        mask_fname = options.mask
+    except:
+        doc_optparse.exit()
+
+    if binned:
+        scores_by_chrom = load_scores_ba_dir( score_fname )
+    else:
+        scores_by_chrom = load_scores_wiggle( score_fname )
+
+    if mask_fname:
+        masks = binned_bitsets_from_file( open( mask_fname ) )
+    else:
+        masks = None
+
+    if masks:
+        aggregate = aggregate_masked
+    else:
+        aggregate = aggregate_ranges
+
+    lines = open( interval_fname )
+    while True:
+        intervals = [ line.split()[:3] for line in islice( lines, CHUNK_SIZE ) ]
+        if not intervals:
+            break
+        for chrom, start, stop, avg, min_score, max_score in aggregate( scores_by_chrom, masks, intervals ):
+            print >> out_file, "\t".join( map( str, [ chrom, start, stop, avg, min_score, max_score ] ) )
 
     out_file.close()
 
@@ -16,18 +16,33 @@ from numpy import *
 from bx.intervals.io import GenomicIntervalReader
 from bx.bbi.bigwig_file import BigWigFile
 
+# Number of intervals read from the bigwig at once
+CHUNK_SIZE = 10000
+
+def add_chunk( chroms, centers ):
+    if not chroms:
+        return
+    centers = array( centers, dtype=int64 )
+    # One row per interval, each block of the bigwig is read only once
+    values = bw.get_as_array_many( chroms, centers - padding, centers + padding )
+    # Determine which positions had data and mask the rest for totalling
+    invalid = isnan( values )
+    values[ invalid ] = 0
+    totals[:] += values.sum( axis=0, dtype=float64 )
+    valid[:] += ( ~ invalid ).sum( axis=0 )
+
 bw = BigWigFile( open( sys.argv[1] ) )
 padding = int( sys.argv[2] )
 totals = zeros( padding*2, dtype=float64 )
 valid = zeros( padding*2, dtype=int32 )
 
+chroms, centers = [], []
 for interval in GenomicIntervalReader( sys.stdin ):
-    center = floor( ( interval.start + interval.end ) / 2 )
-    values = bw.get_as_array( interval.chrom, center - padding, center + padding )
-    # Determine which positions had data and mask the rest for totalling
-    invalid = isnan( values )
-    values[ invalid ] = 0
-    totals += values
-    valid += ( ~ invalid )
+    chroms.append( interval.chrom )
+    centers.append( ( interval.start + interval.end ) // 2 )
+    if len( chroms ) == CHUNK_SIZE:
+        add_chunk( chroms, centers )
+        chroms, centers = [], []
+add_chunk( chroms, centers )
 
 savetxt( sys.stdout, totals/valid )
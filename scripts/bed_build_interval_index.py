@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""
+Build an interval index file (see `bx.intervals.static_index`) for the
+intervals of a BED file, with a section for each chromosome. The file is
+memory mapped when opened with `StaticIntervalIndexFile`, so it is ready to
+query without reading the BED file again.
+
+The value of each interval is its record number in the BED file (counting
+from 0, skipping comment, track and blank lines), or its name with --names.
+
+usage: %prog bed_file index_file
+    -n, --names: store the name (4th column) of each interval as its value
+"""
+
+import sys
+from collections import defaultdict
+
+import numpy
+
+from bx.cookbook import doc_optparse
+from bx.intervals.static_index import StaticIntervalIndex, write_index_file
+
+def main():
+
+    # Parse command line
+    options, args = doc_optparse.parse( __doc__ )
+    try:
+        bed_fname, index_fname = args
+        names = bool( options.names )
+    except:
+        doc_optparse.exit()
+
+    starts, ends, values = defaultdict( list ), defaultdict( list ), defaultdict( list )
+    record = 0
+    for line in open( bed_fname ):
+        if line.startswith( "#" ) or line.startswith( "track" ) or line.isspace():
+            continue
+        fields = line.split()
+        chrom = fields[0]
+        starts[chrom].append( int( fields[1] ) )
+        ends[chrom].append( int( fields[2] ) )
+        if names:
+            values[chrom].append( fields[3] if len( fields ) > 3 else "" )
+        else:
+            values[chrom].append( record )
+        record += 1
+
+    indexes = {}
+    for chrom in starts:
+        indexes[chrom] = StaticIntervalIndex( starts[chrom], ends[chrom], numpy.array( values[chrom] ) )
+    out = open( index_fname, "wb" )
+    write_index_file( out, indexes )
+    out.close()
+
+if __name__ == "__main__": main()
@@ -12,6 +12,7 @@ usage: %prog bed_file_1 bed_file_2
     -d, --downstream_pad=N: downstream interval padding (default 0bp)
     -v, --reverse: Print regions that DO NOT overlap
     -b, --booleans: Just print '1' if interval overlaps or '0' otherwise
+    -s, --sorted: Both files are sorted by chrom and start, read them together in one pass instead of loading bed_file_2 into memory
 """
 
 import sys
@@ -20,6 +21,7 @@ from warnings import warn
 from bx.bitset import *
 from bx.bitset_builders import *
 
+from bx.intervals.operations.sweep import overlapping, spans_from_bed, union_spans, spans_size
 from bx.cookbook import doc_optparse
 
 mincols = 1
@@ -33,24 +35,46 @@ try:
     if options.downstream_pad: downstream_pad = int( options.downstream_pad )
     reverse = bool( options.reverse )
     booleans = bool( options.booleans )
+    presorted = bool( options.sorted )
     in_fname, in2_fname = args
 except:
     doc_optparse.exit()
 
-# Read first bed into some bitsets
+def overlaps_from_bitsets( in_fname, in2_fname ):
+    """
+    Yield each line of `in_fname` and the number of its bases covered by
+    `in2_fname`, read into bitsets
+    """
+    bitsets = binned_bitsets_from_file( open( in2_fname ) )
+    for line in open( in_fname ):
+        if line.startswith("#") or line.isspace(): 
+            continue
+        fields = line.split()
+        start, end = int( fields[1] ), int( fields[2] )
+        if start > end: 
+            warn( "Bed interval start after end!" )
+        if fields[0] in bitsets:
+            yield line, bitsets[fields[0]].count_range( start, end-start )
+        else:
+            yield line, 0
 
-bitsets = binned_bitsets_from_file( open( in2_fname ) )
+def overlaps_from_sorted( in_fname, in2_fname ):
+    """
+    Yield each line of `in_fname` and the number of its bases covered by
+    `in2_fname`, both sorted
+    """
+    for span, overlaps in overlapping( spans_from_bed( open( in_fname ) ), [ spans_from_bed( open( in2_fname ) ) ] ):
+        if span.start > span.end: 
+            warn( "Bed interval start after end!" )
+        yield span.data, spans_size( union_spans( overlaps[0], span.start, span.end ) )
 
-# Read second BED and intersect
+if presorted:
+    overlaps = overlaps_from_sorted( in_fname, in2_fname )
+else:
+    overlaps = overlaps_from_bitsets( in_fname, in2_fname )
 
-for line in open( in_fname ):
-    if line.startswith("#") or line.isspace(): 
-        continue
-    fields = line.split()
-    start, end = int( fields[1] ), int( fields[2] )
-    if start > end: 
-        warn( "Bed interval start after end!" )
-    if fields[0] in bitsets and bitsets[fields[0]].count_range( start, end-start ) >= mincols:
+for line, covered in overlaps:
+    if covered >= mincols:
         if booleans:
             if reverse: 
                 print 0
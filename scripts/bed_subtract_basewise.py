@@ -5,11 +5,13 @@ Find continuous regions that are covered by the first bed file (`bed_file_1`)
 but not by the second bed file (`bed_file_2`)
 
 usage: %prog bed_file_1 bed_file_2
+    -s, --sorted: Both files are sorted by chrom and start, read them together in one pass instead of loading them into memory
 """
 
 import sys
 from warnings import warn
 from bx.bitset_builders import binned_bitsets_from_file
+from bx.intervals.operations.sweep import Span, overlapping, spans_from_bed, merged_spans, union_spans, complement_spans
 from bx.cookbook import doc_optparse
 
 def print_bits_as_bed( bits ):
@@ -23,9 +25,19 @@ def print_bits_as_bed( bits ):
 options, args = doc_optparse.parse( __doc__ )
 try:
     in_fname, in2_fname = args
+    presorted = bool( options.sorted )
 except:
     doc_optparse.exit()
 
+if presorted:
+    # Merge the regions of the first file and remove the second from them
+    merged = ( Span( chrom, start, end ) for chrom, start, end in merged_spans( spans_from_bed( open( in_fname ) ) ) )
+    for span, overlaps in overlapping( merged, [ spans_from_bed( open( in2_fname ) ) ] ):
+        covered = union_spans( overlaps[0], span.start, span.end )
+        for start, end in complement_spans( covered, span.start, span.end ):
+            print "%s\t%d\t%d" % ( span.chrom, start, end )
+    sys.exit( 0 )
+
 # Read first bed into some bitsets
 
 bitsets1 = binned_bitsets_from_file( open( in_fname ) )
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""
+Compare the compression codecs available for binned array files on a score
+track. For each codec the track is written to a temporary file and read
+back, printing the write and read throughput (millions of values per
+second), the file size and the compression ratio.
+
+The scores are read from a binned array file, or from wiggle / bedGraph data
+(the first chromosome) with --wiggle.
+
+usage: %prog score_file [options]
+    -w, --wiggle: 'score_file' is wiggle or bedGraph data
+    -c, --codecs=LIST: comma separated codecs to compare, as name or name:level (default all available)
+    -n, --ranges=N: number of random ranges to read (default 10000)
+    -l, --length=N: length of the random ranges (default 1000)
+"""
+
+from __future__ import division
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy
+
+from bx.binned_array import BinnedArray, FileBinnedArray, comp_types, binned_arrays_from_wiggle
+from bx.cookbook import doc_optparse
+from bx import misc
+
+DEFAULT_CODECS = [ "none", "zlib:1", "zlib", "dfl:1", "dfl", "bz2", "lzo", "lz4" ]
+
+def load_scores( fname, wiggle ):
+    """Return the scores as a BinnedArray and the number of positions"""
+    if wiggle:
+        arrays = binned_arrays_from_wiggle( misc.open_compressed( fname ) )
+        scores = arrays[ sorted( arrays )[0] ]
+    else:
+        scores = BinnedArray()
+        source = FileBinnedArray( open( fname ) )
+        for i in range( source.nbins ):
+            values = source.bin_array( i )
+            if values is not None:
+                scores.set_range( i * source.bin_size, ( i + 1 ) * source.bin_size, values )
+    used = [ i for i, b in enumerate( scores.bins ) if b is not None ]
+    size = ( used[-1] + 1 ) * scores.bin_size if used else 0
+    return scores, size
+
+def benchmark( scores, size, comp_type, starts, length ):
+    fd, fname = tempfile.mkstemp( suffix=".ba" )
+    os.close( fd )
+    try:
+        t = time.time()
+        out = open( fname, "w" )
+        scores.to_file( out, comp_type=comp_type )
+        out.close()
+        write_time = time.time() - t
+        file_size = os.path.getsize( fname )
+        # Sequential read of the whole track
+        t = time.time()
+        ba = FileBinnedArray( open( fname ), cache=1 )
+        for start in range( 0, size, scores.bin_size ):
+            ba.get_range( start, start + scores.bin_size )
+        read_time = time.time() - t
+        # Random ranges, through a small cache
+        t = time.time()
+        ba = FileBinnedArray( open( fname ), cache=4 )
+        for start in starts:
+            ba.get_range( start, start + length )
+        random_time = time.time() - t
+    finally:
+        os.remove( fname )
+    return write_time, read_time, random_time, file_size
+
+def main():
+
+    # Parse command line
+    options, args = doc_optparse.parse( __doc__ )
+    try:
+        score_fname = args[0]
+        wiggle = bool( options.wiggle )
+        if options.codecs:
+            codecs = options.codecs.split( "," )
+        else:
+            codecs = [ c for c in DEFAULT_CODECS if c.split( ":" )[0] in comp_types ]
+        nranges = int( options.ranges or 10000 )
+        length = int( options.length or 1000 )
+    except:
+        doc_optparse.exit()
+
+    scores, size = load_scores( score_fname, wiggle )
+    if size == 0:
+        print >> sys.stderr, "No scores found"
+        sys.exit( 1 )
+    raw_size = size * numpy.dtype( scores.typecode ).itemsize
+    starts = numpy.random.randint( 0, max( 1, size - length ), nranges )
+
+    print "\t".join( [ "codec", "write_Mvals/s", "read_Mvals/s", "ranges/s", "bytes", "ratio" ] )
+    for comp_type in codecs:
+        write_time, read_time, random_time, file_size = benchmark( scores, size, comp_type, starts, length )
+        print "%s\t%.2f\t%.2f\t%.0f\t%d\t%.2f" % ( comp_type, size / write_time / 1e6, size / read_time / 1e6,
+                                                  nranges / random_time, file_size, raw_size / file_size )
+
+if __name__ == "__main__": main()
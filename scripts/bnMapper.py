@@ -13,7 +13,7 @@ import sys, os, logging, pdb
 import numpy as np
 from operator import concat, attrgetter, itemgetter
 from itertools import groupby
-from bx.intervals.intersection import IntervalTree, Interval
+from bx.intervals.genome_index import GenomeIntervalIndex
 from bx.cookbook import argparse
 from bx.align import epo
 from bx.align.epo import bed_union as elem_u
@@ -25,37 +25,6 @@ LOG_LEVELS = {"info" : logging.INFO, "debug" : logging.DEBUG, "silent" : logging
 logging.basicConfig()
 log = logging.getLogger()
 
-class GIntervalTree( IntervalTree ):
-    """a set of IntervalTrees that is indexed by chromosomes"""
-
-    def __init__(self, data=[]):
-        self._trees = {}
-
-    def add(self, chrom, element):
-        """insert an element. use this method as the IntervalTree one.
-        this will simply call the IntervalTree.add method on the right tree
-
-        :param chrom: chromosome
-        :param element: the argument of IntervalTree.insert_interval
-        :return: None
-        """
-
-        self._trees.setdefault(chrom, IntervalTree()).insert_interval( element )
-
-    def find(self, chrom, start, end):
-        """find the intersecting elements
-
-        :param chrom: chromosome
-        :param start: start
-        :param end: end
-        :return: a list of intersecting elements"""
-
-        tree = self._trees.get( chrom, None )
-        if tree:
-            return tree.find( start, end )
-        #return always a list
-        return []
-
 def transform(elem, (chain, CT, CQ), max_gap):
     """transform the coordinates of this elem into the other species.
 
@@ -118,8 +87,10 @@ def transform_by_chrom(all_epo, from_elem_list, tree, chrom, opt, out_fd):
     assert len( set(from_elem_list['chrom']) ) <= 1
 
     mapped_elem_count = 0
-    for from_elem in from_elem_list:
-        matching_block_ids = map(attrgetter("value"), tree.find(chrom, from_elem['start'], from_elem['end']))
+    queries, hits = tree.find_batch([chrom] * len(from_elem_list), from_elem_list['start'], from_elem_list['end'])
+    bounds = np.searchsorted(queries, np.arange(len(from_elem_list) + 1))
+    for i, from_elem in enumerate(from_elem_list):
+        matching_block_ids = tree.lookup(hits[bounds[i]:bounds[i+1]])
 
         # do the actual mapping
         to_elem_slices = filter(bool, map(lambda i: transform(from_elem, all_epo[i], opt.gap), matching_block_ids))
@@ -158,8 +129,7 @@ def transform_file(ELEMS, ofname, EPO, TREE, opt):
     with open(ofname, 'w') as out_fd:
         if opt.screen:
             for elem in ELEMS.flat:
-                matching_blocks = map(attrgetter("value"),
-                        TREE.find(elem['chrom'], elem['start'], elem['end']))
+                matching_blocks = TREE.find(elem['chrom'], elem['start'], elem['end'])
                 assert set( matching_blocks ) <= set( EPO.keys() )
                 if matching_blocks:
                     out_fd.write(BED4_FRM % elem)
@@ -237,13 +207,12 @@ if __name__ == "__main__":
     #loading alignments from opt.alignment
     EPO = dict( map(lambda ch: (ch[0].id, ch), loadChains(opt.alignment)) )
 
-    ## create an interval tree based on chain headers (from_species side)
+    ## create an interval index based on chain headers (from_species side)
     ## for fast feature-to-chain_header searching
     log.info("indexing %d chains ..." % (len(EPO),))
-    TREE = GIntervalTree()
-    for gabid in EPO:
-        chain, t, q = EPO[gabid]
-        TREE.add(chain.tName, Interval(chain.tStart, chain.tEnd, chain.id))
+    chains = [EPO[gabid][0] for gabid in EPO]
+    TREE = GenomeIntervalIndex([c.tName for c in chains], [c.tStart for c in chains],
+            [c.tEnd for c in chains], [c.id for c in chains])
 
     # transform elements
     if len(opt.input) > 1:
@@ -7,6 +7,8 @@ If index_file is not provided maf_file.index is used.
 
 usage: %prog maf_file index_file
     -s, --species=a,b,c: only index the position of the block in the listed species
+    -p, --processes=N: number of worker processes (default: one per CPU)
+    -v, --verbose: report progress and throughput on stderr
 """
 
 import psyco_full
@@ -16,9 +18,11 @@ from bx.cookbook import doc_optparse
 import sys
 import os.path
 
-from bx import interval_index_file
-import bx.align.maf
-from bx.misc.seekbzip2 import SeekableBzip2File
+from bx.align.maf_parallel import build_index
+
+def report( done, total, seconds ):
+    rate = done / max( seconds, 1e-6 ) / 1024 / 1024
+    print >> sys.stderr, "%d / %d MB (%.0f%%), %.1f MB/s" % ( done / 1024 / 1024, total / 1024 / 1024, 100.0 * done / max( total, 1 ), rate )
 
 def main():
 
@@ -28,56 +32,37 @@ def main():
 
     try:
         maf_file = args[0]
-        # If it appears to be a bz2 file, attempt to open with table
+        # If it appears to be a bz2 file, check for the table
         if maf_file.endswith( ".bz2" ):
-            table_file = maf_file + "t"
-            if not os.path.exists( table_file ):
+            if not os.path.exists( maf_file + "t" ):
                 doc_optparse.exit( "To index bz2 compressed files first "
                                    "create a bz2t file with bzip-table." )
-            # Open with SeekableBzip2File so we have tell support
-            maf_in = SeekableBzip2File( maf_file, table_file )
-            # Strip .bz2 from the filename before adding ".index"
-            maf_file = maf_file[:-4]
         elif maf_file.endswith( ".lzo" ):
-            from bx.misc.seeklzop import SeekableLzopFile
-            table_file = maf_file + "t"
-            if not os.path.exists( table_file ):
+            if not os.path.exists( maf_file + "t" ):
                 doc_optparse.exit( "To index lzo compressed files first "
                                    "create a lzot file with lzop_build_offset_table." )
-            # Open with SeekableBzip2File so we have tell support
-            maf_in = SeekableLzopFile( maf_file, table_file )
-            # Strip .lzo from the filename before adding ".index"
-            maf_file = maf_file[:-4]
-        else:
-            maf_in = open( maf_file )
-        # Determine the name of the index file
+        # Determine the name of the index file (by default .bz2 or .lzo is
+        # stripped from the filename before adding ".index")
         if len( args ) > 1: 
             index_file = args[1]
         else: 
-            index_file = maf_file + ".index" 
+            index_file = None
         if options.species:
             species = options.species.split( "," )
         else:
             species = None
+        if options.processes:
+            processes = int( options.processes )
+        else:
+            processes = None
     except:
         doc_optparse.exception()
 
-    maf_reader = bx.align.maf.Reader( maf_in )
-
-    indexes = interval_index_file.Indexes()
-
-    # Need to be a bit tricky in our iteration here to get the 'tells' right
-    while 1:
-        pos = maf_reader.file.tell()
-        block = maf_reader.next()
-        if block is None: break
-        for c in block.components:
-            if species is not None and c.src.split('.')[0] not in species:
-                continue
-            indexes.add( c.src, c.forward_strand_start, c.forward_strand_end, pos, max=c.src_size )
+    if options.verbose:
+        progress = report
+    else:
+        progress = None
 
-    out = open( index_file, 'w' )
-    indexes.write( out )
-    out.close()
+    build_index( maf_file, index_file, processes=processes, species=species, progress=progress )
 
 if __name__ == "__main__": main()
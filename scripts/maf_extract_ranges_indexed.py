@@ -38,6 +38,22 @@ import bx.align.maf
 from bx import misc
 import os
 import sys
+from itertools import groupby
+from operator import itemgetter
+
+def read_ranges( input, fixed_src, prefix, do_strand ):
+    """Parse (start, end, src, strand) from each line of `input`"""
+    for line in input:
+        strand = None
+        fields = line.split()
+        if fixed_src:
+            src, start, end = fixed_src, int( fields[0] ), int( fields[1] )
+            if do_strand: strand = fields[2]
+        else:
+            src, start, end = fields[0], int( fields[1] ), int( fields[2] )
+            if do_strand: strand = fields[3]
+        if prefix: src = prefix + src
+        yield start, end, src, strand
 
 def main():
     # Parse Command Line
@@ -64,48 +80,39 @@ def main():
     # Start MAF on stdout
     if dir is None: 
         out = bx.align.maf.Writer( sys.stdout )
-    # Iterate over input ranges 
-    for line in sys.stdin:
-        strand = None
-        fields = line.split()
-        if fixed_src:
-            src, start, end = fixed_src, int( fields[0] ), int( fields[1] )
-            if do_strand: strand = fields[2]
-        else:
-            src, start, end = fields[0], int( fields[1] ), int( fields[2] )
-            if do_strand: strand = fields[3]
-        if prefix: src = prefix + src
-        # Find overlap with reference component
-        blocks = index.get( src, start, end )
-        # Open file if needed
-        if dir:
-            out = bx.align.maf.Writer( open( os.path.join( dir, "%s:%09d-%09d.maf" % ( src, start, end ) ), 'w' ) )
-        # Write each intersecting block
-        if chop:
-            for block in blocks: 
-                for ref in block.get_components_by_src( src ):
-                    slice_start = max( start, ref.get_forward_strand_start() )
-                    slice_end = min( end, ref.get_forward_strand_end() )
-                    if (slice_end <= slice_start): continue
-                    sliced = block.slice_by_component( ref, slice_start, slice_end ) 
-                    # If the block is shorter than the minimum allowed size, stop
-                    if mincols and ( sliced.text_size < mincols ):
-                        continue
-                    # If the reference component is empty, don't write the block
-                    if sliced.get_component_by_src( src ).size < 1:
-                        continue
-                    # Keep only components that are not empty
-                    sliced.components = [ c for c in sliced.components if c.size > 0 ]
-                    # Reverse complement if needed
-                    if ( strand != None ) and ( ref.strand != strand ): 
-                        sliced = sliced.reverse_complement()
-                    # Write the block
-                    out.write( sliced )
-        else:
-            for block in blocks:
-                out.write( block )
-        if dir:
-            out.close()
+    # Iterate over input ranges, looking up consecutive ranges on the same
+    # src together so blocks overlapping several ranges are read once
+    for src, ranges in groupby( read_ranges( sys.stdin, fixed_src, prefix, do_strand ), key=itemgetter( 2 ) ):
+        for ( start, end, src, strand ), blocks in index.get_many( src, ranges ):
+            # Open file if needed
+            if dir:
+                out = bx.align.maf.Writer( open( os.path.join( dir, "%s:%09d-%09d.maf" % ( src, start, end ) ), 'w' ) )
+            # Write each intersecting block
+            if chop:
+                for block in blocks: 
+                    for ref in block.get_components_by_src( src ):
+                        slice_start = max( start, ref.get_forward_strand_start() )
+                        slice_end = min( end, ref.get_forward_strand_end() )
+                        if (slice_end <= slice_start): continue
+                        sliced = block.slice_by_component( ref, slice_start, slice_end ) 
+                        # If the block is shorter than the minimum allowed size, stop
+                        if mincols and ( sliced.text_size < mincols ):
+                            continue
+                        # If the reference component is empty, don't write the block
+                        if sliced.get_component_by_src( src ).size < 1:
+                            continue
+                        # Keep only components that are not empty
+                        sliced.components = [ c for c in sliced.components if c.size > 0 ]
+                        # Reverse complement if needed
+                        if ( strand != None ) and ( ref.strand != strand ): 
+                            sliced = sliced.reverse_complement()
+                        # Write the block
+                        out.write( sliced )
+            else:
+                for block in blocks:
+                    out.write( block )
+            if dir:
+                out.close()
     # Close output MAF
     out.close()
     index.close()
@@ -20,7 +20,7 @@ def main():
 
     species = sys.argv[1].split( ',' )
 
-    maf_reader = bx.align.maf.Reader( sys.stdin )
+    maf_reader = bx.align.maf.Reader( sys.stdin, species=species )
     maf_writer = bx.align.maf.Writer( sys.stdout )
 
     for m in maf_reader:        
@@ -35,7 +35,7 @@ def main():
     except:
         doc_optparse.exit()
 
-    maf_reader = bx.align.maf.Reader( sys.stdin )
+    maf_reader = bx.align.maf.Reader( sys.stdin, species=species )
     maf_writer = bx.align.maf.Writer( sys.stdout )
 
     if fuse: 
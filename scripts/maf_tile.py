@@ -13,6 +13,7 @@ NOTE: See maf_tile_2.py for a more sophisticated version of this program, I
 
 usage: %prog tree maf_files...
     -m, --missingData: Inserts wildcards for missing block rows instead of '-'
+    -c, --cache=N: Keep up to N parsed blocks in memory for neighboring intervals (default 1000)
 """
 
 import psyco_full
@@ -21,6 +22,7 @@ from bx.cookbook import doc_optparse
 
 import bx.align.maf
 import bx.align as align
+from bx.align.tools.tile import tile_blocks, reference_filler
 from bx import misc
 import bx.seq.nib
 import os
@@ -35,7 +37,11 @@ def main():
     try:
         sources = args[0].translate( tree_tx ).split()
         seq_db = load_seq_db( args[1] )
-        index = bx.align.maf.MultiIndexed( args[2:] )
+        if options.cache: cache_size = int( options.cache )
+        else: cache_size = 1000
+        if cache_size > 0: block_cache = bx.align.maf.new_block_cache( max_blocks=cache_size )
+        else: block_cache = None
+        index = bx.align.maf.MultiIndexed( args[2:], block_cache=block_cache )
 
         out = bx.align.maf.Writer( sys.stdout )
         missing_data = bool(options.missingData)
@@ -61,59 +67,21 @@ def do_interval( sources, index, out, ref_src, start, end, seq_db, missing_data
 
     assert sources[0].split('.')[0] == ref_src.split('.')[0], "%s != %s" % ( sources[0].split('.')[0], ref_src.split('.')[0] )
 
-    base_len = end - start
-        
     blocks = index.get( ref_src, start, end )
     # From low to high score
     blocks.sort( lambda a, b: cmp( a.score, b.score ) )
 
-    mask = [ -1 ] * base_len
+    if missing_data: missing = "*"
+    else: missing = "-"
+    tiled = tile_blocks( blocks, sources, ref_src, start, end, reference_filler( ref_src, seq_db ), missing )
 
-    # print len( blocks )
-    # print blocks[0]
-    
     ref_src_size = None
-    for i, block in enumerate( blocks ):
-        ref = block.get_component_by_src_start( ref_src )
-        ref_src_size = ref.src_size
-        assert ref.strand == "+"
-        slice_start = max( start, ref.start )
-        slice_end = min( end, ref.end )
-        for j in range( slice_start, slice_end ):
-            mask[j-start] = i
-
-    #print >>sys.stderr, mask
-
-    tiled = []
-    for i in range( len( sources ) ): tiled.append( [] )
-
-    for ss, ee, index in intervals_from_mask( mask ):
-        if index < 0:
-            tiled[0].append( bx.seq.nib.NibFile( open( seq_db[ ref_src ] ) ).get( start+ss, ee-ss ) )
-            for row in tiled[1:]:
-                if missing_data: 
-                    row.append( "*" * ( ee - ss ) )
-                else: 
-                    row.append( "-" * ( ee - ss ) )
-        else:
-            slice_start = start + ss
-            slice_end = start + ee
-            block = blocks[index]
-            ref = block.get_component_by_src_start( ref_src )
-            sliced = block.slice_by_component( ref, slice_start, slice_end ) 
-            sliced = sliced.limit_to_species( sources )
-            sliced.remove_all_gap_columns()
-            for i, src in enumerate( sources ):
-                comp = sliced.get_component_by_src_start( src )
-                if comp:
-                    tiled[i].append( comp.text )
-                else:
-                    if missing_data: tiled[i].append( "*" * sliced.text_size )
-                    else: tiled[i].append( "-" * sliced.text_size )
+    if blocks:
+        ref_src_size = blocks[-1].get_component_by_src_start( ref_src ).src_size
         
     a = align.Alignment()
     for i, name in enumerate( sources ):
-        text = "".join( tiled[i] )
+        text = tiled[i]
         size = len( text ) - text.count( "-" )
         if i == 0:
             if ref_src_size is None: ref_src_size = bx.seq.nib.NibFile( open( seq_db[ ref_src ] ) ).length
@@ -124,15 +92,4 @@ def do_interval( sources, index, out, ref_src, start, end, seq_db, missing_data
 
     out.write( a )
 
-
-def intervals_from_mask( mask ):
-    start = 0
-    last = mask[0]
-    for i in range( 1, len( mask ) ):
-        if mask[i] != last:
-            yield start, i, last
-            start = i
-            last = mask[i]
-    yield start, len(mask), last
-
 main()
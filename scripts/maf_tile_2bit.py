@@ -35,6 +35,7 @@ import operator
 
 import bx.align.maf as maf
 import bx.align as align
+from bx.align.tools.tile import remove_gap_columns
 import bx.seq.twobit
 from bx import misc
 import bx.seq.nib
@@ -106,26 +107,6 @@ def guess_fill_char( left_comp, right_comp ):
     # All other cases we have no clue about
     return "*" 
         
-def remove_all_gap_columns( texts ):
-    """
-    Remove any columns containing only gaps from alignment texts
-    """
-    seqs = [ list( t ) for t in texts ]
-    i = 0
-    text_size = len( texts[0] )
-    while i < text_size:
-        all_gap = True
-        for seq in seqs:
-            if seq[i] not in ( '-', '#', '*', '=', 'X', '@' ): 
-                all_gap = False
-        if all_gap:
-            for seq in seqs: 
-                del seq[i]
-            text_size -= 1
-        else:
-            i += 1
-    return [ ''.join( s ) for s in seqs ]
-
 def do_interval( sources, index, out, ref_src, start, end, ref_2bit, missing_data, strand ):
     """
     Join together alignment blocks to create a semi human projected local 
@@ -250,7 +231,7 @@ def do_interval( sources, index, out, ref_src, start, end, ref_2bit, missing_dat
         assert len( tiled_rows[ source_index ] ) == len( tiled_rows[ 0 ] ), \
             "length of tiled row should match reference row"
     # Okay, now make up the fake alignment from the tiled rows.
-    tiled_rows = remove_all_gap_columns( tiled_rows )
+    tiled_rows = remove_gap_columns( tiled_rows, gap_chars="-#*=X@" )
     a = align.Alignment()
     for i, name in enumerate( sources ):
         text = "".join( tiled_rows[i] )
@@ -39,7 +39,7 @@ def __main__():
 
     texts = {}
     for s in species: texts[s] = []
-    maf_reader = maf.Reader( sys.stdin )
+    maf_reader = maf.Reader( sys.stdin, species=[ s.split( '.' )[0] for s in species ] )
     for m in maf_reader:
         for s in species:
             c = m.get_component_by_src_start( s ) 
@@ -12,8 +12,8 @@ from __future__ import division
 
 import sys
 import psyco_full
-import bx.wiggle
-from bx.binned_array import BinnedArray
+from bx.arrays.wiggle import WiggleReader
+from bx.binned_array import BinnedArray, interval_chunks
 from bx_extras.fpconst import isNaN
 from bx.cookbook import doc_optparse
 from bx import misc
@@ -35,14 +35,16 @@ def main():
     scores = BinnedArray()
 
     ## last_chrom = None
-    for i, ( chrom, pos, val ) in enumerate( bx.wiggle.Reader( misc.open_compressed( score_fname ) ) ):
+    count = 0
+    for chrom, starts, ends, values in interval_chunks( WiggleReader( misc.open_compressed( score_fname ) ) ):
         #if last_chrom is None: 
         #    last_chrom = chrom
         #else: 
         #    assert chrom == last_chrom, "This script expects a 'wiggle' input on only one chromosome"
-        scores[pos] = val
+        scores.set_intervals( starts, ends, values )
         # Status
-        if i % 10000 == 0: print i, "scores processed"
+        count += ( ends - starts ).sum()
+        print count, "scores processed"
 
     out = open( out_fname, "w" )
     if comp_type:
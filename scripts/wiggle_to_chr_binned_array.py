@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 
 """
-Writes compressed data from a wiggle file by chromosome.
+Writes compressed data from a wiggle (or bedGraph) file by chromosome.
 
 usage: %prog score_file < wiggle_data
 """
@@ -10,9 +10,7 @@ from __future__ import division
 
 import sys
 import psyco_full
-import bx.wiggle
-from bx.binned_array import BinnedArray
-from fpconst import isNaN
+from bx.binned_array import binned_arrays_from_wiggle
 from bx.cookbook import doc_optparse
 from bx import misc
 
@@ -26,13 +24,7 @@ def main():
     except:
         doc_optparse.exit()
 
-    scores = {}
-    for i, ( chrom, pos, val ) in enumerate( bx.wiggle.Reader( open(sys.argv[1]) ) ):
-        if not chrom in scores: scores[ chrom ] = BinnedArray()
-        scores[chrom][pos] = val
-
-        # Status
-        if i % 10000 == 0: print i, "scores processed"
+    scores = binned_arrays_from_wiggle( open( score_fname ) )
 
     for chr in scores.keys():
         out = open( chr, "w" )
@@ -102,6 +102,8 @@ def get_extension_modules():
     extensions.append( Extension( "bx.intervals.intersection", [ "lib/bx/intervals/intersection.pyx" ] ) )
     # Alignment object speedups
     extensions.append( Extension( "bx.align._core", [ "lib/bx/align/_core.pyx" ] ) )
+    # MAF parsing speedups
+    extensions.append( Extension( "bx.align._maf", [ "lib/bx/align/_maf.pyx" ] ) )
     # NIB reading speedups
     extensions.append( Extension( "bx.seq._nib", [ "lib/bx/seq/_nib.pyx" ] ) )
     # 2bit reading speedups
@@ -148,6 +150,12 @@ def get_extension_modules():
                                       [ "lib/bx/misc/_seekbzip2.pyx",
                                         "src/bunzip/micro-bunzip.c" ],
                                       include_dirs=[ "src/bunzip" ] ) )   
+
+        # LZ4 compression for binned arrays
+        extensions.append( Extension( "bx.misc._lz4",
+                                      [ "lib/bx/misc/_lz4.pyx",
+                                        "src/lz4/lz4block.c" ],
+                                      include_dirs=[ "src/lz4" ] ) )
     return extensions     
      
 # ---- Monkey patches -------------------------------------------------------
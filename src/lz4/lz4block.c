@@ -0,0 +1,230 @@
+/*
+    A small LZ4 block codec.
+
+    The compressor is the greedy single pass matcher of the reference LZ4
+    implementation: a hash table of the positions of 4 byte sequences finds
+    earlier occurrences within 64KB, each match is extended as far as it
+    goes, and the search skips ahead faster the longer no match is found so
+    incompressible data is passed over quickly. Blocks follow the rules of
+    the format: the last match starts at least 12 bytes before the end of
+    the input and the last 5 bytes are always literals.
+*/
+#include <stdint.h>
+#include <string.h>
+#include "lz4block.h"
+
+#define MIN_MATCH 4
+#define LAST_LITERALS 5
+#define MF_LIMIT 12
+#define MAX_DISTANCE 65535
+#define HASH_LOG 14
+#define SKIP_TRIGGER 6
+
+static uint32_t read32( const unsigned char *p )
+{
+    uint32_t v;
+    memcpy( &v, p, 4 );
+    return v;
+}
+
+static uint32_t hash4( uint32_t v )
+{
+    return ( v * 2654435761U ) >> ( 32 - HASH_LOG );
+}
+
+/* Write the part of a length beyond the 15 that fits in the token */
+static unsigned char *write_length( unsigned char *op, size_t len )
+{
+    while ( len >= 255 ) {
+        *op++ = 255;
+        len -= 255;
+    }
+    *op++ = (unsigned char) len;
+    return op;
+}
+
+int lz4_compress_bound( int size )
+{
+    return size + size / 255 + 16;
+}
+
+int lz4_compress( const char *source, char *dest, int src_size, int dst_capacity )
+{
+    const unsigned char *src = (const unsigned char *) source;
+    const unsigned char *ip = src;
+    const unsigned char *anchor = src;
+    const unsigned char *const iend = src + src_size;
+    const unsigned char *const mflimit = iend - MF_LIMIT;
+    const unsigned char *const matchlimit = iend - LAST_LITERALS;
+    unsigned char *op = (unsigned char *) dest;
+    unsigned char *token;
+    const unsigned char *match;
+    size_t literals, match_len;
+    uint32_t table[1 << HASH_LOG];
+
+    if ( src_size < 0 || dst_capacity < lz4_compress_bound( src_size ) ) {
+        return -1;
+    }
+    if ( src_size <= MF_LIMIT ) {
+        goto last_literals;
+    }
+    memset( table, 0, sizeof( table ) );
+    table[ hash4( read32( ip ) ) ] = 0;
+    ip++;
+    for ( ;; ) {
+        /* Find a match, stepping further the longer none is found */
+        unsigned attempts = 1 << SKIP_TRIGGER;
+        for ( ;; ) {
+            uint32_t h;
+            unsigned step = attempts++ >> SKIP_TRIGGER;
+            if ( ip > mflimit ) {
+                goto last_literals;
+            }
+            h = hash4( read32( ip ) );
+            match = src + table[h];
+            table[h] = (uint32_t) ( ip - src );
+            if ( match < ip && ip - match <= MAX_DISTANCE && read32( match ) == read32( ip ) ) {
+                break;
+            }
+            ip += step;
+        }
+        /* Extend the match backwards over the pending literals */
+        while ( ip > anchor && match > src && ip[-1] == match[-1] ) {
+            ip--;
+            match--;
+        }
+        literals = ip - anchor;
+        token = op++;
+        if ( literals >= 15 ) {
+            *token = 15 << 4;
+            op = write_length( op, literals - 15 );
+        } else {
+            *token = (unsigned char) ( literals << 4 );
+        }
+        memcpy( op, anchor, literals );
+        op += literals;
+        for ( ;; ) {
+            const unsigned char *p = ip + MIN_MATCH;
+            const unsigned char *m = match + MIN_MATCH;
+            uint32_t h, offset = (uint32_t) ( ip - match );
+            *op++ = (unsigned char) ( offset & 255 );
+            *op++ = (unsigned char) ( offset >> 8 );
+            while ( p < matchlimit && *p == *m ) {
+                p++;
+                m++;
+            }
+            match_len = p - ip - MIN_MATCH;
+            ip = p;
+            if ( match_len >= 15 ) {
+                *token += 15;
+                op = write_length( op, match_len - 15 );
+            } else {
+                *token += (unsigned char) match_len;
+            }
+            anchor = ip;
+            if ( ip > mflimit ) {
+                goto last_literals;
+            }
+            table[ hash4( read32( ip - 2 ) ) ] = (uint32_t) ( ip - 2 - src );
+            /* A match right away continues with no literals */
+            h = hash4( read32( ip ) );
+            match = src + table[h];
+            table[h] = (uint32_t) ( ip - src );
+            if ( match < ip && ip - match <= MAX_DISTANCE && read32( match ) == read32( ip ) ) {
+                token = op++;
+                *token = 0;
+                continue;
+            }
+            break;
+        }
+        ip++;
+    }
+
+last_literals:
+    literals = iend - anchor;
+    token = op++;
+    if ( literals >= 15 ) {
+        *token = 15 << 4;
+        op = write_length( op, literals - 15 );
+    } else {
+        *token = (unsigned char) ( literals << 4 );
+    }
+    memcpy( op, anchor, literals );
+    op += literals;
+    return (int) ( op - (unsigned char *) dest );
+}
+
+int lz4_decompress( const char *source, char *dest, int src_size, int dst_size )
+{
+    const unsigned char *ip = (const unsigned char *) source;
+    const unsigned char *const iend = ip + src_size;
+    unsigned char *op = (unsigned char *) dest;
+    unsigned char *const oend = op + dst_size;
+
+    for ( ;; ) {
+        unsigned token;
+        size_t len, offset;
+        const unsigned char *match;
+        unsigned s;
+
+        if ( ip >= iend ) {
+            return -1;
+        }
+        token = *ip++;
+        /* Literals */
+        len = token >> 4;
+        if ( len == 15 ) {
+            do {
+                if ( ip >= iend ) {
+                    return -1;
+                }
+                s = *ip++;
+                len += s;
+            } while ( s == 255 && len <= (size_t) dst_size );
+        }
+        if ( len > (size_t) ( iend - ip ) || len > (size_t) ( oend - op ) ) {
+            return -1;
+        }
+        memcpy( op, ip, len );
+        op += len;
+        ip += len;
+        /* The last sequence has no match */
+        if ( ip == iend ) {
+            break;
+        }
+        /* Match */
+        if ( iend - ip < 2 ) {
+            return -1;
+        }
+        offset = ip[0] | ( ip[1] << 8 );
+        ip += 2;
+        if ( offset == 0 || offset > (size_t) ( op - (unsigned char *) dest ) ) {
+            return -1;
+        }
+        match = op - offset;
+        len = token & 15;
+        if ( len == 15 ) {
+            do {
+                if ( ip >= iend ) {
+                    return -1;
+                }
+                s = *ip++;
+                len += s;
+            } while ( s == 255 && len <= (size_t) dst_size );
+        }
+        len += MIN_MATCH;
+        if ( len > (size_t) ( oend - op ) ) {
+            return -1;
+        }
+        if ( offset >= len ) {
+            memcpy( op, match, len );
+            op += len;
+        } else {
+            /* Overlapping copy repeats the last `offset` bytes */
+            while ( len-- ) {
+                *op++ = *match++;
+            }
+        }
+    }
+    return (int) ( op - (unsigned char *) dest );
+}
@@ -0,0 +1,22 @@
+#ifndef __LZ4BLOCK_H__
+#define __LZ4BLOCK_H__
+
+/*
+    Compression and decompression of single blocks in the LZ4 block format
+    (a token byte with literal and match lengths, the literals, and a two
+    byte little endian match offset), readable by any LZ4 implementation.
+*/
+
+/* Largest compressed size of `size` bytes of input */
+int lz4_compress_bound( int size );
+
+/* Compress `src_size` bytes of `src` into `dst`, which must hold at least
+   lz4_compress_bound( src_size ) bytes. Returns the compressed size, or -1
+   if `dst_capacity` is too small. */
+int lz4_compress( const char *src, char *dst, int src_size, int dst_capacity );
+
+/* Decompress `src_size` bytes of `src` into `dst`. Returns the decompressed
+   size, or -1 if the data is corrupt or would not fit in `dst_size` bytes. */
+int lz4_decompress( const char *src, char *dst, int src_size, int dst_size );
+
+#endif